@@ -1,31 +1,278 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Annotated, Optional
+import csv
+import hashlib
+from itertools import chain
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from ....models.collection_point import (
     CollectionPointResponse,
     CollectionPointsListResponse,
+    CollectionPointsNearestResponse,
+    CollectionPointsCorridorResponse,
+    CollectionPointsChangesResponse,
+    CollectionPointsAutocompleteResponse,
+    CollectionPointSuggestion,
+    CollectionPointsImportResponse,
+    CollectionPointsSelector,
+    CollectionPointsBulkUpdate,
+    CollectionPointsBulkResponse,
+    CollectionPointsBatchRequest,
+    CollectionPointsBatchResponse,
+    CollectionPointFacets,
+    CollectionPointsFacetsResponse,
     CollectionPointsStatisticsResponse,
+    CollectionPointCluster,
+    CollectionPointsClustersResponse,
+    CollectionPointsChangeFilters,
+    CollectionPointsViewport,
     CollectionPointFilters,
     CollectionPointCreate,
     CollectionPointUpdate,
 )
+from ....core.config import settings
 from ....services.collection_points_service import collection_points_service
-from ....data.mock_collection_points import AVAILABLE_MATERIALS, AVAILABLE_NEIGHBORHOODS
+from ....services.bulk_import import (
+    IMPORT_FORMATS,
+    ImportTooLarge,
+    import_format,
+    read_import,
+)
+from ....services.operating_hours import minute_of_week, now
 
+# As rotas são síncronas: o FastAPI as roda no threadpool, e uma consulta ao
+# SQLite ou uma escrita não seguram o event loop. Só ficam `async` as que
+# precisam dele (o stream de eventos e a leitura do upload).
 router = APIRouter()
 
 
+def _etag(request: Request) -> str:
+    query = sorted(request.query_params.multi_items())
+    raw = f"{collection_points_service.data_version}|{request.url.path}|{query}"
+    if "open_now" in request.query_params:
+        # Sem mudar os dados, a resposta muda quando os pontos abrem e fecham.
+        raw += f"|{minute_of_week(now())}"
+    return '"' + hashlib.sha256(raw.encode()).hexdigest()[:32] + '"'
+
+
+def _check_etag(request: Request, response: Response) -> Optional[Response]:
+    """Responde 304 se o cliente já tem esta versão; senão anota o ETag na resposta."""
+    etag = _etag(request)
+    header = request.headers.get("if-none-match", "")
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    if "*" in tags or etag in tags:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return None
+
+
 @router.get("/", response_model=CollectionPointsListResponse)
-async def get_collection_points(filters: CollectionPointFilters = Depends()):
-    data = collection_points_service.get_all_collection_points(filters=filters)
+def get_collection_points(
+    request: Request, response: Response, filters: CollectionPointFilters = Depends()
+):
+    not_modified = _check_etag(request, response)
+    if not_modified is not None:
+        return not_modified
+    try:
+        page = collection_points_service.get_collection_points_page(filters=filters)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     return CollectionPointsListResponse(
+        success=True,
+        data=page.items,
+        total=page.total,
+        next_cursor=page.next_cursor,
+        message=f"Found {page.total} collection points",
+    )
+
+
+@router.get("/nearest", response_model=CollectionPointsNearestResponse)
+def get_nearest_collection_points(
+    lat: Optional[float] = None,
+    lng: Optional[float] = None,
+    cep: Optional[str] = None,
+    k: int = Query(5, ge=1, le=100),
+    material: Optional[str] = None,
+):
+    try:
+        data = collection_points_service.get_nearest_collection_points(
+            lat=lat, lng=lng, k=k, material=material, cep=cep
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return CollectionPointsNearestResponse(
         success=True,
         data=data,
         total=len(data),
-        message=f"Found {len(data)} collection points",
+        message=f"Found {len(data)} nearest collection points",
+    )
+
+
+@router.get("/corridor", response_model=CollectionPointsCorridorResponse)
+def get_collection_points_along_route(
+    polyline: str = Query(
+        ..., min_length=1, description="Encoded polyline of the route"
+    ),
+    buffer_km: float = Query(0.5, gt=0, le=5),
+    material: Optional[str] = None,
+    city: Optional[str] = None,
+    accepts_all_materials: Optional[bool] = None,
+    limit: int = Query(50, ge=1, le=500),
+):
+    try:
+        data = collection_points_service.get_collection_points_along_route(
+            polyline,
+            buffer_km=buffer_km,
+            material=material,
+            city=city,
+            accepts_all_materials=accepts_all_materials,
+            limit=limit,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return CollectionPointsCorridorResponse(
+        success=True,
+        data=data,
+        total=len(data),
+        message=f"Found {len(data)} collection points along the route",
+    )
+
+
+@router.get("/export")
+def export_collection_points(
+    filters: CollectionPointFilters = Depends(),
+    chunk_size: int = Query(500, ge=1, le=5000),
+):
+    chunks = collection_points_service.iter_collection_points(
+        filters=filters, chunk_size=chunk_size
+    )
+    try:
+        first = next(chunks, [])
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    def ndjson():
+        for chunk in chain([first], chunks):
+            yield "".join(point.model_dump_json() + "\n" for point in chunk)
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@router.get("/changes", response_model=CollectionPointsChangesResponse)
+def get_collection_point_changes(
+    request: Request, response: Response, since: int = Query(0, ge=0)
+):
+    not_modified = _check_etag(request, response)
+    if not_modified is not None:
+        return not_modified
+    changes = collection_points_service.get_changes_since(since)
+    return CollectionPointsChangesResponse(
+        success=True,
+        version=changes.version,
+        snapshot=changes.snapshot,
+        upserts=changes.upserts,
+        deleted_ids=changes.deleted_ids,
+        message=f"{len(changes.upserts)} upserts and {len(changes.deleted_ids)} "
+        f"deletions up to version {changes.version}",
+    )
+
+
+@router.get("/events")
+async def stream_collection_point_changes(
+    request: Request, filters: Annotated[CollectionPointsChangeFilters, Query()]
+):
+    """Eventos create/update/delete em Server-Sent Events, opcionalmente filtrados."""
+    feed = collection_points_service.changes
+
+    async def events():
+        # A assinatura nasce com o stream: uma resposta que nunca chega a
+        # ser enviada não deixa assinante para trás.
+        subscription = None
+        try:
+            subscription = feed.subscribe(
+                filters, max_queue=settings.COLLECTION_POINTS_EVENTS_QUEUE_SIZE
+            )
+            yield ": connected\n\n"
+            while not await request.is_disconnected():
+                messages = await subscription.next_messages(
+                    timeout=settings.COLLECTION_POINTS_EVENTS_HEARTBEAT_S
+                )
+                yield "".join(messages) or ": keep-alive\n\n"
+        finally:
+            if subscription is not None:
+                feed.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/autocomplete", response_model=CollectionPointsAutocompleteResponse)
+def autocomplete_collection_points(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+):
+    not_modified = _check_etag(request, response)
+    if not_modified is not None:
+        return not_modified
+    suggestions = collection_points_service.get_suggestions(q, limit)
+    return CollectionPointsAutocompleteResponse(
+        success=True,
+        data=[
+            CollectionPointSuggestion(text=s.text, type=s.kind, count=s.count)
+            for s in suggestions
+        ],
+        query=q,
+        message=f"Found {len(suggestions)} suggestions",
+    )
+
+
+@router.get("/facets", response_model=CollectionPointsFacetsResponse)
+def get_collection_points_facets(
+    request: Request, response: Response, filters: CollectionPointFilters = Depends()
+):
+    not_modified = _check_etag(request, response)
+    if not_modified is not None:
+        return not_modified
+    try:
+        facets = collection_points_service.get_facets(filters)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return CollectionPointsFacetsResponse(
+        success=True,
+        data=CollectionPointFacets(**facets),
+        message="Facets retrieved successfully",
+    )
+
+
+@router.get("/clusters", response_model=CollectionPointsClustersResponse)
+def get_collection_points_clusters(
+    request: Request,
+    response: Response,
+    viewport: Annotated[CollectionPointsViewport, Query()],
+):
+    """Marcadores do mapa para a área visível: grupos por zoom ou, de perto, os pontos."""
+    not_modified = _check_etag(request, response)
+    if not_modified is not None:
+        return not_modified
+    clusters, points = collection_points_service.get_map_view(
+        viewport.box, viewport.zoom
+    )
+    return CollectionPointsClustersResponse(
+        success=True,
+        zoom=viewport.zoom,
+        clusters=[CollectionPointCluster(**cluster._asdict()) for cluster in clusters],
+        points=points,
+        message=f"Found {len(clusters)} clusters and {len(points)} points",
     )
 
 
 @router.get("/{point_id}", response_model=CollectionPointResponse)
-async def get_collection_point(point_id: str):
+def get_collection_point(point_id: str):
     point = collection_points_service.get_collection_point_by_id(point_id)
     if not point:
         raise HTTPException(status_code=404, detail="Collection point not found")
@@ -35,38 +282,65 @@ async def get_collection_point(point_id: str):
 
 
 @router.get("/statistics/", response_model=CollectionPointsStatisticsResponse)
-async def get_collection_points_statistics():
+def get_collection_points_statistics(request: Request, response: Response):
+    not_modified = _check_etag(request, response)
+    if not_modified is not None:
+        return not_modified
     stats = collection_points_service.get_collection_points_statistics()
     return CollectionPointsStatisticsResponse(
         success=True, data=stats, message="Statistics retrieved successfully"
     )
 
 
+@router.get("/cache/")
+def get_query_cache_info():
+    return {
+        "success": True,
+        "data": collection_points_service.get_query_cache_info(),
+        "message": "Query cache statistics retrieved successfully",
+    }
+
+
 @router.get("/materials/")
-async def get_available_materials():
+def get_available_materials(request: Request, response: Response):
+    not_modified = _check_etag(request, response)
+    if not_modified is not None:
+        return not_modified
+    counts = collection_points_service.get_facets(CollectionPointFilters())["materials"]
     return {
         "success": True,
-        "data": AVAILABLE_MATERIALS,
-        "total": len(AVAILABLE_MATERIALS),
+        "data": sorted(counts),
+        "counts": counts,
+        "total": len(counts),
         "message": "Available materials retrieved successfully",
     }
 
 
 @router.get("/neighborhoods/")
-async def get_available_neighborhoods():
+def get_available_neighborhoods(request: Request, response: Response):
+    not_modified = _check_etag(request, response)
+    if not_modified is not None:
+        return not_modified
+    counts = collection_points_service.get_facets(CollectionPointFilters())[
+        "neighborhoods"
+    ]
     return {
         "success": True,
-        "data": AVAILABLE_NEIGHBORHOODS,
-        "total": len(AVAILABLE_NEIGHBORHOODS),
+        "data": sorted(counts),
+        "counts": counts,
+        "total": len(counts),
         "message": "Available neighborhoods retrieved successfully",
     }
 
 
 @router.post("/", response_model=CollectionPointResponse)
-async def create_collection_point(collection_point: CollectionPointCreate):
-    new_collection_point = collection_points_service.create_collection_point(
-        collection_point
-    )
+def create_collection_point(collection_point: CollectionPointCreate):
+    try:
+        new_collection_point = collection_points_service.create_collection_point(
+            collection_point
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     return CollectionPointResponse(
         success=True,
         data=new_collection_point,
@@ -74,10 +348,91 @@ async def create_collection_point(collection_point: CollectionPointCreate):
     )
 
 
+@router.post("/batch", response_model=CollectionPointsBatchResponse)
+def query_collection_points_batch(batch: CollectionPointsBatchRequest):
+    pages = collection_points_service.get_collection_points_pages(batch.queries)
+    results = {}
+    for index, page in enumerate(pages):
+        if isinstance(page, ValueError):
+            results[index] = CollectionPointsListResponse(
+                success=False, data=[], total=0, message=str(page)
+            )
+        else:
+            results[index] = CollectionPointsListResponse(
+                success=True,
+                data=page.items,
+                total=page.total,
+                next_cursor=page.next_cursor,
+                message=f"Found {page.total} collection points",
+            )
+    failed = sum(not result.success for result in results.values())
+    return CollectionPointsBatchResponse(
+        success=failed == 0,
+        results=results,
+        message=f"{len(results) - failed} of {len(results)} queries succeeded",
+    )
+
+
+@router.post("/import", response_model=CollectionPointsImportResponse)
+async def import_collection_points(request: Request, format: Optional[str] = None):
+    fmt = format or import_format(request.headers.get("content-type", ""))
+    if fmt not in IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=415,
+            detail="Send text/csv or application/x-ndjson, or pass ?format=csv|ndjson",
+        )
+    try:
+        valid, errors = await read_import(
+            request.stream(), fmt, collection_points_service.geocoder
+        )
+    except ImportTooLarge as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    except (UnicodeDecodeError, csv.Error) as exc:
+        raise HTTPException(status_code=400, detail=f"Unreadable upload: {exc}")
+    created = await run_in_threadpool(
+        collection_points_service.bulk_create_collection_points, valid
+    )
+    return CollectionPointsImportResponse(
+        success=not errors,
+        created=len(created),
+        failed=len(errors),
+        errors=errors,
+        message=f"Imported {len(created)} collection points, {len(errors)} rows rejected",
+    )
+
+
+@router.patch("/bulk", response_model=CollectionPointsBulkResponse)
+def bulk_update_collection_points(bulk_update: CollectionPointsBulkUpdate):
+    try:
+        updated = collection_points_service.bulk_update_collection_points(
+            bulk_update.changes, ids=bulk_update.ids, filters=bulk_update.filters
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return CollectionPointsBulkResponse(
+        success=True,
+        matched=len(updated),
+        message=f"Updated {len(updated)} collection points",
+    )
+
+
+@router.delete("/bulk", response_model=CollectionPointsBulkResponse)
+def bulk_delete_collection_points(selector: CollectionPointsSelector):
+    try:
+        deleted = collection_points_service.bulk_delete_collection_points(
+            ids=selector.ids, filters=selector.filters
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return CollectionPointsBulkResponse(
+        success=True,
+        matched=len(deleted),
+        message=f"Deleted {len(deleted)} collection points",
+    )
+
+
 @router.put("/{point_id}", response_model=CollectionPointResponse)
-async def update_collection_point(
-    point_id: str, collection_point: CollectionPointUpdate
-):
+def update_collection_point(point_id: str, collection_point: CollectionPointUpdate):
     updated_point = collection_points_service.update_collection_point(
         point_id, collection_point
     )
@@ -91,7 +446,7 @@ async def update_collection_point(
 
 
 @router.delete("/{point_id}", response_model=CollectionPointResponse)
-async def delete_collection_point(point_id: str):
+def delete_collection_point(point_id: str):
     deleted_point = collection_points_service.delete_collection_point(point_id)
     if not deleted_point:
         raise HTTPException(status_code=404, detail="Collection point not found")
@@ -6,5 +6,36 @@ load_dotenv()
 class Settings:
     GEMINI_API_KEY: str = os.getenv('GEMINI_API_KEY')
     GEMINI_API_URL: str = 'https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent'
+    # "memory" (padrão, por processo), "sqlite" (arquivo compartilhado entre
+    # workers) ou "shared" (memória por worker sincronizada por um log).
+    COLLECTION_POINTS_BACKEND: str = os.getenv('COLLECTION_POINTS_BACKEND', 'memory')
+    COLLECTION_POINTS_SQLITE_PATH: str = os.getenv('COLLECTION_POINTS_SQLITE_PATH', 'collection_points.db')
+    COLLECTION_POINTS_SQLITE_POOL_SIZE: int = int(os.getenv('COLLECTION_POINTS_SQLITE_POOL_SIZE', '4'))
+    # "shared": cada worker mantém os pontos em memória e acompanha este log de
+    # mudanças (SQLite), consultado a cada COLLECTION_POINTS_CHANGE_LOG_POLL_MS.
+    COLLECTION_POINTS_CHANGE_LOG_PATH: str = os.getenv('COLLECTION_POINTS_CHANGE_LOG_PATH', 'collection_points_changes.db')
+    COLLECTION_POINTS_CHANGE_LOG_POLL_MS: int = int(os.getenv('COLLECTION_POINTS_CHANGE_LOG_POLL_MS', '20'))
+    # Ids removidos lembrados para /changes; quem sincroniza de antes do
+    # tombstone mais antigo descartado recebe um snapshot completo.
+    COLLECTION_POINTS_TOMBSTONE_LIMIT: int = int(os.getenv('COLLECTION_POINTS_TOMBSTONE_LIMIT', '10000'))
+    COLLECTION_POINTS_GRID_CELL_DEG: float = float(os.getenv('COLLECTION_POINTS_GRID_CELL_DEG', '0.05'))
+    # Tamanho 0 desliga o cache. Buscas com lat/lng arredondados para esta
+    # quantidade de casas decimais iguais dividem a mesma resposta, calculada
+    # a partir do centro da primeira (3 casas: erro de até ~157 m).
+    COLLECTION_POINTS_CACHE_SIZE: int = int(os.getenv('COLLECTION_POINTS_CACHE_SIZE', '256'))
+    COLLECTION_POINTS_CACHE_COORD_DECIMALS: int = int(os.getenv('COLLECTION_POINTS_CACHE_COORD_DECIMALS', '3'))
+    # Feed de mudanças (SSE): eventos pendentes por assinante antes de um
+    # "resync", e intervalo dos comentários keep-alive em segundos.
+    COLLECTION_POINTS_EVENTS_QUEUE_SIZE: int = int(os.getenv('COLLECTION_POINTS_EVENTS_QUEUE_SIZE', '1000'))
+    COLLECTION_POINTS_EVENTS_HEARTBEAT_S: float = float(os.getenv('COLLECTION_POINTS_EVENTS_HEARTBEAT_S', '15'))
+    # Limites de POST /import: corpos maiores são recusados com 413.
+    COLLECTION_POINTS_IMPORT_MAX_ROWS: int = int(os.getenv('COLLECTION_POINTS_IMPORT_MAX_ROWS', '100000'))
+    COLLECTION_POINTS_IMPORT_MAX_BYTES: int = int(os.getenv('COLLECTION_POINTS_IMPORT_MAX_BYTES', str(50 * 1024 * 1024)))
+    # Tabela local CEP -> coordenadas (CSV cep,lat,lng); vazio usa a tabela
+    # embutida em app/data. As buscas passam por um LRU deste tamanho.
+    CEP_TABLE_PATH: str = os.getenv('CEP_TABLE_PATH', '')
+    CEP_CACHE_SIZE: int = int(os.getenv('CEP_CACHE_SIZE', '4096'))
+    # Fuso em que os horários de funcionamento dos pontos são interpretados.
+    OPERATING_HOURS_TIMEZONE: str = os.getenv('OPERATING_HOURS_TIMEZONE', 'America/Sao_Paulo')
 
 settings = Settings() 
\ No newline at end of file
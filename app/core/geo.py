@@ -0,0 +1,51 @@
+from math import asin, cos, degrees, pi, radians, sin, sqrt
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
+    c = 2 * asin(sqrt(min(a, 1.0)))
+    return c * EARTH_RADIUS_KM
+
+
+def bounding_box(lat: float, lng: float, radius_km: float):
+    """Retorna (min_lat, min_lng, max_lat, max_lng) que contém o círculo.
+
+    Quando o círculo alcança um polo a caixa cobre todas as longitudes.
+    """
+    angular = radius_km / EARTH_RADIUS_KM
+    dlat = degrees(angular)
+    cos_lat = cos(radians(lat))
+    if angular >= pi / 2 or sin(angular) >= cos_lat:
+        return lat - dlat, -180.0, lat + dlat, 180.0
+    dlng = degrees(asin(sin(angular) / cos_lat))
+    return lat - dlat, lng - dlng, lat + dlat, lng + dlng
+
+
+def haversine_km_many(
+    lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray
+) -> np.ndarray:
+    """Distância de (lat, lng) até cada par de `lats`/`lngs`, numa única chamada."""
+    lat1, lng1 = radians(lat), radians(lng)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlng = np.radians(lngs) - lng1
+    a = np.sin(dlat / 2) ** 2 + cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def in_bounding_box(
+    lats: np.ndarray, lngs: np.ndarray, min_lat, min_lng, max_lat, max_lng
+) -> np.ndarray:
+    """Máscara booleana equiretangular; coordenadas NaN nunca passam."""
+    mask = (lats >= min_lat) & (lats <= max_lat)
+    if min_lng >= -180.0 and max_lng <= 180.0:
+        mask &= (lngs >= min_lng) & (lngs <= max_lng)
+    return mask
@@ -333,17 +333,3 @@ MOCK_COLLECTION_POINTS: List[Dict[str, Any]] = [
         "accepts_all_materials": True
     }
 ]
-
-
-# Available materials for filtering
-AVAILABLE_MATERIALS = [
-    "Papel",
-    "Plástico", 
-    "Vidro",
-    "Metal",
-    "Eletrônicos",
-    "Óleo de Cozinha"
-]
-
-# Available neighborhoods for filtering
-AVAILABLE_NEIGHBORHOODS = list(set(point["neighborhood"] for point in MOCK_COLLECTION_POINTS)) 
\ No newline at end of file
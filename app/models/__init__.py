@@ -7,7 +7,26 @@ from .collection_point import (
     CollectionPointUpdate,
     CollectionPointResponse,
     CollectionPointsListResponse,
+    CollectionPointsNearestResponse,
+    CollectionPointOnRoute,
+    CollectionPointsCorridorResponse,
+    CollectionPointsChangesResponse,
+    CollectionPointsImportResponse,
+    CollectionPointRowError,
     CollectionPointsSearchResponse,
+    CollectionPointSuggestion,
+    CollectionPointsAutocompleteResponse,
+    CollectionPointFacets,
+    CollectionPointsFacetsResponse,
+    CollectionPointCluster,
+    CollectionPointsClustersResponse,
     CollectionPointsStatisticsResponse,
-    CollectionPointFilters
+    CollectionPointFilters,
+    CollectionPointsSelector,
+    CollectionPointsBulkUpdate,
+    CollectionPointsBulkResponse,
+    CollectionPointsBatchRequest,
+    CollectionPointsBatchResponse,
+    CollectionPointsChangeFilters,
+    CollectionPointsViewport,
 ) 
\ No newline at end of file
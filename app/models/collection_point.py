@@ -2,8 +2,8 @@
 Collection Point Models - Data models for collection points
 """
 
-from typing import List, Optional
-from pydantic import BaseModel, Field
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field, model_validator
 from datetime import datetime
 
 
@@ -26,8 +26,15 @@ class CollectionPointBase(BaseModel):
 
 
 class CollectionPointCreate(CollectionPointBase):
-    """Model for creating a new collection point"""
-    pass
+    """Model for creating a new collection point; coordinates default to the CEP's centroid"""
+    lat: Optional[float] = Field(None, description="Latitude coordinate (geocoded from the CEP when omitted)")
+    lng: Optional[float] = Field(None, description="Longitude coordinate (geocoded from the CEP when omitted)")
+
+    @model_validator(mode="after")
+    def check_coordinates(self):
+        if (self.lat is None) != (self.lng is None):
+            raise ValueError("Provide both lat and lng, or neither")
+        return self
 
 
 class CollectionPointUpdate(BaseModel):
@@ -65,6 +72,11 @@ class CollectionPointWithDistance(CollectionPoint):
     distance_km: Optional[float] = Field(None, description="Distance in kilometers")
 
 
+class CollectionPointOnRoute(CollectionPointWithDistance):
+    """Collection point found along a route; distance_km is measured to the route"""
+    route_km: float = Field(..., description="Position along the route, in kilometers from its start")
+
+
 class CollectionPointResponse(BaseModel):
     """Response model for collection point operations"""
     success: bool = Field(..., description="Operation success status")
@@ -77,6 +89,33 @@ class CollectionPointsListResponse(BaseModel):
     success: bool = Field(..., description="Operation success status")
     data: List[CollectionPoint] = Field(..., description="List of collection points")
     total: int = Field(..., description="Total number of collection points")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page, if any")
+    message: str = Field("", description="Response message")
+
+
+class CollectionPointsNearestResponse(BaseModel):
+    """Response model for nearest collection points operations"""
+    success: bool = Field(..., description="Operation success status")
+    data: List[CollectionPointWithDistance] = Field(..., description="Nearest collection points, closest first")
+    total: int = Field(..., description="Number of collection points returned")
+    message: str = Field("", description="Response message")
+
+
+class CollectionPointsCorridorResponse(BaseModel):
+    """Response model for collection points along a route"""
+    success: bool = Field(..., description="Operation success status")
+    data: List[CollectionPointOnRoute] = Field(..., description="Collection points in the order they appear along the route")
+    total: int = Field(..., description="Number of collection points returned")
+    message: str = Field("", description="Response message")
+
+
+class CollectionPointsChangesResponse(BaseModel):
+    """Response model for delta sync; a snapshot replaces the client's whole copy"""
+    success: bool = Field(..., description="Operation success status")
+    version: int = Field(..., description="Version to send as `since` on the next sync")
+    snapshot: bool = Field(..., description="Whether upserts holds every point instead of a delta")
+    upserts: List[CollectionPoint] = Field(..., description="Collection points created or changed")
+    deleted_ids: List[str] = Field(..., description="Ids of deleted collection points")
     message: str = Field("", description="Response message")
 
 
@@ -89,6 +128,67 @@ class CollectionPointsSearchResponse(BaseModel):
     message: str = Field("", description="Response message")
 
 
+class CollectionPointSuggestion(BaseModel):
+    """One autocomplete suggestion"""
+    text: str = Field(..., description="Suggested name, street, neighborhood or material")
+    type: str = Field(..., description="Field the suggestion comes from: name, street, neighborhood or material")
+    count: int = Field(..., description="Number of active collection points with this value")
+
+
+class CollectionPointsAutocompleteResponse(BaseModel):
+    """Response model for autocomplete suggestions"""
+    success: bool = Field(..., description="Operation success status")
+    data: List[CollectionPointSuggestion] = Field(..., description="Suggestions, best first")
+    query: str = Field(..., description="Prefix used")
+    message: str = Field("", description="Response message")
+
+
+class CollectionPointRowError(BaseModel):
+    """Validation errors for one row of a bulk import"""
+    row: int = Field(..., description="1-based row (CSV) or line (NDJSON) number")
+    errors: List[dict] = Field(..., description="Validation errors for the row")
+
+
+class CollectionPointsImportResponse(BaseModel):
+    """Response model for bulk import operations"""
+    success: bool = Field(..., description="Operation success status")
+    created: int = Field(..., description="Number of collection points created")
+    failed: int = Field(..., description="Number of rows rejected")
+    errors: List[CollectionPointRowError] = Field(default_factory=list, description="Per-row validation errors")
+    message: str = Field("", description="Response message")
+
+
+class CollectionPointFacets(BaseModel):
+    """Number of matching collection points per value"""
+    materials: Dict[str, int] = Field(..., description="Points per accepted material")
+    neighborhoods: Dict[str, int] = Field(..., description="Points per neighborhood")
+    cities: Dict[str, int] = Field(..., description="Points per city")
+
+
+class CollectionPointsFacetsResponse(BaseModel):
+    """Response model for collection points facet counts"""
+    success: bool = Field(..., description="Operation success status")
+    data: CollectionPointFacets = Field(..., description="Counts per material, neighborhood and city")
+    message: str = Field("", description="Response message")
+
+
+class CollectionPointCluster(BaseModel):
+    """Group of nearby active collection points at a zoom level"""
+    lat: float = Field(..., description="Centroid latitude")
+    lng: float = Field(..., description="Centroid longitude")
+    count: int = Field(..., description="Number of collection points in the group")
+    materials: Dict[str, int] = Field(..., description="Points in the group per accepted material")
+
+
+class CollectionPointsClustersResponse(BaseModel):
+    """Response model for a map viewport: clusters, or points at high zoom"""
+    success: bool = Field(..., description="Operation success status")
+    zoom: int = Field(..., description="Zoom level used")
+    clusters: List[CollectionPointCluster] = Field(default_factory=list, description="Groups of points, empty at high zoom")
+    points: List[CollectionPoint] = Field(default_factory=list, description="Individual points, only at high zoom")
+    message: str = Field("", description="Response message")
+
+
 class CollectionPointsStatisticsResponse(BaseModel):
     """Response model for collection points statistics"""
     success: bool = Field(..., description="Operation success status")
@@ -105,6 +205,102 @@ class CollectionPointFilters(BaseModel):
     search: Optional[str] = Field(None, description="Search query")
     lat: Optional[float] = Field(None, description="Latitude for proximity search")
     lng: Optional[float] = Field(None, description="Longitude for proximity search")
+    cep: Optional[str] = Field(None, description="CEP used as the proximity center instead of lat/lng")
     radius_km: Optional[float] = Field(5.0, description="Radius for proximity search in kilometers")
     accepts_all_materials: Optional[bool] = Field(None, description="Filter by accepts all materials")
-    is_active: Optional[bool] = Field(True, description="Filter by active status") 
\ No newline at end of file
+    is_active: Optional[bool] = Field(True, description="Filter by active status")
+    open_at: Optional[datetime] = Field(None, description="Only points open at this moment; times without an offset are local to the points")
+    open_now: Optional[bool] = Field(None, description="Only points open right now (shorthand for open_at with the current time); only true is accepted")
+    limit: Optional[int] = Field(None, ge=1, le=500, description="Maximum number of results per page")
+    cursor: Optional[str] = Field(None, description="Opaque cursor returned as next_cursor by the previous page")
+
+
+class CollectionPointsSelector(BaseModel):
+    """Selects collection points either by an id list or by filters"""
+    ids: Optional[List[str]] = Field(None, description="Collection point ids")
+    filters: Optional[CollectionPointFilters] = Field(None, description="Filters selecting the collection points")
+
+    @model_validator(mode="after")
+    def check_single_selector(self):
+        if (self.ids is None) == (self.filters is None):
+            raise ValueError("Provide either ids or filters")
+        return self
+
+
+class CollectionPointsBulkUpdate(CollectionPointsSelector):
+    """Model for updating many collection points at once"""
+    changes: CollectionPointUpdate = Field(..., description="Fields to set on every selected point")
+
+
+class CollectionPointsBulkResponse(BaseModel):
+    """Response model for bulk update and delete operations"""
+    success: bool = Field(..., description="Operation success status")
+    matched: int = Field(..., description="Number of collection points affected")
+    message: str = Field("", description="Response message")
+
+
+class CollectionPointsBatchRequest(BaseModel):
+    """Several list queries answered together against the same data version"""
+    queries: List[CollectionPointFilters] = Field(..., min_length=1, max_length=50, description="Queries to run")
+
+
+class CollectionPointsBatchResponse(BaseModel):
+    """Response model for batch queries; results are keyed by query index"""
+    success: bool = Field(..., description="Whether every query succeeded")
+    results: Dict[int, CollectionPointsListResponse] = Field(..., description="Result of each query by its index")
+    message: str = Field("", description="Response message")
+
+
+class CollectionPointsChangeFilters(BaseModel):
+    """Filters for a change feed subscription; the bounding box needs all four corners"""
+    city: Optional[str] = Field(None, description="Only changes to points in this city")
+    material: Optional[str] = Field(None, description="Only changes to points accepting this material")
+    min_lat: Optional[float] = Field(None, ge=-90, le=90, description="Bounding box south edge")
+    min_lng: Optional[float] = Field(None, ge=-180, le=180, description="Bounding box west edge")
+    max_lat: Optional[float] = Field(None, ge=-90, le=90, description="Bounding box north edge")
+    max_lng: Optional[float] = Field(None, ge=-180, le=180, description="Bounding box east edge")
+
+    @model_validator(mode="after")
+    def check_bounding_box(self):
+        corners = (self.min_lat, self.min_lng, self.max_lat, self.max_lng)
+        if any(value is not None for value in corners):
+            if any(value is None for value in corners):
+                raise ValueError("Bounding box needs min_lat, min_lng, max_lat and max_lng")
+            if self.min_lat > self.max_lat:
+                raise ValueError("min_lat must not be greater than max_lat")
+        return self
+
+    def matches(self, point: CollectionPoint) -> bool:
+        if self.city and point.city.lower() != self.city.lower():
+            return False
+        if self.material and self.material not in point.materials:
+            return False
+        if self.min_lat is not None:
+            if not self.min_lat <= point.lat <= self.max_lat:
+                return False
+            # min_lng > max_lng: a caixa cruza o antimeridiano.
+            if self.min_lng <= self.max_lng:
+                return self.min_lng <= point.lng <= self.max_lng
+            return point.lng >= self.min_lng or point.lng <= self.max_lng
+        return True
+
+
+class CollectionPointsViewport(BaseModel):
+    """Map viewport: bounding box and zoom level"""
+    min_lat: float = Field(..., ge=-90, le=90, description="Bounding box south edge")
+    min_lng: float = Field(..., ge=-180, le=180, description="Bounding box west edge")
+    max_lat: float = Field(..., ge=-90, le=90, description="Bounding box north edge")
+    max_lng: float = Field(..., ge=-180, le=180, description="Bounding box east edge")
+    zoom: int = Field(..., ge=0, le=22, description="Map zoom level; points are clustered up to zoom 16")
+
+    @model_validator(mode="after")
+    def check_bounding_box(self):
+        if self.min_lat > self.max_lat:
+            raise ValueError("min_lat must not be greater than max_lat")
+        if self.min_lng > self.max_lng:
+            raise ValueError("min_lng must not be greater than max_lng")
+        return self
+
+    @property
+    def box(self) -> Tuple[float, float, float, float]:
+        return (self.min_lat, self.min_lng, self.max_lat, self.max_lng)
@@ -0,0 +1,46 @@
+# Repositories module
+
+from ..core.config import settings
+from ..data.mock_collection_points import MOCK_COLLECTION_POINTS
+from ..models.collection_point import CollectionPoint
+from .base import ChangeSet, CollectionPointsRepository, SortKey
+from .change_log import Change, ChangeLog
+from .memory import InMemoryCollectionPointsRepository
+from .shared import SharedCollectionPointsRepository
+from .sqlite import SQLiteCollectionPointsRepository
+
+COLLECTION_POINTS_BACKENDS = ("memory", "sqlite", "shared")
+
+
+def create_repository() -> CollectionPointsRepository:
+    """Repositório escolhido em `COLLECTION_POINTS_BACKEND`, com os pontos de
+    exemplo carregados quando ainda está vazio."""
+    backend = settings.COLLECTION_POINTS_BACKEND
+    seed = (CollectionPoint(**point) for point in MOCK_COLLECTION_POINTS)
+    if backend in ("memory", "shared"):
+        repository = InMemoryCollectionPointsRepository(
+            seed,
+            cell_size_deg=settings.COLLECTION_POINTS_GRID_CELL_DEG,
+            tombstone_limit=settings.COLLECTION_POINTS_TOMBSTONE_LIMIT,
+        )
+        if backend == "shared":
+            repository = SharedCollectionPointsRepository(
+                repository,
+                ChangeLog(settings.COLLECTION_POINTS_CHANGE_LOG_PATH),
+                poll_interval=settings.COLLECTION_POINTS_CHANGE_LOG_POLL_MS / 1000,
+                tombstone_limit=settings.COLLECTION_POINTS_TOMBSTONE_LIMIT,
+            )
+        return repository
+    if backend == "sqlite":
+        repository = SQLiteCollectionPointsRepository(
+            settings.COLLECTION_POINTS_SQLITE_PATH,
+            pool_size=settings.COLLECTION_POINTS_SQLITE_POOL_SIZE,
+            tombstone_limit=settings.COLLECTION_POINTS_TOMBSTONE_LIMIT,
+        )
+        if len(repository) == 0:
+            repository.apply_batch(upserts=seed)
+        return repository
+    raise ValueError(
+        f"Unknown COLLECTION_POINTS_BACKEND {backend!r}; "
+        f"expected one of {COLLECTION_POINTS_BACKENDS}"
+    )
@@ -0,0 +1,170 @@
+from abc import ABC, abstractmethod
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from ..models.collection_point import CollectionPoint, CollectionPointFilters
+from ..services.cluster_index import Box, Cluster
+from ..services.route_corridor import Route
+from ..services.term_index import Suggestion
+
+# Chave de ordenação das listagens: (distância em km, id) nas buscas por
+# proximidade, (-relevância, id) nas buscas textuais sem proximidade e
+# (None, id) nas demais. É também o conteúdo dos cursores.
+SortKey = Tuple[Optional[float], str]
+
+# Chamado com (id, ponto novo ou None, ponto anterior ou None).
+ChangeListener = Callable[
+    [str, Optional[CollectionPoint], Optional[CollectionPoint]], None
+]
+
+
+class ChangeSet(NamedTuple):
+    """Mudanças até `version`: pontos criados ou alterados e ids removidos.
+
+    Com `snapshot`, `upserts` traz todos os pontos existentes e quem recebe
+    deve descartar a cópia local em vez de aplicar um delta.
+    """
+
+    version: int
+    upserts: List[CollectionPoint]
+    deleted_ids: List[str]
+    snapshot: bool = False
+
+
+class CollectionPointsRepository(ABC):
+    """Armazenamento dos pontos de coleta usado pelo `CollectionPointsService`.
+
+    O serviço cuida de cache, cursores e montagem das respostas; o repositório
+    guarda os pontos e resolve filtros, proximidade e ordenação. Escritas são
+    serializadas pelo serviço, então as implementações não precisam de lock
+    próprio para mutações.
+    """
+
+    @abstractmethod
+    def __len__(self) -> int: ...
+
+    @property
+    @abstractmethod
+    def version(self) -> str:
+        """Identifica o estado atual dos dados; muda a cada escrita."""
+
+    @property
+    @abstractmethod
+    def change_version(self) -> int:
+        """Contador que avança a cada ponto criado, alterado ou removido."""
+
+    @abstractmethod
+    def changes_since(self, since: int) -> Optional[ChangeSet]:
+        """Estado final de cada ponto alterado depois da versão `since`.
+
+        None quando o histórico não alcança `since` (compactado, ou versão
+        desconhecida): quem chama deve recorrer a um snapshot completo.
+        """
+
+    @abstractmethod
+    def get(self, point_id: str) -> Optional[CollectionPoint]: ...
+
+    @abstractmethod
+    def iter_matching(
+        self, filters: CollectionPointFilters, after: Optional[SortKey] = None
+    ) -> Iterator[Tuple[Optional[float], CollectionPoint]]:
+        """Pontos que atendem a todos os filtros, em ordem de chave.
+
+        Com lat/lng a ordem é (distância, id) dentro de `radius_km`; sem eles,
+        uma busca textual (`search`, ver `text_index.py`) ordena por
+        relevância e as demais consultas por id. `after` retoma a iteração
+        depois da chave informada. `limit` e `cursor` dos filtros são ignorados.
+        """
+
+    @abstractmethod
+    def count_matching(self, filters: CollectionPointFilters) -> int: ...
+
+    @abstractmethod
+    def matching(
+        self, filters: CollectionPointFilters, after: Optional[SortKey] = None
+    ) -> Tuple[int, Iterator[Tuple[Optional[float], CollectionPoint]]]:
+        """`count_matching` e `iter_matching` numa mesma avaliação dos filtros.
+
+        O total conta todos os pontos que atendem aos filtros, inclusive os
+        que vêm antes de `after`; a busca por raio e a busca textual são
+        feitas uma vez só para as duas coisas.
+        """
+
+    @abstractmethod
+    def nearest(
+        self, lat: float, lng: float, k: int, filters: CollectionPointFilters
+    ) -> List[Tuple[float, CollectionPoint]]:
+        """Os `k` pontos mais próximos que atendem aos filtros, sem limite de raio."""
+
+    @abstractmethod
+    def statistics(self) -> Dict[str, Any]: ...
+
+    @abstractmethod
+    def suggest(self, prefix: str, limit: int) -> List[Suggestion]:
+        """Autocomplete: nomes, ruas, bairros e materiais de pontos ativos com
+        uma palavra começando por `prefix` (ver `term_index.py`)."""
+
+    @abstractmethod
+    def facets(self, filters: CollectionPointFilters) -> Dict[str, Dict[str, int]]:
+        """Contagens por valor ("materials", "neighborhoods" e "cities") entre
+        os pontos que atendem aos filtros; valores sem pontos ficam de fora."""
+
+    @abstractmethod
+    def clusters(self, zoom: int, box: Box) -> List[Cluster]:
+        """Grupos de pontos ativos que tocam a caixa, num zoom de 0 a
+        `MAX_CLUSTER_ZOOM` (ver `cluster_index.py`)."""
+
+    @abstractmethod
+    def points_in_box(self, box: Box) -> List[CollectionPoint]:
+        """Pontos ativos dentro da caixa, em ordem de id."""
+
+    @abstractmethod
+    def along_route(
+        self,
+        route: Route,
+        buffer_km: float,
+        filters: CollectionPointFilters,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[float, float, CollectionPoint]]:
+        """(posição na rota em km, distância até ela em km, ponto) dos pontos
+        que atendem aos filtros a até `buffer_km` da rota, em ordem de
+        posição. Só os filtros de atributo se aplicam (ver `Route.corridor`)."""
+
+    @abstractmethod
+    def add(self, point: CollectionPoint) -> None: ...
+
+    @abstractmethod
+    def update(self, point: CollectionPoint) -> None: ...
+
+    @abstractmethod
+    def remove(self, point_id: str) -> Optional[CollectionPoint]: ...
+
+    def snapshot(self) -> "CollectionPointsRepository":
+        """Visão somente leitura para responder várias consultas de uma vez.
+
+        Implementações podem fixar um único estado dos dados e reaproveitar
+        trabalho entre as consultas; por padrão é o próprio repositório.
+        """
+        return self
+
+    def listen(self, listener: ChangeListener) -> None:
+        """Registra quem avisar de mudanças feitas fora deste processo.
+
+        As mudanças feitas pelo próprio serviço ele já conhece; só
+        repositórios alimentados por outros workers precisam avisar.
+        """
+
+    @abstractmethod
+    def apply_batch(
+        self, upserts: Iterable[CollectionPoint] = (), removed_ids: Iterable[str] = ()
+    ) -> None:
+        """Aplica um lote de remoções e inserções/atualizações como uma escrita só."""
@@ -0,0 +1,253 @@
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+import sqlite3
+import uuid
+from contextlib import contextmanager
+
+from ..models.collection_point import CollectionPoint
+from .sqlite import SQLiteConnectionPool
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    point_id TEXT NOT NULL,
+    data TEXT
+);
+CREATE TABLE IF NOT EXISTS snapshot (
+    point_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+) WITHOUT ROWID;
+INSERT OR IGNORE INTO meta (key, value) VALUES ('compacted_through', '0');
+"""
+
+
+class Change(NamedTuple):
+    """Uma entrada do log; `point` None indica remoção de `point_id`."""
+
+    seq: int
+    point_id: str
+    point: Optional[CollectionPoint]
+
+
+class ChangeLog:
+    """Log de mudanças append-only numa tabela SQLite compartilhada pelos workers.
+
+    Cada escrita acrescenta uma linha por ponto alterado, com o ponto
+    completo (ou nada, numa remoção), dentro de uma transação BEGIN
+    IMMEDIATE: o lock de escrita do SQLite ordena as escritas de todos os
+    processos numa única sequência (`seq`).
+
+    A compactação guarda no máximo `tombstone_limit` remoções: as entradas
+    até a remoção mais antiga descartada (`compacted_through`) são aplicadas
+    na tabela `snapshot`, com todos os pontos no estado de `snapshot_seq`, e
+    saem do log. Quem está atrás desse horizonte parte do snapshot.
+
+    Leitura e escrita do log (`changed`, `read`, `writing`) não são
+    thread-safe: quem usa serializa o acesso. `changes_since` tem conexões
+    próprias e pode ser chamado de qualquer thread.
+    """
+
+    def __init__(self, path: str):
+        self._pool = SQLiteConnectionPool(path, 1)
+        self._readers = SQLiteConnectionPool(path, 2)
+        with self._pool.connection() as conn:
+            conn.executescript(SCHEMA)
+            conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('log_id', ?)",
+                (uuid.uuid4().hex,),
+            )
+            self.log_id = conn.execute(
+                "SELECT value FROM meta WHERE key = 'log_id'"
+            ).fetchone()[0]
+            self._data_version = self._read_data_version(conn)
+
+    def close(self) -> None:
+        self._pool.close()
+        self._readers.close()
+
+    def changed(self) -> bool:
+        """Se outra conexão gravou no arquivo desde a última chamada.
+
+        `PRAGMA data_version` não faz I/O, então pode ser consultado a cada
+        poucos milissegundos.
+        """
+        with self._pool.connection() as conn:
+            version = self._read_data_version(conn)
+        changed, self._data_version = version != self._data_version, version
+        return changed
+
+    def read(
+        self, after_seq: int, conn: Optional[sqlite3.Connection] = None
+    ) -> List[Change]:
+        """Mudanças com `seq` maior que `after_seq`, em ordem."""
+        if conn is None:
+            with self._pool.connection() as conn:
+                return self.read(after_seq, conn)
+        rows = conn.execute(
+            "SELECT seq, point_id, data FROM changes WHERE seq > ? ORDER BY seq",
+            (after_seq,),
+        ).fetchall()
+        return _changes(rows)
+
+    def read_snapshot(
+        self, after_seq: int, conn: sqlite3.Connection
+    ) -> Optional[Tuple[int, List[CollectionPoint]]]:
+        """(`snapshot_seq`, todos os pontos) se o log já não tem as entradas
+        seguintes a `after_seq`; None se `read` basta."""
+        if after_seq >= _meta_int(conn, "compacted_through"):
+            return None
+        rows = conn.execute("SELECT data FROM snapshot ORDER BY point_id").fetchall()
+        return _meta_int(conn, "snapshot_seq"), [
+            CollectionPoint.model_validate_json(data) for (data,) in rows
+        ]
+
+    def changes_since(self, after_seq: int) -> Optional[Tuple[int, List[Change]]]:
+        """(último `seq`, última mudança de cada ponto alterado depois de `after_seq`).
+
+        None se `after_seq` está além do fim do log ou antes do horizonte
+        compactado.
+        """
+        with self._readers.connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                horizon = _meta_int(conn, "compacted_through")
+                last = conn.execute(
+                    "SELECT COALESCE(MAX(seq), ?) FROM changes", (horizon,)
+                ).fetchone()[0]
+                if not horizon <= after_seq <= last:
+                    return None
+                rows = conn.execute(
+                    "SELECT seq, point_id, data FROM changes WHERE seq IN "
+                    "(SELECT MAX(seq) FROM changes WHERE seq > ? GROUP BY point_id) "
+                    "ORDER BY seq",
+                    (after_seq,),
+                ).fetchall()
+            finally:
+                conn.execute("COMMIT")
+        return last, _changes(rows)
+
+    @contextmanager
+    def reading(self) -> Iterator[sqlite3.Connection]:
+        """Transação de leitura: `read_snapshot` e `read` veem o mesmo estado."""
+        with self._pool.connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                yield conn
+            finally:
+                conn.execute("COMMIT")
+
+    @contextmanager
+    def writing(self) -> Iterator[sqlite3.Connection]:
+        """Transação de escrita: nenhum outro processo grava até ela terminar."""
+        with self._pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    @staticmethod
+    def append(
+        conn: sqlite3.Connection,
+        upserts: Iterable[CollectionPoint] = (),
+        removed_ids: Iterable[str] = (),
+    ) -> Optional[int]:
+        """Acrescenta as mudanças na transação de `conn`; devolve o último `seq`."""
+        conn.executemany(
+            "INSERT INTO changes (point_id, data) VALUES (?, NULL)",
+            [(point_id,) for point_id in removed_ids],
+        )
+        conn.executemany(
+            "INSERT INTO changes (point_id, data) VALUES (?, ?)",
+            [(point.id, point.model_dump_json()) for point in upserts],
+        )
+        return conn.execute("SELECT MAX(seq) FROM changes").fetchone()[0]
+
+    @staticmethod
+    def compact(
+        conn: sqlite3.Connection,
+        tombstone_limit: int,
+        current_seq: int,
+        current_points: Callable[[], Iterable[CollectionPoint]],
+    ) -> None:
+        """Descarta entradas superadas por uma mudança posterior do mesmo ponto
+        e, passando de `tombstone_limit` remoções, tudo até a mais antiga
+        descartada.
+
+        Remoções recentes continuam no log: um worker que só acompanha o log
+        precisa delas para não ressuscitar pontos. As descartadas entram no
+        snapshot, criado na primeira vez com `current_points()`, o estado de
+        quem compacta em `current_seq`.
+        """
+        conn.execute(
+            "DELETE FROM changes WHERE seq NOT IN "
+            "(SELECT MAX(seq) FROM changes GROUP BY point_id)"
+        )
+        (tombstones,) = conn.execute(
+            "SELECT COUNT(*) FROM changes WHERE data IS NULL"
+        ).fetchone()
+        excess = tombstones - tombstone_limit
+        if excess <= 0:
+            return
+        horizon = conn.execute(
+            "SELECT MAX(seq) FROM (SELECT seq FROM changes WHERE data IS NULL "
+            "ORDER BY seq LIMIT ?)",
+            (excess,),
+        ).fetchone()[0]
+        row = conn.execute(
+            "SELECT value FROM meta WHERE key = 'snapshot_seq'"
+        ).fetchone()
+        if row is None:
+            conn.executemany(
+                "INSERT INTO snapshot (point_id, data) VALUES (?, ?)",
+                [(point.id, point.model_dump_json()) for point in current_points()],
+            )
+            snapshot_seq = current_seq
+        else:
+            snapshot_seq = int(row[0])
+        rows = conn.execute(
+            "SELECT point_id, data FROM changes WHERE seq > ? AND seq <= ? "
+            "ORDER BY seq",
+            (snapshot_seq, horizon),
+        ).fetchall()
+        conn.executemany(
+            "INSERT OR REPLACE INTO snapshot (point_id, data) VALUES (?, ?)",
+            [(point_id, data) for point_id, data in rows if data is not None],
+        )
+        conn.executemany(
+            "DELETE FROM snapshot WHERE point_id = ?",
+            [(point_id,) for point_id, data in rows if data is None],
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('snapshot_seq', ?)",
+            (str(max(snapshot_seq, horizon)),),
+        )
+        conn.execute("DELETE FROM changes WHERE seq <= ?", (horizon,))
+        conn.execute(
+            "UPDATE meta SET value = ? WHERE key = 'compacted_through'",
+            (str(horizon),),
+        )
+
+    @staticmethod
+    def _read_data_version(conn: sqlite3.Connection) -> int:
+        return conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def _meta_int(conn: sqlite3.Connection, key: str) -> int:
+    return int(
+        conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+    )
+
+
+def _changes(rows) -> List[Change]:
+    return [
+        Change(
+            seq, point_id, CollectionPoint.model_validate_json(data) if data else None
+        )
+        for seq, point_id, data in rows
+    ]
@@ -0,0 +1,313 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import copy
+import uuid
+from bisect import bisect_left
+from itertools import dropwhile
+
+import numpy as np
+
+from ..models.collection_point import CollectionPoint, CollectionPointFilters
+from ..services.bitmap import bitmap_from_slots
+from ..services.cluster_index import Box, Cluster
+from ..services.collection_points_store import CollectionPointsStore
+from ..services.route_corridor import Route
+from ..services.term_index import Suggestion
+from .base import ChangeSet, CollectionPointsRepository, SortKey
+
+# Lotes que tocam mais que esta fração dos pontos reconstroem o store inteiro.
+BULK_REBUILD_FRACTION = 0.1
+
+
+class InMemoryCollectionPointsRepository(CollectionPointsRepository):
+    """Pontos mantidos no processo, num `CollectionPointsStore`.
+
+    Rápido e sem dependências, mas os dados se perdem ao reiniciar e não são
+    compartilhados entre workers. O store guarda registros compactos; os
+    modelos devolvidos são montados a cada leitura.
+
+    Cada store publicado é um snapshot imutável: escritas trabalham numa
+    cópia (`CollectionPointsStore.copy`) e a publicam trocando a referência
+    `self.store`, uma atribuição atômica. Leitores pegam essa referência uma
+    vez e seguem com ela, sem lock e sem ver escritas pela metade.
+
+    O histórico de mudanças guarda, por ponto, só a versão da última mudança;
+    ids removidos ficam como tombstones até passarem de `tombstone_limit`.
+    """
+
+    def __init__(
+        self,
+        points: Iterable[CollectionPoint] = (),
+        cell_size_deg: float = 0.05,
+        tombstone_limit: int = 10000,
+    ):
+        self.store = CollectionPointsStore(points, cell_size_deg=cell_size_deg)
+        self._cell_size_deg = cell_size_deg
+        self._instance_id = uuid.uuid4().hex
+        self._version = 0
+
+        self._tombstone_limit = tombstone_limit
+        self._change_seq = 0
+        # (versão, id) em ordem crescente, só acrescentado; entradas superadas
+        # por uma mudança posterior do mesmo id são descartadas de tempos em
+        # tempos, trocando a lista inteira.
+        self._history: List[Tuple[int, str]] = []
+        self._latest: Dict[str, int] = {}
+        self._tombstones: Dict[str, int] = {}
+        self._compacted_through = 0
+        # Só em visões de `snapshot`: resultados de `store.within_radius` por
+        # (lat, lng, raio), compartilhados entre as consultas da visão.
+        self._radius_memo: Optional[Dict[Tuple[float, float, float], Any]] = None
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    @property
+    def version(self) -> str:
+        return f"{self._instance_id}-{self._version}"
+
+    @property
+    def change_version(self) -> int:
+        return self._change_seq
+
+    def changes_since(self, since: int) -> Optional[ChangeSet]:
+        # A versão é lida antes do store: o store publicado já contém tudo até
+        # ela (ver `_publish`), e o que vier depois fica para a próxima sync.
+        version = self._change_seq
+        if since <= 0 or since < self._compacted_through or since > version:
+            return None
+        history, latest, store = self._history, self._latest, self.store
+        upserts, deleted_ids = [], []
+        for seq, point_id in history[bisect_left(history, (since + 1,)) :]:
+            if seq > version:
+                break
+            if latest.get(point_id) != seq:
+                continue
+            record = store.get(point_id)
+            if record is None:
+                deleted_ids.append(point_id)
+            else:
+                upserts.append(record.to_model())
+        return ChangeSet(version, upserts, deleted_ids)
+
+    def snapshot(self) -> "InMemoryCollectionPointsRepository":
+        """Visão presa ao store atual, em que consultas com o mesmo centro e
+        raio fazem uma única busca espacial. Não deve receber escritas.
+        """
+        view = copy.copy(self)
+        view._radius_memo = {}
+        return view
+
+    def get(self, point_id: str) -> Optional[CollectionPoint]:
+        record = self.store.get(point_id)
+        return record.to_model() if record else None
+
+    def iter_matching(
+        self, filters: CollectionPointFilters, after: Optional[SortKey] = None
+    ) -> Iterator[Tuple[Optional[float], CollectionPoint]]:
+        return self.matching(filters, after)[1]
+
+    def matching(
+        self, filters: CollectionPointFilters, after: Optional[SortKey] = None
+    ) -> Tuple[int, Iterator[Tuple[Optional[float], CollectionPoint]]]:
+        # O snapshot lido aqui vale até o fim da iteração.
+        store = self.store
+        bits = store.filter_bitmap(filters)
+        found = self._matching_slots(store, filters, bits)
+        if found is None:
+            return bits.bit_count(), self._iter_by_id(store, bits, after)
+        slots, keys = found
+        return len(slots), self._iter_by_key(store, slots, keys, after)
+
+    def count_matching(self, filters: CollectionPointFilters) -> int:
+        return self.matching(filters)[0]
+
+    def facets(self, filters: CollectionPointFilters) -> Dict[str, Dict[str, int]]:
+        store = self.store
+        bits = store.filter_bitmap(filters)
+        found = self._matching_slots(store, filters, bits)
+        if found is not None:
+            bits = bitmap_from_slots(found[0])
+        return store.facets(bits)
+
+    def _matching_slots(
+        self, store: CollectionPointsStore, filters: CollectionPointFilters, bits: int
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Slots do bitmap dentro do raio e/ou que atendem à busca textual,
+        com a chave de ordenação de cada um (distância ou -relevância); None
+        se a consulta não tem nenhum dos dois (o bitmap já é a resposta)."""
+        if filters.lat is not None and filters.lng is not None:
+            slots, keys = self._within_radius(store, filters, bits)
+            if filters.search:
+                found, _ = store.search(bits, filters.search)
+                matching = np.isin(slots, found)
+                slots, keys = slots[matching], keys[matching]
+            return slots, keys
+        if filters.search:
+            # Busca textual sem proximidade: mais relevantes primeiro.
+            slots, scores = store.search(bits, filters.search)
+            return slots, -scores
+        return None
+
+    @staticmethod
+    def _iter_by_id(
+        store: CollectionPointsStore, bits: int, after: Optional[SortKey]
+    ) -> Iterator[Tuple[Optional[float], CollectionPoint]]:
+        for point_id in store.ids_in_order(bits, after[1] if after else None):
+            yield None, store.points[point_id].to_model()
+
+    @staticmethod
+    def _iter_by_key(
+        store: CollectionPointsStore,
+        slots: np.ndarray,
+        keys: np.ndarray,
+        after: Optional[SortKey],
+    ) -> Iterator[Tuple[Optional[float], CollectionPoint]]:
+        if after is not None:
+            keep = keys >= after[0]
+            slots, keys = slots[keep], keys[keep]
+        ordered = store.ids_by_distance(slots, keys)
+        if after is not None:
+            ordered = dropwhile(lambda key: key <= after, ordered)
+        for key, point_id in ordered:
+            yield key, store.points[point_id].to_model()
+
+    def nearest(
+        self, lat: float, lng: float, k: int, filters: CollectionPointFilters
+    ) -> List[Tuple[float, CollectionPoint]]:
+        store = self.store
+        slots, km = store.nearest(lat, lng, k, store.filter_bitmap(filters))
+        return [
+            (distance, store.points[point_id].to_model())
+            for point_id, distance in zip(store.ids_for(slots), km.tolist())
+        ]
+
+    def statistics(self) -> Dict[str, Any]:
+        return self.store.statistics()
+
+    def clusters(self, zoom: int, box: Box) -> List[Cluster]:
+        return self.store.clusters(zoom, box)
+
+    def points_in_box(self, box: Box) -> List[CollectionPoint]:
+        store = self.store
+        active = store.filter_bitmap(CollectionPointFilters(is_active=True))
+        ids = sorted(store.ids_for(store.slots_in_box(box, active)))
+        return [store.points[point_id].to_model() for point_id in ids]
+
+    def along_route(
+        self,
+        route: Route,
+        buffer_km: float,
+        filters: CollectionPointFilters,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[float, float, CollectionPoint]]:
+        store = self.store
+        bits = store.filter_bitmap(filters)
+        mask = store.mask_of(bits)
+
+        def candidates(box):
+            slots = store.slots_in_box(box, bits, mask)
+            return (slots, *store.coordinates(slots))
+
+        slots, distances, positions = route.corridor(buffer_km, candidates)
+        found = sorted(
+            zip(positions.tolist(), store.ids_for(slots), distances.tolist())
+        )
+        return [
+            (position, distance, store.points[point_id].to_model())
+            for position, point_id, distance in found[:limit]
+        ]
+
+    def suggest(self, prefix: str, limit: int) -> List[Suggestion]:
+        return self.store.suggest(prefix, limit)
+
+    def add(self, point: CollectionPoint) -> None:
+        store = self.store.copy()
+        store.add(point)
+        self._publish(store, [point.id])
+
+    def update(self, point: CollectionPoint) -> None:
+        store = self.store.copy()
+        store.update(point)
+        self._publish(store, [point.id])
+
+    def remove(self, point_id: str) -> Optional[CollectionPoint]:
+        if point_id not in self.store:
+            return None
+        store = self.store.copy()
+        record = store.remove(point_id)
+        self._publish(store, removed_ids=[point_id])
+        return record.to_model()
+
+    def apply_batch(
+        self, upserts: Iterable[CollectionPoint] = (), removed_ids: Iterable[str] = ()
+    ) -> None:
+        """Lotes grandes reconstroem o store inteiro de uma vez (bitmaps e
+        contadores montados em uma passada); lotes pequenos são aplicados
+        incrementalmente.
+        """
+        upserts, removed_ids = list(upserts), list(removed_ids)
+        touched = len(upserts) + len(removed_ids)
+        if touched > len(self.store) * BULK_REBUILD_FRACTION:
+            removed = set(removed_ids)
+            points = {
+                point_id: point
+                for point_id, point in self.store.points.items()
+                if point_id not in removed
+            }
+            points.update((point.id, point) for point in upserts)
+            store = CollectionPointsStore(
+                points.values(), cell_size_deg=self._cell_size_deg
+            )
+        else:
+            store = self.store.copy()
+            for point_id in removed_ids:
+                store.remove(point_id)
+            for point in upserts:
+                store.add(point)
+        self._publish(store, [point.id for point in upserts], removed_ids)
+
+    def _publish(
+        self,
+        store: CollectionPointsStore,
+        upserted_ids: Iterable[str] = (),
+        removed_ids: Iterable[str] = (),
+    ) -> None:
+        self.store = store
+        self._version += 1
+        for point_id in removed_ids:
+            self._record(point_id)
+            self._tombstones.pop(point_id, None)
+            self._tombstones[point_id] = self._change_seq
+        for point_id in upserted_ids:
+            self._record(point_id)
+            self._tombstones.pop(point_id, None)
+        self._compact_history()
+
+    def _record(self, point_id: str) -> None:
+        seq = self._change_seq + 1
+        self._history.append((seq, point_id))
+        self._latest[point_id] = seq
+        self._change_seq = seq
+
+    def _compact_history(self) -> None:
+        excess = len(self._tombstones) - self._tombstone_limit
+        if excess > 0:
+            for point_id in list(self._tombstones)[:excess]:
+                seq = self._tombstones.pop(point_id)
+                del self._latest[point_id]
+                self._compacted_through = max(self._compacted_through, seq)
+        if len(self._history) > 2 * len(self._latest) + 1024:
+            self._history = sorted(
+                (seq, point_id) for point_id, seq in self._latest.items()
+            )
+
+    def _within_radius(self, store: CollectionPointsStore, filters, bits: int):
+        key = (filters.lat, filters.lng, filters.radius_km)
+        if self._radius_memo is not None and key in self._radius_memo:
+            slots, km = self._radius_memo[key]
+        else:
+            slots, km = store.within_radius(*key)
+            if self._radius_memo is not None:
+                self._radius_memo[key] = slots, km
+        matching = store.in_bitmap(bits, slots)
+        return slots[matching], km[matching]
@@ -0,0 +1,240 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import sqlite3
+import threading
+
+from ..models.collection_point import CollectionPoint, CollectionPointFilters
+from ..services.cluster_index import Box, Cluster
+from ..services.route_corridor import Route
+from ..services.term_index import Suggestion
+from .base import ChangeListener, ChangeSet, CollectionPointsRepository, SortKey
+from .change_log import Change, ChangeLog
+from .memory import InMemoryCollectionPointsRepository
+
+# A cada tantas entradas gravadas o log é compactado: saem as superadas e as
+# remoções além de `tombstone_limit` (ver `ChangeLog.compact`).
+CHANGE_LOG_COMPACT_EVERY = 1000
+
+
+class SharedCollectionPointsRepository(CollectionPointsRepository):
+    """Repositório em memória por worker, mantido em sincronia por um `ChangeLog`.
+
+    Leituras são servidas pelo repositório em memória local. Escritas vão
+    primeiro para o log (já aplicando o que outros workers gravaram antes) e
+    depois para a memória local; uma thread acompanha o log e aplica as
+    mudanças dos outros workers assim que são gravadas. Todos os workers
+    partem dos mesmos pontos iniciais; só quem ficou atrás do horizonte
+    compactado do log (ver `ChangeLog.compact`) recarrega os pontos, do
+    snapshot do log.
+
+    A versão dos dados é a posição no log, igual em todos os workers que já
+    aplicaram as mesmas mudanças; o histórico de `changes_since` é o próprio
+    log.
+    """
+
+    def __init__(
+        self,
+        inner: InMemoryCollectionPointsRepository,
+        log: ChangeLog,
+        poll_interval: float = 0.02,
+        tombstone_limit: int = 10000,
+    ):
+        self._inner = inner
+        self._log = log
+        self._tombstone_limit = tombstone_limit
+        self._applied = 0
+        self._listeners: List[ChangeListener] = []
+        # Protege o log e `_applied`; leitores nunca o usam.
+        self._apply_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.catch_up()
+        self._tailer = threading.Thread(
+            target=self._tail, args=(poll_interval,), daemon=True
+        )
+        self._tailer.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        self._tailer.join()
+        self._log.close()
+
+    def __len__(self) -> int:
+        return len(self._inner)
+
+    @property
+    def version(self) -> str:
+        return f"{self._log.log_id}-{self._applied}"
+
+    @property
+    def change_version(self) -> int:
+        return self._applied
+
+    def changes_since(self, since: int) -> Optional[ChangeSet]:
+        # Os pontos iniciais não estão no log: desde 0, só um snapshot serve.
+        if since <= 0:
+            return None
+        found = self._log.changes_since(since)
+        if found is None:
+            return None
+        version, changes = found
+        return ChangeSet(
+            version,
+            [change.point for change in changes if change.point is not None],
+            [change.point_id for change in changes if change.point is None],
+        )
+
+    def snapshot(self) -> CollectionPointsRepository:
+        return self._inner.snapshot()
+
+    def get(self, point_id: str) -> Optional[CollectionPoint]:
+        return self._inner.get(point_id)
+
+    def iter_matching(
+        self, filters: CollectionPointFilters, after: Optional[SortKey] = None
+    ) -> Iterator[Tuple[Optional[float], CollectionPoint]]:
+        return self._inner.iter_matching(filters, after)
+
+    def count_matching(self, filters: CollectionPointFilters) -> int:
+        return self._inner.count_matching(filters)
+
+    def matching(
+        self, filters: CollectionPointFilters, after: Optional[SortKey] = None
+    ) -> Tuple[int, Iterator[Tuple[Optional[float], CollectionPoint]]]:
+        return self._inner.matching(filters, after)
+
+    def nearest(
+        self, lat: float, lng: float, k: int, filters: CollectionPointFilters
+    ) -> List[Tuple[float, CollectionPoint]]:
+        return self._inner.nearest(lat, lng, k, filters)
+
+    def statistics(self) -> Dict[str, Any]:
+        return self._inner.statistics()
+
+    def suggest(self, prefix: str, limit: int) -> List[Suggestion]:
+        return self._inner.suggest(prefix, limit)
+
+    def facets(self, filters: CollectionPointFilters) -> Dict[str, Dict[str, int]]:
+        return self._inner.facets(filters)
+
+    def clusters(self, zoom: int, box: Box) -> List[Cluster]:
+        return self._inner.clusters(zoom, box)
+
+    def points_in_box(self, box: Box) -> List[CollectionPoint]:
+        return self._inner.points_in_box(box)
+
+    def along_route(
+        self,
+        route: Route,
+        buffer_km: float,
+        filters: CollectionPointFilters,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[float, float, CollectionPoint]]:
+        return self._inner.along_route(route, buffer_km, filters, limit)
+
+    def add(self, point: CollectionPoint) -> None:
+        self._write(upserts=[point])
+
+    def update(self, point: CollectionPoint) -> None:
+        self._write(upserts=[point])
+
+    def remove(self, point_id: str) -> Optional[CollectionPoint]:
+        removed = self._write(removed_ids=[point_id])
+        return removed[0] if removed else None
+
+    def apply_batch(
+        self, upserts: Iterable[CollectionPoint] = (), removed_ids: Iterable[str] = ()
+    ) -> None:
+        self._write(upserts, removed_ids)
+
+    def listen(self, listener: ChangeListener) -> None:
+        self._listeners.append(listener)
+
+    def catch_up(self) -> None:
+        """Aplica o que foi gravado no log desde a última leitura."""
+        with self._apply_lock:
+            with self._log.reading() as conn:
+                self._sync(conn)
+
+    def _write(
+        self, upserts: Iterable[CollectionPoint] = (), removed_ids: Iterable[str] = ()
+    ) -> List[CollectionPoint]:
+        upserts = list(upserts)
+        with self._apply_lock:
+            with self._log.writing() as conn:
+                self._sync(conn)
+                removed = [
+                    point
+                    for point in map(self._inner.get, dict.fromkeys(removed_ids))
+                    if point is not None
+                ]
+                removed_ids = [point.id for point in removed]
+                if not upserts and not removed_ids:
+                    return []
+                seq = self._log.append(conn, upserts, removed_ids)
+                if seq // CHANGE_LOG_COMPACT_EVERY > (
+                    self._applied // CHANGE_LOG_COMPACT_EVERY
+                ):
+                    self._log.compact(
+                        conn, self._tombstone_limit, self._applied, self._all_points
+                    )
+            self._inner.apply_batch(upserts, removed_ids)
+            self._applied = seq
+        return removed
+
+    def _sync(self, conn: sqlite3.Connection) -> None:
+        """Aplica o log a partir de `_applied`, passando antes pelo snapshot
+        se o log já foi compactado além dele."""
+        snapshot = self._log.read_snapshot(self._applied, conn)
+        if snapshot is not None:
+            self._reset(*snapshot)
+        self._apply(self._log.read(self._applied, conn))
+
+    def _reset(self, seq: int, points: List[CollectionPoint]) -> None:
+        """Leva a memória local ao estado do snapshot `seq`, como mudanças."""
+        wanted = {point.id: point for point in points}
+        changes = [
+            Change(seq, point_id, point)
+            for point_id, point in wanted.items()
+            if self._inner.get(point_id) != point
+        ]
+        changes += [
+            Change(seq, point.id, None)
+            for point in self._all_points()
+            if point.id not in wanted
+        ]
+        self._apply(changes)
+        self._applied = seq
+
+    def _all_points(self) -> List[CollectionPoint]:
+        everything = CollectionPointFilters(is_active=None)
+        return [point for _, point in self._inner.iter_matching(everything)]
+
+    def _apply(self, changes: List[Change]) -> None:
+        if not changes:
+            return
+        # Só o estado final de cada ponto importa.
+        final = {change.point_id: change.point for change in changes}
+        previous = (
+            {point_id: self._inner.get(point_id) for point_id in final}
+            if self._listeners
+            else {}
+        )
+        self._inner.apply_batch(
+            upserts=[point for point in final.values() if point is not None],
+            removed_ids=[
+                point_id for point_id, point in final.items() if point is None
+            ],
+        )
+        self._applied = changes[-1].seq
+        for listener in self._listeners:
+            for point_id, point in final.items():
+                listener(point_id, point, previous[point_id])
+
+    def _tail(self, poll_interval: float) -> None:
+        while not self._stop.wait(poll_interval):
+            try:
+                with self._apply_lock:
+                    if self._log.changed():
+                        with self._log.reading() as conn:
+                            self._sync(conn)
+            except Exception as e:
+                print(f"[ChangeLog] Erro ao aplicar mudanças do log: {e}")
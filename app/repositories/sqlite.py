@@ -0,0 +1,1067 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import json
+import queue
+import sqlite3
+import uuid
+from contextlib import contextmanager
+from math import pi
+
+import numpy as np
+
+from ..core.geo import EARTH_RADIUS_KM, bounding_box, haversine_km
+from ..models.collection_point import CollectionPoint, CollectionPointFilters
+from ..services.cluster_index import (
+    EMPTY_CELL,
+    Box,
+    Cluster,
+    ClusterCell,
+    ClusterIndex,
+    cell_range,
+    cluster_entry,
+    point_cells,
+)
+from ..services.operating_hours import (
+    MAX_WEEKLY_INTERVALS,
+    minute_of_week,
+    parse_operating_hours,
+)
+from ..services.route_corridor import Route
+from ..services.term_index import (
+    MAX_SCANNED_TERMS,
+    PREFIX_END,
+    Suggestion,
+    Term,
+    point_terms,
+    rank,
+    ranked_entries,
+    term_entries,
+)
+from ..services.text_index import fold, query_tokens, search_key, search_key_relevance
+from .base import ChangeSet, CollectionPointsRepository, SortKey
+
+# Linhas buscadas por consulta ao percorrer resultados; entre um bloco e outro
+# a conexão volta ao pool.
+ITER_CHUNK_SIZE = 256
+
+# Maior distância possível entre dois pontos na superfície da Terra.
+MAX_DISTANCE_KM = pi * EARTH_RADIUS_KM
+
+# O ponto completo fica em `data` (JSON do modelo); as demais colunas são
+# derivadas dele e existem só para filtrar e ordenar em SQL. As colunas
+# `*_key` guardam o valor em minúsculas calculado em Python, já que lower()
+# do SQLite só conhece ASCII; `search_key` tem os campos da busca textual
+# normalizados (ver `text_index.py`), indexados por trigramas na tabela FTS5.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS collection_points (
+    rid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    data TEXT NOT NULL,
+    lat REAL NOT NULL,
+    lng REAL NOT NULL,
+    name_key TEXT NOT NULL,
+    city_key TEXT NOT NULL,
+    neighborhood TEXT NOT NULL,
+    neighborhood_key TEXT NOT NULL,
+    street_key TEXT NOT NULL,
+    is_active INTEGER NOT NULL,
+    accepts_all_materials INTEGER NOT NULL,
+    search_key TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS collection_points_city ON collection_points (city_key);
+CREATE INDEX IF NOT EXISTS collection_points_neighborhood
+    ON collection_points (neighborhood_key);
+CREATE TABLE IF NOT EXISTS collection_point_materials (
+    material TEXT NOT NULL,
+    rid INTEGER NOT NULL REFERENCES collection_points (rid) ON DELETE CASCADE,
+    PRIMARY KEY (material, rid)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS collection_point_materials_rid
+    ON collection_point_materials (rid);
+CREATE VIRTUAL TABLE IF NOT EXISTS collection_points_rtree
+    USING rtree (rid, min_lat, max_lat, min_lng, max_lng);
+CREATE VIRTUAL TABLE IF NOT EXISTS collection_points_fts
+    USING fts5 (search_key, tokenize = 'trigram');
+CREATE TABLE IF NOT EXISTS collection_point_terms (
+    kind TEXT NOT NULL,
+    text TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (kind, text)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS collection_point_term_keys (
+    term_key TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    text TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (term_key, kind, text, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS collection_point_term_ranks (
+    initial TEXT NOT NULL,
+    later INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    term_key TEXT NOT NULL,
+    PRIMARY KEY (initial, later, count DESC, text, kind, term_key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS collection_point_clusters (
+    zoom INTEGER NOT NULL,
+    cell_lat INTEGER NOT NULL,
+    cell_lng INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    lat_sum REAL NOT NULL,
+    lng_sum REAL NOT NULL,
+    materials TEXT NOT NULL,
+    PRIMARY KEY (zoom, cell_lat, cell_lng)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS collection_point_stats (
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (kind, value)
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE IF NOT EXISTS collection_point_hours
+    USING rtree (id, start_minute, end_minute);
+CREATE TABLE IF NOT EXISTS point_changes (
+    point_id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    deleted INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS point_changes_seq ON point_changes (seq);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', '0');
+INSERT OR IGNORE INTO meta (key, value) VALUES ('change_seq', '0');
+INSERT OR IGNORE INTO meta (key, value) VALUES ('compacted_through', '0');
+INSERT OR IGNORE INTO meta (key, value) VALUES ('terms_indexed', '0');
+INSERT OR IGNORE INTO meta (key, value) VALUES ('term_ranks_indexed', '0');
+INSERT OR IGNORE INTO meta (key, value) VALUES ('clusters_indexed', '0');
+INSERT OR IGNORE INTO meta (key, value) VALUES ('hours_indexed', '0');
+INSERT OR IGNORE INTO meta (key, value) VALUES ('stats_indexed', '0');
+"""
+
+
+class SQLiteConnectionPool:
+    """Conexões reaproveitadas entre requisições; cada uma atende uma thread por vez."""
+
+    def __init__(self, path: str, size: int):
+        self._connections: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(size):
+            self._connections.put(self._connect(path))
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connections.get()
+        try:
+            yield conn
+        finally:
+            self._connections.put(conn)
+
+    def close(self) -> None:
+        while not self._connections.empty():
+            self._connections.get_nowait().close()
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        # isolation_level=None: sem transações implícitas; as escritas abrem
+        # a sua com BEGIN IMMEDIATE.
+        conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.create_function("haversine_km", 4, haversine_km, deterministic=True)
+        conn.create_function(
+            "search_relevance", 2, search_key_relevance, deterministic=True
+        )
+        return conn
+
+
+class SQLiteCollectionPointsRepository(CollectionPointsRepository):
+    """Pontos num arquivo SQLite, compartilhado por todos os workers.
+
+    O modo WAL deixa leituras correrem em paralelo com a escrita. A busca por
+    proximidade usa a tabela R*Tree para recortar a caixa que contém o círculo
+    e só então calcula a distância exata (função `haversine_km` registrada na
+    conexão); filtros de atributo viram cláusulas WHERE sobre colunas
+    indexadas.
+
+    A busca textual usa a tabela FTS5 de trigramas para achar os candidatos
+    e a função `search_relevance` para conferir e ordenar o resultado, com
+    a mesma relevância do repositório em memória. O autocomplete lê
+    `collection_point_term_keys`, as mesmas entradas do `TermIndex` em
+    memória, e `collection_point_terms` conta os pontos ativos por termo;
+    `collection_point_term_ranks` são as entradas de `_ranked`, na ordem do
+    ranking, para os prefixos com entradas demais para varrer.
+    `collection_point_clusters` tem as células de cada zoom da `ClusterIndex`,
+    atualizadas junto com os pontos. `collection_point_hours` é uma R*Tree
+    de uma dimensão com os intervalos semanais de funcionamento de cada
+    ponto (ver `operating_hours.py`), consultada pelo filtro `open_at`.
+    `collection_point_stats` guarda os contadores de `statistics()`, como os
+    do `CollectionPointsStore`, ajustados a cada escrita.
+
+    `point_changes` guarda a versão da última mudança de cada ponto; ids
+    removidos ficam como tombstones até passarem de `tombstone_limit`.
+    """
+
+    def __init__(self, path: str, pool_size: int = 4, tombstone_limit: int = 10000):
+        self._tombstone_limit = tombstone_limit
+        self._pool = SQLiteConnectionPool(path, pool_size)
+        with self._pool.connection() as conn:
+            conn.executescript(SCHEMA)
+            conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('instance_id', ?)",
+                (uuid.uuid4().hex,),
+            )
+            self._add_search_key(conn)
+            # Antes de `_index_terms`: num arquivo sem termos, os dois são
+            # preenchidos juntos por `_update_terms`.
+            self._index_term_ranks(conn)
+            self._index_terms(conn)
+            self._index_clusters(conn)
+            self._index_hours(conn)
+            self._index_stats(conn)
+
+    @staticmethod
+    def _add_search_key(conn: sqlite3.Connection) -> None:
+        """Preenche `search_key` e a tabela FTS5 em arquivos criados antes delas."""
+        columns = [
+            row[1] for row in conn.execute("PRAGMA table_info(collection_points)")
+        ]
+        if "search_key" in columns:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "ALTER TABLE collection_points "
+            "ADD COLUMN search_key TEXT NOT NULL DEFAULT ''"
+        )
+        rows = conn.execute("SELECT rid, data FROM collection_points").fetchall()
+        keys = [
+            (search_key(CollectionPoint.model_validate_json(data)), rid)
+            for rid, data in rows
+        ]
+        conn.executemany(
+            "UPDATE collection_points SET search_key = ? WHERE rid = ?", keys
+        )
+        conn.executemany(
+            "INSERT INTO collection_points_fts (search_key, rowid) VALUES (?, ?)", keys
+        )
+        conn.execute("COMMIT")
+
+    @classmethod
+    def _index_terms(cls, conn: sqlite3.Connection) -> None:
+        """Monta as tabelas de autocomplete em arquivos criados antes delas."""
+        if cls._meta_int(conn, "terms_indexed"):
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute("SELECT data FROM collection_points").fetchall()
+        for (data,) in rows:
+            cls._update_terms(
+                conn, (), point_terms(CollectionPoint.model_validate_json(data))
+            )
+        conn.execute("UPDATE meta SET value = '1' WHERE key = 'terms_indexed'")
+        conn.execute("COMMIT")
+
+    @classmethod
+    def _index_term_ranks(cls, conn: sqlite3.Connection) -> None:
+        """Monta `collection_point_term_ranks` a partir das contagens já
+        existentes, em arquivos criados antes da tabela."""
+        if cls._meta_int(conn, "term_ranks_indexed"):
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            "SELECT kind, text, count FROM collection_point_terms"
+        ).fetchall()
+        for kind, text, count in rows:
+            conn.executemany(
+                "INSERT INTO collection_point_term_ranks "
+                "(initial, later, count, text, kind, term_key) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                _rank_rows((kind, text), count),
+            )
+        conn.execute("UPDATE meta SET value = '1' WHERE key = 'term_ranks_indexed'")
+        conn.execute("COMMIT")
+
+    @classmethod
+    def _index_clusters(cls, conn: sqlite3.Connection) -> None:
+        """Monta os grupos do mapa em arquivos criados antes da tabela."""
+        if cls._meta_int(conn, "clusters_indexed"):
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute("SELECT data FROM collection_points").fetchall()
+        index = ClusterIndex(
+            filter(
+                None,
+                (
+                    cluster_entry(CollectionPoint.model_validate_json(data))
+                    for (data,) in rows
+                ),
+            )
+        )
+        conn.executemany(
+            "INSERT INTO collection_point_clusters VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    zoom,
+                    i,
+                    j,
+                    cell.count,
+                    cell.lat_sum,
+                    cell.lng_sum,
+                    json.dumps(cell.materials),
+                )
+                for zoom, i, j, cell in index.cells()
+            ),
+        )
+        conn.execute("UPDATE meta SET value = '1' WHERE key = 'clusters_indexed'")
+        conn.execute("COMMIT")
+
+    @classmethod
+    def _index_hours(cls, conn: sqlite3.Connection) -> None:
+        """Monta os intervalos de funcionamento em arquivos criados antes da tabela."""
+        if cls._meta_int(conn, "hours_indexed"):
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute("SELECT rid, data FROM collection_points").fetchall()
+        conn.executemany(
+            "INSERT INTO collection_point_hours VALUES (?, ?, ?)",
+            (
+                entry
+                for rid, data in rows
+                for entry in _hours_entries(
+                    rid, CollectionPoint.model_validate_json(data)
+                )
+            ),
+        )
+        conn.execute("UPDATE meta SET value = '1' WHERE key = 'hours_indexed'")
+        conn.execute("COMMIT")
+
+    @classmethod
+    def _index_stats(cls, conn: sqlite3.Connection) -> None:
+        """Monta os contadores das estatísticas em arquivos criados antes da tabela."""
+        if cls._meta_int(conn, "stats_indexed"):
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute("SELECT data FROM collection_points").fetchall()
+        for (data,) in rows:
+            cls._update_stats(
+                conn, (), _stat_entries(CollectionPoint.model_validate_json(data))
+            )
+        conn.execute("UPDATE meta SET value = '1' WHERE key = 'stats_indexed'")
+        conn.execute("COMMIT")
+
+    def close(self) -> None:
+        self._pool.close()
+
+    def __len__(self) -> int:
+        with self._pool.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM collection_points").fetchone()[0]
+
+    @property
+    def version(self) -> str:
+        with self._pool.connection() as conn:
+            values = dict(conn.execute("SELECT key, value FROM meta"))
+        return f"{values['instance_id']}-{values['version']}"
+
+    @property
+    def change_version(self) -> int:
+        with self._pool.connection() as conn:
+            return self._meta_int(conn, "change_seq")
+
+    def changes_since(self, since: int) -> Optional[ChangeSet]:
+        with self._pool.connection() as conn:
+            # Uma transação de leitura: versão e linhas do mesmo snapshot.
+            conn.execute("BEGIN")
+            try:
+                version = self._meta_int(conn, "change_seq")
+                compacted_through = self._meta_int(conn, "compacted_through")
+                if since <= 0 or since < compacted_through or since > version:
+                    return None
+                rows = conn.execute(
+                    "SELECT c.point_id, p.data FROM point_changes c "
+                    "LEFT JOIN collection_points p ON p.id = c.point_id "
+                    "WHERE c.seq > ? ORDER BY c.seq",
+                    (since,),
+                ).fetchall()
+            finally:
+                conn.execute("COMMIT")
+        return ChangeSet(
+            version,
+            [CollectionPoint.model_validate_json(data) for _, data in rows if data],
+            [point_id for point_id, data in rows if data is None],
+        )
+
+    def get(self, point_id: str) -> Optional[CollectionPoint]:
+        with self._pool.connection() as conn:
+            row = conn.execute(
+                "SELECT data FROM collection_points WHERE id = ?", (point_id,)
+            ).fetchone()
+        return CollectionPoint.model_validate_json(row[0]) if row else None
+
+    def iter_matching(
+        self, filters: CollectionPointFilters, after: Optional[SortKey] = None
+    ) -> Iterator[Tuple[Optional[float], CollectionPoint]]:
+        rows, _ = self._select(filters, after=after, limit=ITER_CHUNK_SIZE)
+        yield from self._continue(filters, rows)
+
+    def matching(
+        self, filters: CollectionPointFilters, after: Optional[SortKey] = None
+    ) -> Tuple[int, Iterator[Tuple[Optional[float], CollectionPoint]]]:
+        rows, total = self._select(
+            filters, after=after, limit=ITER_CHUNK_SIZE, with_total=True
+        )
+        if total is None:
+            # Nada depois de `after`: o total não veio junto com as linhas.
+            total = self.count_matching(filters) if after is not None else 0
+        return total, self._continue(filters, rows)
+
+    def _continue(
+        self,
+        filters: CollectionPointFilters,
+        rows: List[Tuple[Optional[float], CollectionPoint]],
+    ) -> Iterator[Tuple[Optional[float], CollectionPoint]]:
+        """Percorre `rows` e busca os blocos seguintes a partir do último."""
+        while True:
+            yield from rows
+            if len(rows) < ITER_CHUNK_SIZE:
+                return
+            after = (rows[-1][0], rows[-1][1].id)
+            rows, _ = self._select(filters, after=after, limit=ITER_CHUNK_SIZE)
+
+    def count_matching(self, filters: CollectionPointFilters) -> int:
+        where, params = self._where(filters)
+        with self._pool.connection() as conn:
+            return conn.execute(
+                f"SELECT COUNT(*) FROM collection_points p WHERE {where}", params
+            ).fetchone()[0]
+
+    def nearest(
+        self,
+        lat: float,
+        lng: float,
+        k: int,
+        filters: CollectionPointFilters,
+        start_radius_km: float = 1.0,
+    ) -> List[Tuple[float, CollectionPoint]]:
+        """Dobra o raio até que ele contenha `k` pontos; cada tentativa é uma
+        consulta limitada pela R*Tree.
+        """
+        if k <= 0:
+            return []
+        radius = start_radius_km
+        while True:
+            search = filters.model_copy(update={"lat": lat, "lng": lng})
+            rows, _ = self._select(search, limit=k, radius_km=radius)
+            if len(rows) >= k or radius >= MAX_DISTANCE_KM:
+                return rows
+            radius = min(radius * 2, MAX_DISTANCE_KM)
+
+    def statistics(self) -> Dict[str, Any]:
+        with self._pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT kind, value, count FROM collection_point_stats"
+            ).fetchall()
+        counts: Dict[str, Dict[str, int]] = {
+            "total": {},
+            "accepting_all": {},
+            "material": {},
+            "neighborhood": {},
+        }
+        for kind, value, count in rows:
+            counts[kind][value] = count
+        return {
+            "total_points": counts["total"].get("", 0),
+            "materials_distribution": counts["material"],
+            "neighborhoods_distribution": counts["neighborhood"],
+            "points_accepting_all_materials": counts["accepting_all"].get("", 0),
+        }
+
+    def facets(self, filters: CollectionPointFilters) -> Dict[str, Dict[str, int]]:
+        where, params = self._where(filters)
+        with self._pool.connection() as conn:
+            materials = conn.execute(
+                "SELECT m.material, COUNT(*) FROM collection_point_materials m "
+                f"JOIN collection_points p ON p.rid = m.rid WHERE {where} "
+                "GROUP BY m.material",
+                params,
+            ).fetchall()
+            neighborhoods = conn.execute(
+                "SELECT MAX(p.neighborhood), COUNT(*) FROM collection_points p "
+                f"WHERE {where} GROUP BY p.neighborhood_key",
+                params,
+            ).fetchall()
+            cities = conn.execute(
+                "SELECT MAX(json_extract(p.data, '$.city')), COUNT(*) "
+                f"FROM collection_points p WHERE {where} GROUP BY p.city_key",
+                params,
+            ).fetchall()
+        return {
+            "materials": dict(materials),
+            "neighborhoods": dict(neighborhoods),
+            "cities": dict(cities),
+        }
+
+    def suggest(self, prefix: str, limit: int) -> List[Suggestion]:
+        prefix = fold(prefix)
+        if not prefix:
+            return []
+        end = prefix + PREFIX_END
+        with self._pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT k.text, k.kind, k.position, t.count FROM ("
+                "SELECT * FROM collection_point_term_keys "
+                "WHERE term_key >= ? AND term_key < ? "
+                "ORDER BY term_key, kind, text, position LIMIT ?) k "
+                "JOIN collection_point_terms t ON t.kind = k.kind AND t.text = k.text",
+                (prefix, end, MAX_SCANNED_TERMS + 1),
+            ).fetchall()
+            if len(rows) <= MAX_SCANNED_TERMS:
+                return rank(rows, limit)
+            # Como `TermIndex._suggest_ranked`: as entradas da inicial vêm na
+            # ordem do ranking, e a primeira de cada termo é a sua melhor.
+            found: Dict[Term, Suggestion] = {}
+            ranked = conn.execute(
+                "SELECT text, kind, count FROM collection_point_term_ranks "
+                "WHERE initial = ? AND term_key >= ? AND term_key < ? "
+                "ORDER BY later, count DESC, text, kind, term_key",
+                (prefix[0], prefix, end),
+            )
+            for text, kind, count in ranked:
+                if len(found) >= limit:
+                    break
+                found.setdefault((kind, text), Suggestion(text, kind, count))
+        return list(found.values())
+
+    def clusters(self, zoom: int, box: Box) -> List[Cluster]:
+        (i0, j0), (i1, j1) = cell_range(box, zoom)
+        with self._pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT count, lat_sum, lng_sum, materials "
+                "FROM collection_point_clusters WHERE zoom = ? "
+                "AND cell_lat BETWEEN ? AND ? AND cell_lng BETWEEN ? AND ? "
+                "ORDER BY cell_lat, cell_lng",
+                (zoom, i0, i1, j0, j1),
+            ).fetchall()
+        return [
+            ClusterCell(count, lat_sum, lng_sum, json.loads(materials)).cluster()
+            for count, lat_sum, lng_sum, materials in rows
+        ]
+
+    def points_in_box(self, box: Box) -> List[CollectionPoint]:
+        min_lat, min_lng, max_lat, max_lng = box
+        in_box, params = self._in_box(box)
+        with self._pool.connection() as conn:
+            rows = conn.execute(
+                f"SELECT p.data FROM collection_points p WHERE p.is_active = 1 "
+                f"AND {in_box} AND p.lat BETWEEN ? AND ? AND p.lng BETWEEN ? AND ? "
+                "ORDER BY p.id",
+                params + [min_lat, max_lat, min_lng, max_lng],
+            ).fetchall()
+        return [CollectionPoint.model_validate_json(data) for (data,) in rows]
+
+    def along_route(
+        self,
+        route: Route,
+        buffer_km: float,
+        filters: CollectionPointFilters,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[float, float, CollectionPoint]]:
+        where, params = self._where(filters)
+        with self._pool.connection() as conn:
+
+            def candidates(box):
+                in_box, box_params = self._in_box(box)
+                rows = conn.execute(
+                    "SELECT p.rid, p.lat, p.lng FROM collection_points p "
+                    f"WHERE {where} AND {in_box}",
+                    params + box_params,
+                ).fetchall()
+                found = np.array(rows, dtype=np.float64).reshape(-1, 3)
+                return found[:, 0].astype(np.int64), found[:, 1], found[:, 2]
+
+            rids, distances, positions = route.corridor(buffer_km, candidates)
+            rows = conn.execute(
+                "SELECT rid, id, data FROM collection_points "
+                "WHERE rid IN (SELECT value FROM json_each(?))",
+                (json.dumps(rids.tolist()),),
+            ).fetchall()
+        points = {rid: (point_id, data) for rid, point_id, data in rows}
+        found = sorted(
+            (position, points[rid][0], distance, points[rid][1])
+            for rid, distance, position in zip(
+                rids.tolist(), distances.tolist(), positions.tolist()
+            )
+        )
+        return [
+            (position, distance, CollectionPoint.model_validate_json(data))
+            for position, _, distance, data in found[:limit]
+        ]
+
+    def add(self, point: CollectionPoint) -> None:
+        self.apply_batch(upserts=[point])
+
+    def update(self, point: CollectionPoint) -> None:
+        self.apply_batch(upserts=[point])
+
+    def remove(self, point_id: str) -> Optional[CollectionPoint]:
+        with self._write() as conn:
+            point = self._delete(conn, point_id)
+            self._prune_tombstones(conn)
+        return point
+
+    def apply_batch(
+        self, upserts: Iterable[CollectionPoint] = (), removed_ids: Iterable[str] = ()
+    ) -> None:
+        with self._write() as conn:
+            for point_id in removed_ids:
+                self._delete(conn, point_id)
+            for point in upserts:
+                self._upsert(conn, point)
+            self._prune_tombstones(conn)
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """Transação de escrita que também avança a versão dos dados."""
+        with self._pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute(
+                    "UPDATE meta SET value = CAST(value AS INTEGER) + 1 "
+                    "WHERE key = 'version'"
+                )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _select(
+        self,
+        filters: CollectionPointFilters,
+        after: Optional[SortKey] = None,
+        limit: Optional[int] = None,
+        radius_km: Optional[float] = None,
+        with_total: bool = False,
+    ) -> Tuple[List[Tuple[Optional[float], CollectionPoint]], Optional[int]]:
+        """Linhas depois de `after`, em ordem de chave, e, com `with_total`,
+        quantas linhas atendem aos filtros ao todo (None se nenhuma linha
+        veio depois de `after`).
+
+        A chave é calculada uma vez por linha na consulta interna; com
+        `with_total` a contagem sai da mesma varredura (`COUNT(*) OVER ()`).
+        """
+        where, params = self._where(filters, radius_km)
+        if filters.lat is not None and filters.lng is not None:
+            distance = "haversine_km(?, ?, p.lat, p.lng)"
+            params = [filters.lat, filters.lng] + params
+            order = "distance, id"
+        elif filters.search:
+            distance = "-search_relevance(p.search_key, ?)"
+            params = [filters.search] + params
+            order = "distance, id"
+        else:
+            distance = "NULL"
+            order = "id"
+        total = ", COUNT(*) OVER () AS total" if with_total else ""
+        sql = (
+            f"SELECT distance, data{', total' if with_total else ''} FROM ("
+            f"SELECT {distance} AS distance, p.id AS id, p.data AS data{total} "
+            f"FROM collection_points p WHERE {where})"
+        )
+        if after is not None and order == "id":
+            sql += " WHERE id > ?"
+            params.append(after[1])
+        elif after is not None:
+            sql += " WHERE distance > ? OR (distance = ? AND id > ?)"
+            params += [after[0], after[0], after[1]]
+        sql += f" ORDER BY {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._pool.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        found = [(row[0], CollectionPoint.model_validate_json(row[1])) for row in rows]
+        return found, (rows[0][2] if with_total and rows else None)
+
+    @classmethod
+    def _where(
+        cls, filters: CollectionPointFilters, radius_km: Optional[float] = None
+    ) -> Tuple[str, List[Any]]:
+        clauses, params = ["1"], []
+        if filters.is_active is not None:
+            clauses.append("p.is_active = ?")
+            params.append(int(filters.is_active))
+        if filters.accepts_all_materials is not None:
+            clauses.append("p.accepts_all_materials = ?")
+            params.append(int(filters.accepts_all_materials))
+        if filters.city:
+            clauses.append("p.city_key = ?")
+            params.append(filters.city.lower())
+        if filters.neighborhood:
+            clauses.append("p.neighborhood_key = ?")
+            params.append(filters.neighborhood.lower())
+        if filters.material:
+            clauses.append(
+                "p.rid IN (SELECT rid FROM collection_point_materials WHERE material = ?)"
+            )
+            params.append(filters.material)
+        if filters.open_at is not None:
+            # Cada intervalo tem id rid * MAX_WEEKLY_INTERVALS + posição.
+            clauses.append(
+                f"p.rid IN (SELECT id / {MAX_WEEKLY_INTERVALS} "
+                "FROM collection_point_hours WHERE start_minute <= ? AND end_minute > ?)"
+            )
+            minute = minute_of_week(filters.open_at)
+            params += [minute, minute]
+        tokens = query_tokens(filters.search) if filters.search else ()
+        indexed = [token for token in tokens if len(token) >= 3]
+        if indexed:
+            # O tokenizer de trigramas da FTS5 casa cada palavra como substring.
+            clauses.append(
+                "p.rid IN (SELECT rowid FROM collection_points_fts "
+                "WHERE collection_points_fts MATCH ?)"
+            )
+            params.append(" AND ".join(f'"{token}"' for token in indexed))
+        if tokens:
+            clauses.append("search_relevance(p.search_key, ?) > 0")
+            params.append(filters.search)
+        if filters.lat is not None and filters.lng is not None:
+            radius = filters.radius_km if radius_km is None else radius_km
+            box, box_params = cls._in_box(
+                bounding_box(filters.lat, filters.lng, radius)
+            )
+            clauses.append(box)
+            clauses.append("haversine_km(?, ?, p.lat, p.lng) <= ?")
+            params += box_params + [filters.lat, filters.lng, radius]
+        return " AND ".join(clauses), params
+
+    @staticmethod
+    def _in_box(box: Box) -> Tuple[str, List[Any]]:
+        """Condição (pela R*Tree) de `p` estar na caixa, ou perto dela."""
+        min_lat, min_lng, max_lat, max_lng = box
+        # A R*Tree guarda float32 arredondado para fora, então a consulta
+        # testa sobreposição com a caixa, nunca contenção.
+        sql = "max_lat >= ? AND min_lat <= ?"
+        params = [min_lat, max_lat]
+        if min_lng >= -180.0 and max_lng <= 180.0:
+            sql += " AND max_lng >= ? AND min_lng <= ?"
+            params += [min_lng, max_lng]
+        return f"p.rid IN (SELECT rid FROM collection_points_rtree WHERE {sql})", params
+
+    def _prune_tombstones(self, conn: sqlite3.Connection) -> None:
+        excess = (
+            conn.execute(
+                "SELECT COUNT(*) FROM point_changes WHERE deleted = 1"
+            ).fetchone()[0]
+            - self._tombstone_limit
+        )
+        if excess <= 0:
+            return
+        oldest = conn.execute(
+            "SELECT MAX(seq) FROM (SELECT seq FROM point_changes WHERE deleted = 1 "
+            "ORDER BY seq LIMIT ?)",
+            (excess,),
+        ).fetchone()[0]
+        conn.execute(
+            "DELETE FROM point_changes WHERE deleted = 1 AND seq <= ?", (oldest,)
+        )
+        conn.execute(
+            "UPDATE meta SET value = ? WHERE key = 'compacted_through'", (oldest,)
+        )
+
+    @staticmethod
+    def _meta_int(conn: sqlite3.Connection, key: str) -> int:
+        return int(
+            conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+        )
+
+    @classmethod
+    def _record_change(
+        cls, conn: sqlite3.Connection, point_id: str, deleted: bool
+    ) -> None:
+        seq = cls._meta_int(conn, "change_seq") + 1
+        conn.execute("UPDATE meta SET value = ? WHERE key = 'change_seq'", (seq,))
+        conn.execute(
+            "INSERT OR REPLACE INTO point_changes (point_id, seq, deleted) "
+            "VALUES (?, ?, ?)",
+            (point_id, seq, int(deleted)),
+        )
+
+    @classmethod
+    def _upsert(cls, conn: sqlite3.Connection, point: CollectionPoint) -> None:
+        values = (
+            point.model_dump_json(),
+            point.lat,
+            point.lng,
+            point.name.lower(),
+            point.city.lower(),
+            point.neighborhood,
+            point.neighborhood.lower(),
+            point.street.lower(),
+            int(point.is_active),
+            int(point.accepts_all_materials),
+            search_key(point),
+        )
+        row = conn.execute(
+            "SELECT rid, data FROM collection_points WHERE id = ?", (point.id,)
+        ).fetchone()
+        previous = CollectionPoint.model_validate_json(row[1]) if row else None
+        previous_terms = point_terms(previous) if previous else set()
+        new_terms = point_terms(point)
+        cls._update_terms(conn, previous_terms - new_terms, new_terms - previous_terms)
+        previous_stats = _stat_entries(previous) if previous else set()
+        new_stats = _stat_entries(point)
+        cls._update_stats(conn, previous_stats - new_stats, new_stats - previous_stats)
+        old_entry = cluster_entry(previous) if previous else None
+        new_entry = cluster_entry(point)
+        if old_entry != new_entry:
+            cls._update_clusters(conn, -1, old_entry)
+            cls._update_clusters(conn, 1, new_entry)
+        if row:
+            rid = row[0]
+            conn.execute(
+                "UPDATE collection_points SET data = ?, lat = ?, lng = ?, "
+                "name_key = ?, city_key = ?, neighborhood = ?, neighborhood_key = ?, "
+                "street_key = ?, is_active = ?, accepts_all_materials = ?, "
+                "search_key = ? WHERE rid = ?",
+                values + (rid,),
+            )
+            conn.execute("DELETE FROM collection_point_materials WHERE rid = ?", (rid,))
+            conn.execute("DELETE FROM collection_points_rtree WHERE rid = ?", (rid,))
+            conn.execute("DELETE FROM collection_points_fts WHERE rowid = ?", (rid,))
+            cls._delete_hours(conn, rid, previous)
+        else:
+            rid = conn.execute(
+                "INSERT INTO collection_points (id, data, lat, lng, name_key, "
+                "city_key, neighborhood, neighborhood_key, street_key, is_active, "
+                "accepts_all_materials, search_key) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (point.id,) + values,
+            ).lastrowid
+        conn.executemany(
+            "INSERT INTO collection_point_materials (material, rid) VALUES (?, ?)",
+            [(material, rid) for material in dict.fromkeys(point.materials)],
+        )
+        conn.execute(
+            "INSERT INTO collection_points_rtree VALUES (?, ?, ?, ?, ?)",
+            (rid, point.lat, point.lat, point.lng, point.lng),
+        )
+        conn.execute(
+            "INSERT INTO collection_points_fts (rowid, search_key) VALUES (?, ?)",
+            (rid, values[-1]),
+        )
+        conn.executemany(
+            "INSERT INTO collection_point_hours VALUES (?, ?, ?)",
+            _hours_entries(rid, point),
+        )
+        cls._record_change(conn, point.id, deleted=False)
+
+    @classmethod
+    def _delete(
+        cls, conn: sqlite3.Connection, point_id: str
+    ) -> Optional[CollectionPoint]:
+        row = conn.execute(
+            "SELECT rid, data FROM collection_points WHERE id = ?", (point_id,)
+        ).fetchone()
+        if not row:
+            return None
+        rid, data = row
+        point = CollectionPoint.model_validate_json(data)
+        cls._update_terms(conn, point_terms(point), ())
+        cls._update_stats(conn, _stat_entries(point), ())
+        cls._update_clusters(conn, -1, cluster_entry(point))
+        conn.execute("DELETE FROM collection_points WHERE rid = ?", (rid,))
+        conn.execute("DELETE FROM collection_points_rtree WHERE rid = ?", (rid,))
+        conn.execute("DELETE FROM collection_points_fts WHERE rowid = ?", (rid,))
+        cls._delete_hours(conn, rid, point)
+        cls._record_change(conn, point_id, deleted=True)
+        return point
+
+    @staticmethod
+    def _delete_hours(
+        conn: sqlite3.Connection, rid: int, point: CollectionPoint
+    ) -> None:
+        """Tira os intervalos com que o ponto foi indexado, pelos ids exatos."""
+        conn.executemany(
+            "DELETE FROM collection_point_hours WHERE id = ?",
+            [(entry[0],) for entry in _hours_entries(rid, point)],
+        )
+
+    @staticmethod
+    def _update_clusters(
+        conn: sqlite3.Connection,
+        sign: int,
+        entry: Optional[Tuple[float, float, Tuple[str, ...]]],
+    ) -> None:
+        """Soma (`sign` 1) ou tira (-1) um ponto da sua célula em cada zoom."""
+        if entry is None:
+            return
+        lat, lng, materials = entry
+        for zoom, i, j in point_cells(lat, lng):
+            key = (zoom, i, j)
+            row = conn.execute(
+                "SELECT count, lat_sum, lng_sum, materials "
+                "FROM collection_point_clusters "
+                "WHERE zoom = ? AND cell_lat = ? AND cell_lng = ?",
+                key,
+            ).fetchone()
+            current = ClusterCell(*row[:3], json.loads(row[3])) if row else EMPTY_CELL
+            cell = current.changed(sign, lat, lng, materials)
+            if cell is None:
+                conn.execute(
+                    "DELETE FROM collection_point_clusters "
+                    "WHERE zoom = ? AND cell_lat = ? AND cell_lng = ?",
+                    key,
+                )
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO collection_point_clusters "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    key
+                    + (
+                        cell.count,
+                        cell.lat_sum,
+                        cell.lng_sum,
+                        json.dumps(cell.materials),
+                    ),
+                )
+
+    @staticmethod
+    def _update_stats(
+        conn: sqlite3.Connection,
+        removed: Iterable[Tuple[str, str]],
+        added: Iterable[Tuple[str, str]],
+    ) -> None:
+        """Ajusta os contadores das estatísticas; os que chegam a zero saem."""
+        for key in removed:
+            conn.execute(
+                "UPDATE collection_point_stats SET count = count - 1 "
+                "WHERE kind = ? AND value = ?",
+                key,
+            )
+            conn.execute(
+                "DELETE FROM collection_point_stats "
+                "WHERE kind = ? AND value = ? AND count <= 0",
+                key,
+            )
+        for key in added:
+            updated = conn.execute(
+                "UPDATE collection_point_stats SET count = count + 1 "
+                "WHERE kind = ? AND value = ?",
+                key,
+            ).rowcount
+            if not updated:
+                conn.execute(
+                    "INSERT INTO collection_point_stats (kind, value, count) "
+                    "VALUES (?, ?, 1)",
+                    key,
+                )
+
+    @staticmethod
+    def _update_terms(
+        conn: sqlite3.Connection, removed: Iterable[Term], added: Iterable[Term]
+    ) -> None:
+        """Ajusta as contagens do autocomplete; termos que chegam a zero (ou
+        saem de zero) perdem (ou ganham) suas chaves."""
+        for kind, text in removed:
+            row = conn.execute(
+                "SELECT count FROM collection_point_terms WHERE kind = ? AND text = ?",
+                (kind, text),
+            ).fetchone()
+            if row is None:
+                continue
+            conn.executemany(
+                "DELETE FROM collection_point_term_ranks WHERE initial = ? "
+                "AND later = ? AND count = ? AND text = ? AND kind = ? "
+                "AND term_key = ?",
+                _rank_rows((kind, text), row[0]),
+            )
+            if row[0] > 1:
+                conn.execute(
+                    "UPDATE collection_point_terms SET count = count - 1 "
+                    "WHERE kind = ? AND text = ?",
+                    (kind, text),
+                )
+                conn.executemany(
+                    "INSERT INTO collection_point_term_ranks "
+                    "(initial, later, count, text, kind, term_key) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    _rank_rows((kind, text), row[0] - 1),
+                )
+                continue
+            conn.execute(
+                "DELETE FROM collection_point_terms WHERE kind = ? AND text = ?",
+                (kind, text),
+            )
+            conn.executemany(
+                "DELETE FROM collection_point_term_keys WHERE term_key = ? "
+                "AND kind = ? AND text = ? AND position = ?",
+                term_entries((kind, text)),
+            )
+        for kind, text in added:
+            row = conn.execute(
+                "SELECT count FROM collection_point_terms WHERE kind = ? AND text = ?",
+                (kind, text),
+            ).fetchone()
+            if row is None:
+                count = 0
+                conn.execute(
+                    "INSERT INTO collection_point_terms (kind, text, count) "
+                    "VALUES (?, ?, 1)",
+                    (kind, text),
+                )
+                conn.executemany(
+                    "INSERT INTO collection_point_term_keys "
+                    "(term_key, kind, text, position) VALUES (?, ?, ?, ?)",
+                    term_entries((kind, text)),
+                )
+            else:
+                count = row[0]
+                conn.execute(
+                    "UPDATE collection_point_terms SET count = count + 1 "
+                    "WHERE kind = ? AND text = ?",
+                    (kind, text),
+                )
+                conn.executemany(
+                    "DELETE FROM collection_point_term_ranks WHERE initial = ? "
+                    "AND later = ? AND count = ? AND text = ? AND kind = ? "
+                    "AND term_key = ?",
+                    _rank_rows((kind, text), count),
+                )
+            conn.executemany(
+                "INSERT INTO collection_point_term_ranks "
+                "(initial, later, count, text, kind, term_key) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                _rank_rows((kind, text), count + 1),
+            )
+
+
+def _rank_rows(term: Term, count: int) -> List[Tuple[str, int, int, str, str, str]]:
+    """Linhas de `collection_point_term_ranks` de um termo com `count` pontos."""
+    return [
+        (initial, int(later), -negated, text, kind, key)
+        for initial, later, negated, text, kind, key in ranked_entries(term, count)
+    ]
+
+
+def _hours_entries(rid: int, point: CollectionPoint) -> List[Tuple[int, int, int]]:
+    """Linhas (id, início, fim) de `collection_point_hours` para o ponto."""
+    intervals = parse_operating_hours(point.operating_hours) or ()
+    return [
+        (rid * MAX_WEEKLY_INTERVALS + k, start, end)
+        for k, (start, end) in enumerate(intervals)
+    ]
+
+
+def _stat_entries(point: CollectionPoint) -> Set[Tuple[str, str]]:
+    """Contadores de `collection_point_stats` em que o ponto entra; pontos
+    inativos não entram em nenhum."""
+    if not point.is_active:
+        return set()
+    entries = {("total", "")}
+    entries.update(("material", material) for material in point.materials)
+    entries.add(("neighborhood", point.neighborhood))
+    if point.accepts_all_materials:
+        entries.add(("accepting_all", ""))
+    return entries
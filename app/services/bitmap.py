@@ -0,0 +1,27 @@
+import numpy as np
+
+# Bitmaps são inteiros Python: o bit `n` ligado indica que o slot `n` pertence
+# ao conjunto. Interseção e união viram `&` e `|`, e `int.bit_count()` conta.
+
+
+def bitmap_from_slots(slots) -> int:
+    slots = np.asarray(slots, dtype=np.int64)
+    if slots.size == 0:
+        return 0
+    flags = np.zeros(int(slots.max()) + 1, dtype=np.uint8)
+    flags[slots] = 1
+    return int.from_bytes(np.packbits(flags, bitorder="little").tobytes(), "little")
+
+
+def bitmap_to_mask(bits: int, size: int) -> np.ndarray:
+    """Máscara booleana com `size` posições, uma por slot."""
+    nbytes = (size + 7) // 8
+    raw = (bits & ((1 << size) - 1)).to_bytes(nbytes, "little")
+    flags = np.unpackbits(np.frombuffer(raw, dtype=np.uint8), bitorder="little")
+    return flags[:size].astype(bool)
+
+
+def slots_from_bitmap(bits: int) -> np.ndarray:
+    if not bits:
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(bitmap_to_mask(bits, bits.bit_length()))
@@ -0,0 +1,183 @@
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import codecs
+import csv
+import json
+
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+
+from ..core.config import settings
+from ..models.collection_point import CollectionPointCreate, CollectionPointRowError
+from .cep_geocoder import CepGeocoder
+
+IMPORT_FORMATS = ("csv", "ndjson")
+IMPORT_BATCH_SIZE = 500
+# Campos de lista nas planilhas CSV vêm separados por ";" (ex: "Papel;Vidro").
+CSV_LIST_FIELDS = ("materials",)
+CSV_LIST_SEPARATOR = ";"
+
+
+class ImportTooLarge(Exception):
+    """O corpo da importação passou de `max_rows` registros ou `max_bytes` bytes."""
+
+
+def import_format(content_type: str) -> Optional[str]:
+    """Formato de importação a partir do Content-Type, ou None se não suportado."""
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type in ("text/csv", "application/csv"):
+        return "csv"
+    if media_type in (
+        "application/x-ndjson",
+        "application/ndjson",
+        "application/jsonl",
+        "application/json",
+    ):
+        return "ndjson"
+    return None
+
+
+async def read_import(
+    chunks: AsyncIterator[bytes],
+    fmt: str,
+    geocoder: CepGeocoder,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    max_rows: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+) -> Tuple[List[CollectionPointCreate], List[CollectionPointRowError]]:
+    """Lê o corpo em streaming e valida os registros em lotes de `batch_size`,
+    geocodificando pelo CEP com `geocoder` as linhas sem coordenadas.
+
+    A validação roda num thread do pool, para não prender o event loop (e o
+    feed /events) durante a importação. Levanta `ImportTooLarge` ao passar de
+    `max_rows` registros ou `max_bytes` bytes (por padrão, os limites
+    COLLECTION_POINTS_IMPORT_* das configurações).
+    """
+    if max_rows is None:
+        max_rows = settings.COLLECTION_POINTS_IMPORT_MAX_ROWS
+    if max_bytes is None:
+        max_bytes = settings.COLLECTION_POINTS_IMPORT_MAX_BYTES
+    valid: List[CollectionPointCreate] = []
+    errors: List[CollectionPointRowError] = []
+    batch: List[Tuple[int, Any]] = []
+    rows = 0
+    async for record in iter_records(_limited(chunks, max_bytes), fmt):
+        rows += 1
+        if rows > max_rows:
+            raise ImportTooLarge(f"Upload has more than {max_rows} rows")
+        batch.append(record)
+        if len(batch) >= batch_size:
+            ok, failed = await run_in_threadpool(validate_batch, batch, geocoder)
+            valid += ok
+            errors += failed
+            batch = []
+    ok, failed = await run_in_threadpool(validate_batch, batch, geocoder)
+    return valid + ok, errors + failed
+
+
+async def _limited(
+    chunks: AsyncIterator[bytes], max_bytes: int
+) -> AsyncIterator[bytes]:
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+        if size > max_bytes:
+            raise ImportTooLarge(f"Upload is larger than {max_bytes} bytes")
+        yield chunk
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decodifica o corpo da requisição em UTF-8 e o entrega linha a linha."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def iter_records(
+    chunks: AsyncIterator[bytes], fmt: str
+) -> AsyncIterator[Tuple[int, Any]]:
+    """Produz (número da linha/registro, dados brutos) para cada registro do corpo."""
+    if fmt == "ndjson":
+        number = 0
+        async for line in iter_lines(chunks):
+            number += 1
+            if line.strip():
+                try:
+                    yield number, json.loads(line)
+                except ValueError as exc:
+                    yield number, exc
+        return
+
+    header = None
+    number = 0
+    record = ""
+    async for line in iter_lines(chunks):
+        record += line
+        # Um campo entre aspas pode conter quebras de linha: o registro só
+        # termina quando o número de aspas acumulado é par.
+        if record.count('"') % 2:
+            continue
+        text, record = record, ""
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        number += 1
+        yield number, _csv_row(header, values)
+    if record.strip():
+        number += 1
+        yield number, ValueError("Unterminated quoted field")
+
+
+def _csv_row(header: List[str], values: List[str]) -> Dict[str, Any]:
+    row: Dict[str, Any] = {}
+    for name, value in zip(header, values):
+        value = value.strip()
+        if value == "":
+            continue
+        if name in CSV_LIST_FIELDS:
+            row[name] = [
+                item.strip() for item in value.split(CSV_LIST_SEPARATOR) if item.strip()
+            ]
+        else:
+            row[name] = value
+    return row
+
+
+def validate_batch(
+    records: List[Tuple[int, Any]], geocoder: CepGeocoder
+) -> Tuple[List[CollectionPointCreate], List[CollectionPointRowError]]:
+    valid, errors = [], []
+    for number, data in records:
+        if isinstance(data, Exception):
+            errors.append(
+                CollectionPointRowError(row=number, errors=[{"msg": str(data)}])
+            )
+            continue
+        try:
+            point = CollectionPointCreate.model_validate(data)
+        except ValidationError as exc:
+            errors.append(
+                CollectionPointRowError(
+                    row=number,
+                    errors=exc.errors(include_url=False, include_context=False),
+                )
+            )
+            continue
+        # Linhas sem coordenadas são geocodificadas pelo CEP aqui, para que
+        # um CEP desconhecido rejeite só a própria linha.
+        try:
+            valid.append(geocoder.with_coordinates(point))
+        except ValueError as exc:
+            errors.append(
+                CollectionPointRowError(row=number, errors=[{"msg": str(exc)}])
+            )
+    return valid, errors
@@ -0,0 +1,100 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import csv
+import os
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+
+from ..core.config import settings
+from ..models.collection_point import CollectionPointCreate
+
+CEP_DIGITS = 8
+# Prefixo mais curto aceito como aproximação de um CEP (o setor, 5 dígitos).
+MIN_PREFIX_DIGITS = 5
+
+DEFAULT_CEP_TABLE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "data", "cep_centroids.csv"
+)
+
+
+def normalize_cep(cep: str) -> Optional[str]:
+    """Só os dígitos do CEP, ou None se não forem exatamente 8."""
+    digits = "".join(c for c in cep if c.isdigit())
+    return digits if len(digits) == CEP_DIGITS else None
+
+
+class CepGeocoder:
+    """Converte CEPs em coordenadas (centroide) a partir de uma tabela local.
+
+    As chaves da tabela são CEPs completos ou prefixos de pelo menos
+    `MIN_PREFIX_DIGITS` dígitos, guardadas numa lista ordenada com as
+    coordenadas num `array` paralelo. Um CEP sem entrada própria usa a do
+    prefixo mais longo que o contém; cada tentativa é uma busca binária.
+    Um LRU de `cache_size` entradas fica na frente das buscas.
+    """
+
+    def __init__(
+        self, entries: Iterable[Tuple[str, float, float]] = (), cache_size: int = 4096
+    ):
+        table: Dict[str, Tuple[float, float]] = {}
+        for cep, lat, lng in entries:
+            key = "".join(c for c in cep if c.isdigit())
+            if not MIN_PREFIX_DIGITS <= len(key) <= CEP_DIGITS:
+                raise ValueError(f"Invalid CEP key: {cep!r}")
+            table[key] = (float(lat), float(lng))
+        self._keys: List[str] = sorted(table)
+        self._coords = array("d")
+        for key in self._keys:
+            self._coords.extend(table[key])
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    @classmethod
+    def from_csv(cls, path: str, cache_size: int = 4096) -> "CepGeocoder":
+        """Carrega um CSV com as colunas `cep,lat,lng`; linhas com # são ignoradas."""
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = csv.DictReader(line for line in f if not line.startswith("#"))
+            return cls(
+                ((row["cep"], row["lat"], row["lng"]) for row in rows), cache_size
+            )
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _lookup(self, cep: str) -> Optional[Tuple[float, float]]:
+        digits = normalize_cep(cep)
+        if digits is None:
+            return None
+        for length in range(CEP_DIGITS, MIN_PREFIX_DIGITS - 1, -1):
+            key = digits[:length]
+            i = bisect_left(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                return self._coords[2 * i], self._coords[2 * i + 1]
+        return None
+
+    def locate(self, cep: str) -> Tuple[float, float]:
+        """Como `lookup`, mas um CEP desconhecido é um ValueError."""
+        coords = self.lookup(cep)
+        if coords is None:
+            raise ValueError(f"CEP not found: {cep}")
+        return coords
+
+    def with_coordinates(self, point: CollectionPointCreate) -> CollectionPointCreate:
+        """O ponto com lat/lng do centroide do CEP, se vier sem coordenadas."""
+        if point.lat is not None and point.lng is not None:
+            return point
+        lat, lng = self.locate(point.cep)
+        return point.model_copy(update={"lat": lat, "lng": lng})
+
+    def cache_info(self) -> Dict[str, int]:
+        info = self.lookup.cache_info()
+        return {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "max_size": info.maxsize,
+        }
+
+
+cep_geocoder = CepGeocoder.from_csv(
+    settings.CEP_TABLE_PATH or DEFAULT_CEP_TABLE_PATH, settings.CEP_CACHE_SIZE
+)
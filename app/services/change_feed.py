@@ -0,0 +1,128 @@
+from typing import Deque, List, NamedTuple, Optional, Set
+import asyncio
+import itertools
+import json
+import threading
+from collections import deque
+
+from ..models.collection_point import CollectionPoint, CollectionPointsChangeFilters
+
+CHANGE_TYPES = ("create", "update", "delete")
+
+
+class ChangeEvent(NamedTuple):
+    """Mudança em um ponto. `point` é o estado novo (None em remoções) e
+    `previous` o anterior (None em criações)."""
+
+    seq: int
+    type: str
+    point_id: str
+    point: Optional[CollectionPoint]
+    previous: Optional[CollectionPoint]
+
+    def to_sse(self) -> str:
+        data = self.point.model_dump(mode="json") if self.point else None
+        payload = json.dumps({"type": self.type, "id": self.point_id, "data": data})
+        return f"id: {self.seq}\nevent: {self.type}\ndata: {payload}\n\n"
+
+
+# Enviado no lugar dos eventos descartados quando a fila de um assinante
+# estoura: o cliente deve recarregar os pontos que exibe.
+RESYNC_EVENT = "event: resync\ndata: {}\n\n"
+
+
+class ChangeSubscription:
+    """Fila limitada de eventos de um assinante, consumida pelo event loop dele.
+
+    `push` nunca bloqueia quem escreve: se a fila está cheia ela é esvaziada
+    e o assinante recebe um único `resync`.
+    """
+
+    def __init__(
+        self,
+        filters: CollectionPointsChangeFilters,
+        max_queue: int,
+        loop: asyncio.AbstractEventLoop,
+    ):
+        self.filters = filters
+        self.max_queue = max_queue
+        self._events: Deque[ChangeEvent] = deque()
+        self._overflowed = False
+        self._lock = threading.Lock()
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+
+    def wants(self, event: ChangeEvent) -> bool:
+        """Eventos de pontos que entram, saem ou continuam dentro do filtro."""
+        return any(
+            point is not None and self.filters.matches(point)
+            for point in (event.point, event.previous)
+        )
+
+    def push(self, event: ChangeEvent) -> None:
+        with self._lock:
+            if len(self._events) >= self.max_queue:
+                self._events.clear()
+                self._overflowed = True
+            else:
+                self._events.append(event)
+        try:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            pass  # event loop já encerrado; o assinante será removido
+
+    async def next_messages(self, timeout: float) -> List[str]:
+        """Mensagens SSE pendentes, esperando até `timeout` segundos por elas."""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._wakeup.clear()
+        with self._lock:
+            events, self._events = list(self._events), deque()
+            overflowed, self._overflowed = self._overflowed, False
+        messages = [RESYNC_EVENT] if overflowed else []
+        return messages + [event.to_sse() for event in events]
+
+
+class ChangeFeed:
+    """Distribui os eventos de mudança para os assinantes interessados."""
+
+    def __init__(self):
+        self._subscriptions: Set[ChangeSubscription] = set()
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def subscribe(
+        self, filters: CollectionPointsChangeFilters, max_queue: int
+    ) -> ChangeSubscription:
+        """Deve ser chamado de dentro do event loop que vai consumir os eventos."""
+        subscription = ChangeSubscription(
+            filters, max_queue, asyncio.get_running_loop()
+        )
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: ChangeSubscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(
+        self,
+        point_id: str,
+        point: Optional[CollectionPoint],
+        previous: Optional[CollectionPoint],
+    ) -> None:
+        if point is None and previous is None:
+            return
+        kind = "create" if previous is None else "delete" if point is None else "update"
+        event = ChangeEvent(next(self._seq), kind, point_id, point, previous)
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.wants(event):
+                subscription.push(event)
@@ -0,0 +1,247 @@
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+from bisect import bisect_left, bisect_right, insort
+
+import numpy as np
+
+# Contêineres copy-on-write por pedaços, base das cópias do
+# `CollectionPointsStore`: `copy` duplica só a lista de pedaços, e cada
+# escrita duplica apenas o pedaço que altera. Como na `GridIndex`, `_owned`
+# diz quais pedaços pertencem só a esta cópia (None: nenhuma cópia foi
+# feita, todos são próprios); os demais podem estar compartilhados e são
+# duplicados antes de qualquer escrita.
+
+Key = Hashable
+
+# Dicionários são divididos pelo hash da chave em `DICT_SHARDS` partes.
+DICT_SHARDS = 256
+# Arrays são divididos em pedaços de `ARRAY_CHUNK` posições.
+ARRAY_CHUNK_BITS = 10
+ARRAY_CHUNK = 1 << ARRAY_CHUNK_BITS
+# Listas ordenadas são divididas ao passar de `2 * LIST_LOAD` itens.
+LIST_LOAD = 512
+
+
+class ChunkedDict:
+    """Dicionário dividido em `DICT_SHARDS` dicionários menores."""
+
+    def __init__(self, items: Iterable[Tuple[Key, Any]] = ()):
+        self._shards: List[Dict[Key, Any]] = [{} for _ in range(DICT_SHARDS)]
+        self._owned: Optional[Set[int]] = None
+        for key, value in items:
+            self._shards[hash(key) % DICT_SHARDS][key] = value
+        self._len = sum(map(len, self._shards))
+
+    def copy(self) -> "ChunkedDict":
+        clone = object.__new__(ChunkedDict)
+        clone._shards = list(self._shards)
+        clone._len = self._len
+        clone._owned = set()
+        self._owned = set()
+        return clone
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __contains__(self, key: Key) -> bool:
+        return key in self._shards[hash(key) % DICT_SHARDS]
+
+    def __getitem__(self, key: Key) -> Any:
+        return self._shards[hash(key) % DICT_SHARDS][key]
+
+    def get(self, key: Key, default: Any = None) -> Any:
+        return self._shards[hash(key) % DICT_SHARDS].get(key, default)
+
+    def setdefault(self, key: Key, default: Any) -> Any:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def __setitem__(self, key: Key, value: Any) -> None:
+        shard = self._writable(hash(key) % DICT_SHARDS)
+        if key not in shard:
+            self._len += 1
+        shard[key] = value
+
+    def __delitem__(self, key: Key) -> None:
+        del self._writable(hash(key) % DICT_SHARDS)[key]
+        self._len -= 1
+
+    def pop(self, key: Key, *default: Any) -> Any:
+        index = hash(key) % DICT_SHARDS
+        if key not in self._shards[index]:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        self._len -= 1
+        return self._writable(index).pop(key)
+
+    def __iter__(self) -> Iterator[Key]:
+        for shard in self._shards:
+            yield from shard
+
+    def keys(self) -> Iterator[Key]:
+        return iter(self)
+
+    def values(self) -> Iterator[Any]:
+        for shard in self._shards:
+            yield from shard.values()
+
+    def items(self) -> Iterator[Tuple[Key, Any]]:
+        for shard in self._shards:
+            yield from shard.items()
+
+    def _writable(self, index: int) -> Dict[Key, Any]:
+        if self._owned is not None and index not in self._owned:
+            self._shards[index] = dict(self._shards[index])
+            self._owned.add(index)
+        return self._shards[index]
+
+
+class ChunkedArray:
+    """Array numpy unidimensional em pedaços de `ARRAY_CHUNK` posições.
+
+    Cresce um pedaço por vez (`grow`), preenchido com `fill`. Leituras
+    vetorizadas juntam os pedaços: `take` para posições avulsas, `prefix`
+    para as primeiras `count`.
+    """
+
+    def __init__(self, fill: Any, dtype: Any):
+        self.fill = fill
+        self.dtype = np.dtype(dtype)
+        self._chunks: List[np.ndarray] = []
+        self._owned: Optional[Set[int]] = None
+
+    def copy(self) -> "ChunkedArray":
+        clone = object.__new__(ChunkedArray)
+        clone.fill = self.fill
+        clone.dtype = self.dtype
+        clone._chunks = list(self._chunks)
+        clone._owned = set()
+        self._owned = set()
+        return clone
+
+    def __len__(self) -> int:
+        return len(self._chunks) * ARRAY_CHUNK
+
+    def grow(self) -> None:
+        if self._owned is not None:
+            self._owned.add(len(self._chunks))
+        self._chunks.append(np.full(ARRAY_CHUNK, self.fill, dtype=self.dtype))
+
+    def __getitem__(self, index: int) -> Any:
+        return self._chunks[index >> ARRAY_CHUNK_BITS][index & (ARRAY_CHUNK - 1)]
+
+    def __setitem__(self, index: int, value: Any) -> None:
+        chunk = index >> ARRAY_CHUNK_BITS
+        if self._owned is not None and chunk not in self._owned:
+            self._chunks[chunk] = self._chunks[chunk].copy()
+            self._owned.add(chunk)
+        self._chunks[chunk][index & (ARRAY_CHUNK - 1)] = value
+
+    def prefix(self, count: int) -> np.ndarray:
+        """As primeiras `count` posições, num array contíguo."""
+        used = self._chunks[: -(-count // ARRAY_CHUNK)]
+        if not used:
+            return np.empty(0, dtype=self.dtype)
+        return np.concatenate(used)[:count]
+
+    def take(self, indices: np.ndarray) -> np.ndarray:
+        """Valores nas posições `indices`, na mesma ordem.
+
+        Poucas posições são lidas pedaço a pedaço; muitas (a partir de um
+        quarto do array), de uma cópia contígua.
+        """
+        if len(self._chunks) == 1:
+            return self._chunks[0][indices]
+        if not len(indices):
+            return np.empty(0, dtype=self.dtype)
+        if len(indices) * 4 >= len(self):
+            return np.concatenate(self._chunks)[indices]
+        which = indices >> ARRAY_CHUNK_BITS
+        order = np.argsort(which, kind="stable")
+        starts = np.flatnonzero(np.diff(which[order])) + 1
+        values = np.empty(len(indices), dtype=self.dtype)
+        for group in np.split(order, starts):
+            chunk = self._chunks[which[group[0]]]
+            values[group] = chunk[indices[group] & (ARRAY_CHUNK - 1)]
+        return values
+
+
+class ChunkedSortedList:
+    """Lista ordenada em sublistas de até `2 * LIST_LOAD` itens.
+
+    `_maxes` guarda o último item de cada sublista, para achar por busca
+    binária a sublista de um valor. Sublistas entram e saem do meio da lista,
+    então a posse delas fica em `_owned`, uma lista de flags paralela a
+    `_lists` (em vez de um conjunto de posições).
+    """
+
+    def __init__(self, values: Iterable[Any] = ()):
+        values = sorted(values)
+        self._lists: List[List[Any]] = [
+            values[i : i + LIST_LOAD] for i in range(0, len(values), LIST_LOAD)
+        ]
+        self._maxes: List[Any] = [sub[-1] for sub in self._lists]
+        self._owned: List[bool] = [True] * len(self._lists)
+        self._len = len(values)
+
+    def copy(self) -> "ChunkedSortedList":
+        clone = object.__new__(ChunkedSortedList)
+        clone._lists = list(self._lists)
+        clone._maxes = list(self._maxes)
+        clone._owned = [False] * len(self._lists)
+        clone._len = self._len
+        self._owned = [False] * len(self._lists)
+        return clone
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[Any]:
+        for sub in self._lists:
+            yield from sub
+
+    def add(self, value: Any) -> None:
+        self._len += 1
+        if not self._lists:
+            self._lists.append([value])
+            self._maxes.append(value)
+            self._owned.append(True)
+            return
+        i = min(bisect_left(self._maxes, value), len(self._lists) - 1)
+        sub = self._writable(i)
+        insort(sub, value)
+        self._maxes[i] = sub[-1]
+        if len(sub) > 2 * LIST_LOAD:
+            self._lists[i : i + 1] = [sub[:LIST_LOAD], sub[LIST_LOAD:]]
+            self._maxes[i : i + 1] = [sub[LIST_LOAD - 1], sub[-1]]
+            self._owned[i : i + 1] = [True, True]
+
+    def remove(self, value: Any) -> None:
+        """Tira uma ocorrência de `value`, que precisa estar na lista."""
+        i = bisect_left(self._maxes, value)
+        sub = self._writable(i)
+        del sub[bisect_left(sub, value)]
+        self._len -= 1
+        if sub:
+            self._maxes[i] = sub[-1]
+        else:
+            del self._lists[i], self._maxes[i], self._owned[i]
+
+    def iter_from(self, value: Any, inclusive: bool = True) -> Iterator[Any]:
+        """Itens a partir do primeiro `>= value` (ou `> value`), em ordem."""
+        find = bisect_left if inclusive else bisect_right
+        i = find(self._maxes, value)
+        if i == len(self._lists):
+            return
+        sub = self._lists[i]
+        for j in range(find(sub, value), len(sub)):
+            yield sub[j]
+        for sub in self._lists[i + 1 :]:
+            yield from sub
+
+    def _writable(self, index: int) -> List[Any]:
+        if not self._owned[index]:
+            self._lists[index] = list(self._lists[index])
+            self._owned[index] = True
+        return self._lists[index]
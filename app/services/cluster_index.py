@@ -0,0 +1,186 @@
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from math import floor
+
+from .chunked import ChunkedDict
+
+# Acima deste zoom o mapa recebe os pontos em vez de grupos.
+MAX_CLUSTER_ZOOM = 16
+# Células por lado de um tile de 256 px: cada grupo cobre cerca de 64 px.
+CELLS_PER_TILE = 4
+
+# Tamanho das células do zoom mais fino; cada zoom abaixo dobra o tamanho,
+# então a célula de um ponto em `zoom` é a do zoom mais fino deslocada
+# `MAX_CLUSTER_ZOOM - zoom` bits.
+FINEST_CELL_DEG = 360.0 / (CELLS_PER_TILE << MAX_CLUSTER_ZOOM)
+
+Cell = Tuple[int, int]
+# (min_lat, min_lng, max_lat, max_lng)
+Box = Tuple[float, float, float, float]
+
+
+class Cluster(NamedTuple):
+    """Grupo de pontos ativos numa célula: centroide, total e materiais."""
+
+    lat: float
+    lng: float
+    count: int
+    materials: Dict[str, int]
+
+
+class ClusterCell(NamedTuple):
+    """Agregado de uma célula. Nunca é alterado: mudanças criam outro."""
+
+    count: int
+    lat_sum: float
+    lng_sum: float
+    materials: Dict[str, int]
+
+    def changed(
+        self, sign: int, lat: float, lng: float, materials: Sequence[str]
+    ) -> Optional["ClusterCell"]:
+        """A célula com um ponto a mais (`sign` 1) ou a menos (-1); None se esvaziar."""
+        count = self.count + sign
+        if count <= 0:
+            return None
+        counts = dict(self.materials)
+        for material in dict.fromkeys(materials):
+            total = counts.get(material, 0) + sign
+            if total > 0:
+                counts[material] = total
+            else:
+                counts.pop(material, None)
+        return ClusterCell(
+            count, self.lat_sum + sign * lat, self.lng_sum + sign * lng, counts
+        )
+
+    def cluster(self) -> Cluster:
+        return Cluster(
+            self.lat_sum / self.count,
+            self.lng_sum / self.count,
+            self.count,
+            dict(self.materials),
+        )
+
+
+EMPTY_CELL = ClusterCell(0, 0.0, 0.0, {})
+
+
+def cluster_entry(point) -> Optional[Tuple[float, float, Tuple[str, ...]]]:
+    """(lat, lng, materiais) com que o ponto entra nos grupos; None se inativo."""
+    if not point.is_active:
+        return None
+    return point.lat, point.lng, tuple(dict.fromkeys(point.materials))
+
+
+def finest_cell(lat: float, lng: float) -> Cell:
+    return floor(lat / FINEST_CELL_DEG), floor(lng / FINEST_CELL_DEG)
+
+
+def cell_for(lat: float, lng: float, zoom: int) -> Cell:
+    i, j = finest_cell(lat, lng)
+    shift = MAX_CLUSTER_ZOOM - zoom
+    return i >> shift, j >> shift
+
+
+def point_cells(lat: float, lng: float) -> List[Tuple[int, int, int]]:
+    """(zoom, i, j) da célula do ponto em cada zoom, do 0 ao `MAX_CLUSTER_ZOOM`."""
+    i, j = finest_cell(lat, lng)
+    return [
+        (zoom, i >> (MAX_CLUSTER_ZOOM - zoom), j >> (MAX_CLUSTER_ZOOM - zoom))
+        for zoom in range(MAX_CLUSTER_ZOOM + 1)
+    ]
+
+
+def cell_range(box: Box, zoom: int) -> Tuple[Cell, Cell]:
+    """Primeira e última célula (inclusive) que tocam a caixa em `zoom`."""
+    min_lat, min_lng, max_lat, max_lng = box
+    return cell_for(min_lat, min_lng, zoom), cell_for(max_lat, max_lng, zoom)
+
+
+class ClusterIndex:
+    """Grupos de pontos por zoom, numa hierarquia de grades.
+
+    Cada zoom tem uma grade com células de metade do tamanho das do zoom
+    anterior, e cada célula ocupada guarda um `ClusterCell`. Um ponto entra
+    e sai em uma célula por zoom, então escritas custam `MAX_CLUSTER_ZOOM + 1`
+    atualizações e uma consulta só visita as células da caixa pedida.
+    Como as células nunca são alteradas no lugar, `copy` só duplica as
+    listas de pedaços dos `ChunkedDict`s de cada zoom (ver `chunked.py`).
+    """
+
+    def __init__(self, entries: Iterable[Tuple[float, float, Sequence[str]]] = ()):
+        # O zoom mais fino é somado ponto a ponto; os demais, célula a célula
+        # a partir do zoom seguinte.
+        finest: Dict[Cell, list] = {}
+        for lat, lng, materials in entries:
+            totals = finest.setdefault(finest_cell(lat, lng), [0, 0.0, 0.0, {}])
+            totals[0] += 1
+            totals[1] += lat
+            totals[2] += lng
+            for material in materials:
+                totals[3][material] = totals[3].get(material, 0) + 1
+        level = {cell: ClusterCell(*totals) for cell, totals in finest.items()}
+        levels = [level]
+        for _ in range(MAX_CLUSTER_ZOOM):
+            levels.insert(0, _coarser(levels[0]))
+        self._levels = [ChunkedDict(level.items()) for level in levels]
+
+    def copy(self) -> "ClusterIndex":
+        clone = object.__new__(ClusterIndex)
+        clone._levels = [level.copy() for level in self._levels]
+        return clone
+
+    def __len__(self) -> int:
+        return sum(cell.count for cell in self._levels[0].values())
+
+    def add(self, lat: float, lng: float, materials: Sequence[str]) -> None:
+        self._change(1, lat, lng, materials)
+
+    def remove(self, lat: float, lng: float, materials: Sequence[str]) -> None:
+        self._change(-1, lat, lng, materials)
+
+    def _change(
+        self, sign: int, lat: float, lng: float, materials: Sequence[str]
+    ) -> None:
+        for zoom, i, j in point_cells(lat, lng):
+            level = self._levels[zoom]
+            cell = level.get((i, j), EMPTY_CELL).changed(sign, lat, lng, materials)
+            if cell is None:
+                level.pop((i, j), None)
+            else:
+                level[(i, j)] = cell
+
+    def cells(self) -> Iterator[Tuple[int, int, int, ClusterCell]]:
+        """(zoom, i, j, célula) de todas as células ocupadas."""
+        for zoom, level in enumerate(self._levels):
+            for (i, j), cell in level.items():
+                yield zoom, i, j, cell
+
+    def clusters(self, zoom: int, box: Box) -> List[Cluster]:
+        """Grupos das células que tocam a caixa, em ordem de célula."""
+        level = self._levels[zoom]
+        (i0, j0), (i1, j1) = cell_range(box, zoom)
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(level):
+            cells = sorted(
+                (i, j) for (i, j) in level if i0 <= i <= i1 and j0 <= j <= j1
+            )
+        else:
+            cells = [
+                (i, j)
+                for i in range(i0, i1 + 1)
+                for j in range(j0, j1 + 1)
+                if (i, j) in level
+            ]
+        return [level[cell].cluster() for cell in cells]
+
+
+def _coarser(level: Dict[Cell, ClusterCell]) -> Dict[Cell, ClusterCell]:
+    totals: Dict[Cell, list] = {}
+    for (i, j), cell in level.items():
+        parent = totals.setdefault((i >> 1, j >> 1), [0, 0.0, 0.0, {}])
+        parent[0] += cell.count
+        parent[1] += cell.lat_sum
+        parent[2] += cell.lng_sum
+        for material, count in cell.materials.items():
+            parent[3][material] = parent[3].get(material, 0) + count
+    return {cell: ClusterCell(*values) for cell, values in totals.items()}
@@ -1,121 +1,377 @@
-from typing import List, Dict, Any, Optional, Union
-from math import radians, cos, sin, asin, sqrt
+from typing import (
+    List,
+    Dict,
+    Any,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+import base64
+import binascii
+import json
 import uuid
+from itertools import islice
+from threading import Lock
 from datetime import datetime, timezone
-from collections import Counter
 from ..models.collection_point import (
     CollectionPoint,
     CollectionPointFilters,
     CollectionPointWithDistance,
+    CollectionPointOnRoute,
     CollectionPointCreate,
     CollectionPointUpdate,
 )
-from ..data.mock_collection_points import MOCK_COLLECTION_POINTS
+from ..core.config import settings
+from ..core.geo import haversine_km
+from ..repositories import ChangeSet, CollectionPointsRepository, create_repository
+from .cep_geocoder import CepGeocoder, cep_geocoder
+from .cluster_index import MAX_CLUSTER_ZOOM, Box, Cluster
+from .change_feed import ChangeFeed
+from .operating_hours import minute_of_week, now
+from .route_corridor import MAX_BUFFER_KM, Route
+from .term_index import Suggestion
+from .text_index import query_tokens
+from .query_cache import VersionedLRUCache
+
+
+class CollectionPointsPage(NamedTuple):
+    items: List[Union[CollectionPoint, CollectionPointWithDistance]]
+    total: Optional[int]
+    next_cursor: Optional[str]
+
+
+def _encode_cursor(key: Tuple[Optional[float], str]) -> str:
+    distance, point_id = key
+    raw = json.dumps({"d": distance, "id": point_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[Optional[float], str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        distance, point_id = payload["d"], payload["id"]
+    except (binascii.Error, ValueError, TypeError, KeyError) as exc:
+        raise ValueError("Invalid cursor") from exc
+    if not isinstance(point_id, str) or not (
+        distance is None or isinstance(distance, (int, float))
+    ):
+        raise ValueError("Invalid cursor")
+    return distance, point_id
+
+
+def _cache_key(filters: CollectionPointFilters) -> Tuple:
+    def normalized(value: Optional[str]) -> Optional[str]:
+        return value.lower() if value else None
+
+    proximity = filters.lat is not None and filters.lng is not None
+    return (
+        filters.material or None,
+        normalized(filters.neighborhood),
+        normalized(filters.city),
+        # Buscas que só diferem em acentos e pontuação dão o mesmo resultado.
+        " ".join(query_tokens(filters.search)) if filters.search else None,
+        filters.lat if proximity else None,
+        filters.lng if proximity else None,
+        filters.radius_km if proximity else None,
+        filters.accepts_all_materials,
+        filters.is_active,
+        # O resultado só muda de um minuto para outro da semana.
+        minute_of_week(filters.open_at) if filters.open_at is not None else None,
+        filters.limit,
+        filters.cursor,
+    )
 
 
 class CollectionPointsService:
+    """Consultas e escritas de pontos de coleta sobre um repositório.
+
+    Leituras não usam lock: o repositório garante que cada uma enxergue um
+    estado consistente. Escritas são serializadas por `self._lock`.
+    """
+
+    def __init__(
+        self,
+        repository: Optional[CollectionPointsRepository] = None,
+        geocoder: Optional[CepGeocoder] = None,
+    ):
+        self._repository = repository if repository is not None else create_repository()
+        self._geocoder = geocoder if geocoder is not None else cep_geocoder
+        self.changes = ChangeFeed()
+        self._repository.listen(self.changes.publish)
+        self._cache = VersionedLRUCache(settings.COLLECTION_POINTS_CACHE_SIZE)
+        self._cache_coord_decimals = settings.COLLECTION_POINTS_CACHE_COORD_DECIMALS
+        self._lock = Lock()
+
+    @property
+    def geocoder(self) -> CepGeocoder:
+        """Geocodificador usado para preencher coordenadas a partir do CEP."""
+        return self._geocoder
+
+    @property
+    def data_version(self) -> str:
+        """Identifica o estado atual dos dados; muda a cada mutação."""
+        return self._repository.version
 
-    def __init__(self):
-        self.collection_points: Dict[str, CollectionPoint] = {
-            point["id"]: CollectionPoint(**point) for point in MOCK_COLLECTION_POINTS
-        }
+    def get_changes_since(self, since: int) -> ChangeSet:
+        """Delta desde a versão `since` ou, se o histórico não a alcança, snapshot."""
+        changes = self._repository.changes_since(since)
+        if changes is not None:
+            return changes
+        version = self._repository.change_version
+        everything = CollectionPointFilters(is_active=None)
+        points = [point for _, point in self._repository.iter_matching(everything)]
+        return ChangeSet(version, points, [], snapshot=True)
 
     def get_collection_point_by_id(self, point_id: str) -> Optional[CollectionPoint]:
-        return self.collection_points.get(point_id)
+        return self._repository.get(point_id)
 
     def get_all_collection_points(
         self, filters: CollectionPointFilters
     ) -> List[Union[CollectionPoint, CollectionPointWithDistance]]:
-        all_points = list(self.collection_points.values())
+        return self.get_collection_points_page(filters).items
 
-        if filters.is_active is not None:
-            results = [p for p in all_points if p.is_active == filters.is_active]
-        else:
-            results = all_points[:]
-
-        if filters.city:
-            results = [p for p in results if p.city.lower() == filters.city.lower()]
-
-        if filters.neighborhood:
-            results = [
-                p
-                for p in results
-                if p.neighborhood.lower() == filters.neighborhood.lower()
-            ]
-
-        if filters.material:
-            results = [p for p in results if filters.material in p.materials]
-
-        if filters.accepts_all_materials is not None:
-            results = [
-                p
-                for p in results
-                if p.accepts_all_materials == filters.accepts_all_materials
-            ]
-
-        if filters.search:
-            query = filters.search.lower()
-            results = [
-                p
-                for p in results
-                if query in p.name.lower()
-                or query in p.neighborhood.lower()
-                or query in p.street.lower()
-            ]
-
-        if filters.lat is not None and filters.lng is not None:
-            points_with_distance = []
-            for point in results:
-                distance = self._haversine_distance(
-                    filters.lat, filters.lng, point.lat, point.lng
-                )
-                if distance <= filters.radius_km:
-                    point_with_dist = CollectionPointWithDistance(
-                        **point.model_dump(), distance_km=round(distance, 2)
-                    )
-                    points_with_distance.append(point_with_dist)
+    def get_collection_points_page(
+        self, filters: CollectionPointFilters
+    ) -> CollectionPointsPage:
+        return self._cached_page(filters, self._repository.version, self._repository)
 
-            points_with_distance.sort(key=lambda p: p.distance_km)
-            return points_with_distance
+    def get_collection_points_pages(
+        self, filters_list: List[CollectionPointFilters]
+    ) -> List[Union[CollectionPointsPage, ValueError]]:
+        """Responde várias consultas sobre um mesmo estado dos dados.
 
-        return results
+        Cada consulta passa pelo cache normalmente; as que faltam usam uma
+        visão `snapshot` do repositório, na qual consultas com o mesmo centro
+        e raio compartilham a busca espacial. Uma consulta inválida (ex.:
+        cursor) devolve o ValueError na sua posição sem afetar as outras.
+        """
+        version = self._repository.version
+        view = self._repository.snapshot()
+        pages: List[Union[CollectionPointsPage, ValueError]] = []
+        for filters in filters_list:
+            try:
+                pages.append(self._cached_page(filters, version, view))
+            except ValueError as exc:
+                pages.append(exc)
+        return pages
 
-    def get_collection_points_statistics(self) -> Dict[str, Any]:
-        active_points = [p for p in self.collection_points.values() if p.is_active]
-
-        if not active_points:
-            return {
-                "total_points": 0,
-                "materials_distribution": {},
-                "neighborhoods_distribution": {},
-                "points_accepting_all_materials": 0,
+    def _cached_page(
+        self,
+        filters: CollectionPointFilters,
+        version: str,
+        repository: CollectionPointsRepository,
+    ) -> CollectionPointsPage:
+        filters = self._resolved(filters)
+        if self._cache.max_size <= 0:
+            return self._query_page(filters, repository=repository)
+
+        key = _cache_key(self._quantize(filters))
+        cached = self._cache.get(key, version)
+        if cached is None:
+            page = self._query_page(filters, repository=repository)
+            # O cache guarda uma tupla; cada chamador recebe uma lista própria,
+            # que pode ordenar ou alterar sem mexer no que está em cache.
+            self._cache.put(key, page._replace(items=tuple(page.items)), version)
+            return page
+        return cached._replace(items=list(cached.items))
+
+    def get_query_cache_info(self) -> Dict[str, int]:
+        return self._cache.info()
+
+    def _resolved(self, filters: CollectionPointFilters) -> CollectionPointFilters:
+        """Filtros como os repositórios os entendem: sem `cep` nem `open_now`.
+
+        Só `open_now=true` tem filtro correspondente (`open_at`); "fechados
+        agora" não existe, então `open_now=false` é recusado.
+        """
+        filters = self._with_cep_center(filters)
+        if filters.open_now is None:
+            return filters
+        if not filters.open_now:
+            raise ValueError("open_now=false is not supported; omit open_now instead")
+        update: Dict[str, Any] = {"open_now": None}
+        if filters.open_now and filters.open_at is None:
+            update["open_at"] = now()
+        return filters.model_copy(update=update)
+
+    def _with_cep_center(
+        self, filters: CollectionPointFilters
+    ) -> CollectionPointFilters:
+        """Troca `cep` pelo seu centroide como centro da busca, se faltam lat/lng."""
+        if not filters.cep:
+            return filters
+        update: Dict[str, Any] = {"cep": None}
+        if filters.lat is None or filters.lng is None:
+            update["lat"], update["lng"] = self._geocoder.locate(filters.cep)
+        return filters.model_copy(update=update)
+
+    def _quantize(self, filters: CollectionPointFilters) -> CollectionPointFilters:
+        """Filtros com lat/lng arredondados, só para a chave do cache.
+
+        A consulta roda com o centro exato de quem a fez primeiro; outras com
+        centro na mesma célula recebem essa resposta. Distâncias e borda do
+        raio podem então estar deslocadas em até a diagonal de uma célula de
+        10^-decimais graus (~157 m com 3 casas).
+        """
+        if filters.lat is None or filters.lng is None:
+            return filters
+        return filters.model_copy(
+            update={
+                "lat": round(filters.lat, self._cache_coord_decimals),
+                "lng": round(filters.lng, self._cache_coord_decimals),
             }
+        )
+
+    def iter_collection_points(
+        self, filters: CollectionPointFilters, chunk_size: int = 500
+    ) -> Iterator[List[Union[CollectionPoint, CollectionPointWithDistance]]]:
+        """Percorre todos os resultados em blocos de `chunk_size`, página a página.
 
-        materials_dist = Counter(
-            material for point in active_points for material in point.materials
+        Cada bloco é uma nova consulta a partir do cursor do anterior, então
+        nada além do bloco corrente é mantido em memória.
+        """
+        filters = self._resolved(filters).model_copy(update={"limit": chunk_size})
+        while True:
+            page = self._query_page(filters, count_total=False)
+            if page.items:
+                yield page.items
+            if page.next_cursor is None:
+                return
+            filters = filters.model_copy(update={"cursor": page.next_cursor})
+
+    def _query_page(
+        self,
+        filters: CollectionPointFilters,
+        count_total: bool = True,
+        repository: Optional[CollectionPointsRepository] = None,
+    ) -> CollectionPointsPage:
+        """Uma página de resultados, ordenada por distância (com lat/lng), por
+        relevância (com `search`) ou por id.
+
+        A página é montada consumindo um iterador ordenado só até `limit + 1`
+        itens; `next_cursor` aponta para depois do último item devolvido.
+        """
+        after = _decode_cursor(filters.cursor) if filters.cursor else None
+        by_distance = filters.lat is not None and filters.lng is not None
+        keyed = by_distance or bool(filters.search)
+        if after is not None and (after[0] is not None) != keyed:
+            raise ValueError("Cursor does not match the requested ordering")
+
+        repository = repository or self._repository
+        if count_total:
+            total, ordered = repository.matching(filters, after)
+        else:
+            total, ordered = None, repository.iter_matching(filters, after)
+
+        if filters.limit is None:
+            window, more = list(ordered), False
+        else:
+            window = list(islice(ordered, filters.limit + 1))
+            more = len(window) > filters.limit
+            window = window[: filters.limit]
+
+        items = [
+            (
+                CollectionPointWithDistance(
+                    **point.model_dump(), distance_km=round(distance, 2)
+                )
+                if by_distance
+                else point
+            )
+            for distance, point in window
+        ]
+        next_cursor = (
+            _encode_cursor((window[-1][0], window[-1][1].id)) if more else None
+        )
+        return CollectionPointsPage(items=items, total=total, next_cursor=next_cursor)
+
+    def get_nearest_collection_points(
+        self,
+        lat: Optional[float] = None,
+        lng: Optional[float] = None,
+        k: int = 5,
+        material: Optional[str] = None,
+        cep: Optional[str] = None,
+    ) -> List[CollectionPointWithDistance]:
+        """Os `k` pontos mais próximos de lat/lng ou, na falta deles, do CEP."""
+        if lat is None or lng is None:
+            if not cep:
+                raise ValueError("Provide lat and lng, or a cep")
+            lat, lng = self._geocoder.locate(cep)
+        nearest = self._repository.nearest(
+            lat, lng, k, CollectionPointFilters(material=material)
         )
-        neighborhoods_dist = Counter(point.neighborhood for point in active_points)
-
-        return {
-            "total_points": len(active_points),
-            "materials_distribution": dict(materials_dist),
-            "neighborhoods_distribution": dict(neighborhoods_dist),
-            "points_accepting_all_materials": sum(
-                1 for p in active_points if p.accepts_all_materials
+        return [
+            CollectionPointWithDistance(
+                **point.model_dump(), distance_km=round(distance, 2)
+            )
+            for distance, point in nearest
+        ]
+
+    def get_collection_points_along_route(
+        self,
+        polyline: str,
+        buffer_km: float = 0.5,
+        material: Optional[str] = None,
+        city: Optional[str] = None,
+        accepts_all_materials: Optional[bool] = None,
+        limit: Optional[int] = None,
+    ) -> List[CollectionPointOnRoute]:
+        """Pontos ativos a até `buffer_km` da rota (polilinha codificada), na
+        ordem em que aparecem ao longo dela."""
+        if not 0 < buffer_km <= MAX_BUFFER_KM:
+            raise ValueError(f"buffer_km must be between 0 and {MAX_BUFFER_KM}")
+        route = Route.from_polyline(polyline)
+        found = self._repository.along_route(
+            route,
+            buffer_km,
+            CollectionPointFilters(
+                material=material,
+                city=city,
+                accepts_all_materials=accepts_all_materials,
             ),
-        }
+            limit,
+        )
+        return [
+            CollectionPointOnRoute(
+                **point.model_dump(),
+                distance_km=round(distance, 2),
+                route_km=round(position, 2),
+            )
+            for position, distance, point in found
+        ]
+
+    def get_collection_points_statistics(self) -> Dict[str, Any]:
+        return self._repository.statistics()
+
+    def get_facets(self, filters: CollectionPointFilters) -> Dict[str, Dict[str, int]]:
+        """Quantos pontos que atendem aos filtros há por material, bairro e cidade.
+
+        As contagens vêm dos índices do repositório, atualizados a cada escrita.
+        """
+        return self._repository.facets(self._resolved(filters))
+
+    def get_map_view(
+        self, box: Box, zoom: int
+    ) -> Tuple[List[Cluster], List[CollectionPoint]]:
+        """Grupos de pontos ativos que tocam a caixa, lidos da hierarquia de
+        grades do repositório; acima de `MAX_CLUSTER_ZOOM`, os próprios pontos.
+        """
+        if zoom > MAX_CLUSTER_ZOOM:
+            return [], self._repository.points_in_box(box)
+        return self._repository.clusters(zoom, box), []
+
+    def get_suggestions(self, prefix: str, limit: int = 10) -> List[Suggestion]:
+        """Autocomplete por prefixo, servido pelo índice do repositório."""
+        return self._repository.suggest(prefix, limit)
 
     def _haversine_distance(
         self, lat1: float, lon1: float, lat2: float, lon2: float
     ) -> float:
-        lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-        c = 2 * asin(sqrt(a))
-        r = 6371
-        return c * r
+        return haversine_km(lat1, lon1, lat2, lon2)
 
     def create_collection_point(
         self, collection_point_data: CollectionPointCreate
@@ -123,35 +379,107 @@ class CollectionPointsService:
         new_id = str(uuid.uuid4())
         now = datetime.now(timezone.utc)
 
-        new_point_data = collection_point_data.model_dump()
+        new_point_data = self._geocoder.with_coordinates(
+            collection_point_data
+        ).model_dump()
         new_point = CollectionPoint(
             **new_point_data, id=new_id, created_at=now, updated_at=now, is_active=True
         )
-        self.collection_points[new_point.id] = new_point
+        with self._lock:
+            self._repository.add(new_point)
+            self.changes.publish(new_point.id, new_point, None)
         return new_point
 
+    def bulk_create_collection_points(
+        self, points_data: List[CollectionPointCreate]
+    ) -> List[CollectionPoint]:
+        """Cria todos os pontos de uma vez, como uma única escrita no repositório."""
+        if not points_data:
+            return []
+        now = datetime.now(timezone.utc)
+        new_points = [
+            CollectionPoint(
+                **self._geocoder.with_coordinates(data).model_dump(),
+                id=str(uuid.uuid4()),
+                created_at=now,
+                updated_at=now,
+                is_active=True,
+            )
+            for data in points_data
+        ]
+        with self._lock:
+            self._repository.apply_batch(upserts=new_points)
+            for point in new_points:
+                self.changes.publish(point.id, point, None)
+        return new_points
+
+    def bulk_update_collection_points(
+        self,
+        changes: CollectionPointUpdate,
+        ids: Optional[List[str]] = None,
+        filters: Optional[CollectionPointFilters] = None,
+    ) -> List[CollectionPoint]:
+        update_data = changes.model_dump(exclude_unset=True)
+        with self._lock:
+            selected = self._select(ids, filters)
+            if not selected:
+                return []
+            update_data["updated_at"] = datetime.now(timezone.utc)
+            updated = [point.model_copy(update=update_data) for point in selected]
+            self._repository.apply_batch(upserts=updated)
+            for point, previous in zip(updated, selected):
+                self.changes.publish(point.id, point, previous)
+        return updated
+
+    def bulk_delete_collection_points(
+        self,
+        ids: Optional[List[str]] = None,
+        filters: Optional[CollectionPointFilters] = None,
+    ) -> List[CollectionPoint]:
+        with self._lock:
+            selected = self._select(ids, filters)
+            if selected:
+                self._repository.apply_batch(
+                    removed_ids=[point.id for point in selected]
+                )
+            for point in selected:
+                self.changes.publish(point.id, None, point)
+        return selected
+
+    def _select(
+        self,
+        ids: Optional[List[str]],
+        filters: Optional[CollectionPointFilters],
+    ) -> List[CollectionPoint]:
+        """Pontos escolhidos por lista de ids ou, na falta dela, pelos filtros."""
+        if ids is not None:
+            points = (self._repository.get(point_id) for point_id in dict.fromkeys(ids))
+            return [point for point in points if point is not None]
+        filters = self._resolved(filters)
+        return [point for _, point in self._repository.iter_matching(filters)]
+
     def update_collection_point(
         self, point_id: str, collection_point_data: CollectionPointUpdate
     ) -> Optional[CollectionPoint]:
-        point_to_update = self.get_collection_point_by_id(point_id)
-        if not point_to_update:
-            return None
-
-        update_data = collection_point_data.model_dump(exclude_unset=True)
-
-        for field, value in update_data.items():
-            setattr(point_to_update, field, value)
+        with self._lock:
+            current = self.get_collection_point_by_id(point_id)
+            if not current:
+                return None
 
-        point_to_update.updated_at = datetime.now(timezone.utc)
-        self.collection_points[point_id] = point_to_update
-        return point_to_update
+            update_data = collection_point_data.model_dump(exclude_unset=True)
+            update_data["updated_at"] = datetime.now(timezone.utc)
+            # Um modelo novo: o ponto lido continua intacto para quem já o tem.
+            updated = current.model_copy(update=update_data)
+            self._repository.update(updated)
+            self.changes.publish(point_id, updated, current)
+        return updated
 
     def delete_collection_point(self, point_id: str) -> Optional[CollectionPoint]:
-        point = self.collection_points.get(point_id)
-        if point:
-            del self.collection_points[point_id]
-            return point
-        return None
+        with self._lock:
+            point = self._repository.remove(point_id)
+            if point:
+                self.changes.publish(point_id, None, point)
+        return point
 
 
 collection_points_service = CollectionPointsService()
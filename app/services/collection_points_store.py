@@ -0,0 +1,611 @@
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from collections import Counter, defaultdict
+from itertools import chain
+
+import numpy as np
+
+from ..core.geo import (
+    EARTH_RADIUS_KM,
+    bounding_box,
+    haversine_km_many,
+    in_bounding_box,
+)
+from ..models.collection_point import CollectionPoint, CollectionPointFilters
+from .bitmap import bitmap_from_slots, bitmap_to_mask, slots_from_bitmap
+from .chunked import ChunkedArray, ChunkedDict, ChunkedSortedList
+from .cluster_index import Box, Cluster, ClusterIndex, cluster_entry
+from .compact_point import CompactCollectionPoint, StringPool
+from .operating_hours import (
+    Interval,
+    OpenHoursIndex,
+    minute_of_week,
+    parse_operating_hours,
+)
+from .spatial_index import GridIndex
+from .term_index import Suggestion, TermIndex, point_terms
+from .text_index import (
+    TrigramIndex,
+    query_tokens,
+    relevance,
+    search_fields,
+    trigrams,
+)
+
+# Acima deste número de células na caixa de busca, uma varredura vetorizada
+# sobre todos os slots é mais barata que visitar a grade célula por célula.
+MAX_GRID_CELLS_PER_QUERY = 256
+
+# Maior distância possível entre dois pontos na superfície da Terra.
+MAX_DISTANCE_KM = np.pi * EARTH_RADIUS_KM
+
+
+class IndexedFields(NamedTuple):
+    """Valores normalizados com que um slot foi indexado."""
+
+    city: str
+    city_name: str
+    neighborhood: str
+    neighborhood_name: str
+    materials: Tuple[str, ...]
+    is_active: bool
+    accepts_all_materials: bool
+    hours: Tuple[Interval, ...]
+
+    @classmethod
+    def from_point(cls, point: CompactCollectionPoint) -> "IndexedFields":
+        return cls(
+            city=point.city.lower(),
+            city_name=point.city,
+            neighborhood=point.neighborhood.lower(),
+            neighborhood_name=point.neighborhood,
+            materials=tuple(dict.fromkeys(point.materials)),
+            is_active=point.is_active,
+            accepts_all_materials=point.accepts_all_materials,
+            hours=parse_operating_hours(point.operating_hours) or (),
+        )
+
+
+class CollectionPointsStore:
+    """Pontos de coleta e as estruturas derivadas usadas nas buscas.
+
+    Cada ponto ocupa um slot; as coordenadas ficam em arrays float64 contíguos
+    indexados pelo slot, e a grade espacial guarda slots em vez de ids. Os
+    filtros de atributo são bitmaps (ver `bitmap.py`) por valor normalizado,
+    a busca textual usa um índice de trigramas (ver `text_index.py`), o
+    autocomplete um índice de prefixos (ver `term_index.py`), o mapa os
+    grupos por zoom da `ClusterIndex` (ver `cluster_index.py`) e o filtro
+    `open_at` os horários já interpretados da `OpenHoursIndex` (ver
+    `operating_hours.py`).
+    Os pontos são guardados como `CompactCollectionPoint`, com os valores
+    repetidos compartilhados pelo `StringPool` do store.
+
+    As estruturas que crescem com o número de pontos são contêineres por
+    pedaços (ver `chunked.py`): `copy` compartilha os pedaços, e uma escrita
+    duplica só os que altera, então o custo dela não depende do tamanho do
+    store.
+    """
+
+    def __init__(
+        self, points: Iterable[CollectionPoint] = (), cell_size_deg: float = 0.05
+    ):
+        self.points = ChunkedDict()
+        self._pool = StringPool()
+        self._sorted_ids = ChunkedSortedList()
+        self._slot_of = ChunkedDict()
+        self._slot_count = 0
+        self._free_slots: List[int] = []
+        self._ids = ChunkedArray(None, object)
+        self._lats = ChunkedArray(np.nan, np.float64)
+        self._lngs = ChunkedArray(np.nan, np.float64)
+        # Campos de `search_fields` de cada slot, normalizados na escrita.
+        self._folded = ChunkedArray(None, object)
+        self._grid = GridIndex(cell_size_deg)
+        self._text = TrigramIndex()
+        self._terms = TermIndex()
+        self._clusters = ClusterIndex()
+        self._hours = OpenHoursIndex()
+
+        self._live = 0
+        self._active = 0
+        self._accepts_all = 0
+        self._by_city: Dict[str, int] = {}
+        self._by_neighborhood: Dict[str, int] = {}
+        self._by_material: Dict[str, int] = {}
+        # Nome exibido de cada cidade e bairro indexado (as chaves são minúsculas).
+        self._city_names: Dict[str, str] = {}
+        self._neighborhood_names: Dict[str, str] = {}
+
+        self._active_count = 0
+        self._active_accepting_all = 0
+        self._active_materials: Counter = Counter()
+        self._active_neighborhoods: Counter = Counter()
+
+        for point in points:
+            slot = self._allocate_slot(point.id)
+            self.points[point.id] = self._compact(point)
+            self._place(slot, point)
+        self._sorted_ids = ChunkedSortedList(self.points)
+        self._rebuild_indexes()
+
+    def copy(self) -> "CollectionPointsStore":
+        """Cópia independente, base da próxima versão (copy-on-write).
+
+        Os contêineres por pedaços e os índices compartilham o conteúdo com
+        o original até serem alterados; os dicionários por valor (cidade,
+        bairro, material) são pequenos e copiados inteiros. Registros,
+        bitmaps (inteiros imutáveis) e o pool de strings são compartilhados.
+        """
+        clone = object.__new__(CollectionPointsStore)
+        clone.__dict__.update(self.__dict__)
+        clone.points = self.points.copy()
+        clone._sorted_ids = self._sorted_ids.copy()
+        clone._slot_of = self._slot_of.copy()
+        clone._free_slots = list(self._free_slots)
+        clone._ids = self._ids.copy()
+        clone._lats = self._lats.copy()
+        clone._lngs = self._lngs.copy()
+        clone._folded = self._folded.copy()
+        clone._grid = self._grid.copy()
+        clone._text = self._text.copy()
+        clone._terms = self._terms.copy()
+        clone._clusters = self._clusters.copy()
+        clone._hours = self._hours.copy()
+        clone._by_city = dict(self._by_city)
+        clone._by_neighborhood = dict(self._by_neighborhood)
+        clone._by_material = dict(self._by_material)
+        clone._city_names = dict(self._city_names)
+        clone._neighborhood_names = dict(self._neighborhood_names)
+        clone._active_materials = Counter(self._active_materials)
+        clone._active_neighborhoods = Counter(self._active_neighborhoods)
+        return clone
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def __contains__(self, point_id: str) -> bool:
+        return point_id in self.points
+
+    def get(self, point_id: str) -> Optional[CompactCollectionPoint]:
+        return self.points.get(point_id)
+
+    def add(self, point: CollectionPoint) -> None:
+        if point.id in self.points:
+            self.update(point)
+            return
+        slot = self._allocate_slot(point.id)
+        record = self.points[point.id] = self._compact(point)
+        self._place(slot, record)
+        self._set_bits(slot, IndexedFields.from_point(record))
+        self._text.add(slot, _trigrams(self._folded[slot]))
+        self._terms.add(point_terms(record))
+        entry = cluster_entry(record)
+        if entry:
+            self._clusters.add(*entry)
+        self._sorted_ids.add(point.id)
+
+    def update(self, point: CollectionPoint) -> None:
+        """Substitui um ponto já armazenado e o reindexa."""
+        slot = self._slot_of[point.id]
+        previous = self.points[point.id]
+        old_grams = _trigrams(self._folded[slot])
+        self._clear_bits(slot, IndexedFields.from_point(previous))
+        record = self.points[point.id] = self._compact(point)
+        self._place(slot, record)
+        self._set_bits(slot, IndexedFields.from_point(record))
+        new_grams = _trigrams(self._folded[slot])
+        self._text.remove(slot, old_grams - new_grams)
+        self._text.add(slot, new_grams - old_grams)
+        old_terms, new_terms = point_terms(previous), point_terms(record)
+        self._terms.remove(old_terms - new_terms)
+        self._terms.add(new_terms - old_terms)
+        old_entry, new_entry = cluster_entry(previous), cluster_entry(record)
+        if old_entry != new_entry:
+            if old_entry:
+                self._clusters.remove(*old_entry)
+            if new_entry:
+                self._clusters.add(*new_entry)
+
+    def remove(self, point_id: str) -> Optional[CompactCollectionPoint]:
+        point = self.points.pop(point_id, None)
+        if point is None:
+            return None
+        slot = self._slot_of.pop(point_id)
+        self._sorted_ids.remove(point_id)
+        self._clear_bits(slot, IndexedFields.from_point(point))
+        self._text.remove(slot, _trigrams(self._folded[slot]))
+        self._terms.remove(point_terms(point))
+        entry = cluster_entry(point)
+        if entry:
+            self._clusters.remove(*entry)
+        self._ids[slot] = None
+        self._lats[slot] = np.nan
+        self._lngs[slot] = np.nan
+        self._folded[slot] = None
+        self._grid.remove(slot)
+        self._free_slots.append(slot)
+        return point
+
+    def filter_bitmap(self, filters: CollectionPointFilters) -> int:
+        """Bitmap dos slots que atendem aos filtros de atributo (exceto `search`)."""
+        bits = self._live
+        if filters.is_active is not None:
+            bits &= self._active if filters.is_active else ~self._active
+        if filters.accepts_all_materials is not None:
+            if filters.accepts_all_materials:
+                bits &= self._accepts_all
+            else:
+                bits &= ~self._accepts_all
+        if filters.city:
+            bits &= self._by_city.get(filters.city.lower(), 0)
+        if filters.neighborhood:
+            bits &= self._by_neighborhood.get(filters.neighborhood.lower(), 0)
+        if filters.material:
+            bits &= self._by_material.get(filters.material, 0)
+        if filters.open_at is not None:
+            bits &= self._hours.open_at(minute_of_week(filters.open_at))
+        return bits
+
+    def search(self, bits: int, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Slots do bitmap que atendem à busca textual e a relevância de cada um.
+
+        O índice de trigramas reduz os candidatos; a relevância (que também
+        confere se cada palavra aparece mesmo) só é calculada para eles, sobre
+        os campos já normalizados na escrita.
+        """
+        tokens = query_tokens(query)
+        if not tokens:
+            slots = self.slots_in(bits)
+            return slots, np.zeros(len(slots), dtype=np.float64)
+        candidates = self._text.candidates(tokens)
+        if candidates is None:
+            candidates = self.slots_in(bits)
+        else:
+            candidates = candidates[self.in_bitmap(bits, candidates)]
+        scores = np.fromiter(
+            (
+                relevance(fields, tokens)
+                for fields in self._folded.take(candidates).tolist()
+            ),
+            dtype=np.float64,
+            count=len(candidates),
+        )
+        found = scores > 0
+        return candidates[found], scores[found]
+
+    def suggest(self, prefix: str, limit: int) -> List[Suggestion]:
+        return self._terms.suggest(prefix, limit)
+
+    def clusters(self, zoom: int, box: Box) -> List[Cluster]:
+        return self._clusters.clusters(zoom, box)
+
+    def slots_in_box(
+        self, box: Box, bits: int, mask: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Slots do bitmap dentro da caixa, pelas células da grade.
+
+        Quem consulta várias caixas com o mesmo bitmap passa em `mask` a
+        máscara dele (`mask_of`), calculada uma vez só.
+        """
+        min_lat, min_lng, max_lat, max_lng = box
+        i0, j0 = self._grid.cell_for(min_lat, min_lng)
+        i1, j1 = self._grid.cell_for(max_lat, max_lng)
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > MAX_GRID_CELLS_PER_QUERY:
+            slots = np.arange(self._slot_count)
+        else:
+            slots = np.fromiter(
+                chain.from_iterable(
+                    self._grid.keys_in((i, j))
+                    for i in range(i0, i1 + 1)
+                    for j in range(j0, j1 + 1)
+                ),
+                dtype=np.int64,
+            )
+        lats, lngs = self.coordinates(slots)
+        slots = slots[in_bounding_box(lats, lngs, *box)]
+        if mask is None:
+            return slots[self.in_bitmap(bits, slots)]
+        return slots[mask[slots]]
+
+    def coordinates(self, slots: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return self._lats.take(slots), self._lngs.take(slots)
+
+    def statistics(self) -> Dict[str, Any]:
+        """Estatísticas dos pontos ativos, lidas dos contadores incrementais."""
+        return {
+            "total_points": self._active_count,
+            "materials_distribution": dict(self._active_materials),
+            "neighborhoods_distribution": dict(self._active_neighborhoods),
+            "points_accepting_all_materials": self._active_accepting_all,
+        }
+
+    def facets(self, bits: int) -> Dict[str, Dict[str, int]]:
+        """Quantos slots do bitmap têm cada material, bairro e cidade.
+
+        Cada contagem é a interseção do bitmap com o bitmap do valor, sem
+        visitar os pontos; valores sem nenhum slot ficam de fora.
+        """
+        return {
+            "materials": _facet_counts(self._by_material, bits),
+            "neighborhoods": _facet_counts(
+                self._by_neighborhood, bits, self._neighborhood_names
+            ),
+            "cities": _facet_counts(self._by_city, bits, self._city_names),
+        }
+
+    def scan_statistics(self) -> Dict[str, Any]:
+        """Mesmas estatísticas recalculadas varrendo os pontos (checagem de consistência)."""
+        active_points = [p for p in self.points.values() if p.is_active]
+        return {
+            "total_points": len(active_points),
+            "materials_distribution": dict(
+                Counter(m for p in active_points for m in dict.fromkeys(p.materials))
+            ),
+            "neighborhoods_distribution": dict(
+                Counter(p.neighborhood for p in active_points)
+            ),
+            "points_accepting_all_materials": sum(
+                1 for p in active_points if p.accepts_all_materials
+            ),
+        }
+
+    def slots_in(self, bits: int) -> np.ndarray:
+        return slots_from_bitmap(bits)
+
+    def mask_of(self, bits: int) -> np.ndarray:
+        """Máscara booleana do bitmap, uma posição por slot."""
+        return bitmap_to_mask(bits, self._slot_count)
+
+    def in_bitmap(self, bits: int, slots: np.ndarray) -> np.ndarray:
+        """Máscara booleana: quais dos `slots` pertencem ao bitmap."""
+        return self.mask_of(bits)[slots]
+
+    def ids_in_order(self, bits: int, after_id: Optional[str] = None) -> Iterator[str]:
+        """Ids do bitmap em ordem crescente, a partir do primeiro maior que `after_id`."""
+        if not bits:
+            return
+        wanted = bitmap_to_mask(bits, self._slot_count)
+        slot_of = self._slot_of
+        if after_id is None:
+            ids = iter(self._sorted_ids)
+        else:
+            ids = self._sorted_ids.iter_from(after_id, inclusive=False)
+        for point_id in ids:
+            if wanted[slot_of[point_id]]:
+                yield point_id
+
+    def within_radius(
+        self, lat: float, lng: float, radius_km: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Slots dentro do raio e suas distâncias em km, sem ordem definida."""
+        box = bounding_box(lat, lng, radius_km)
+        slots = self._candidate_slots(lat, lng, radius_km, box)
+        if slots is None:
+            lats = self._lats.prefix(self._slot_count)
+            lngs = self._lngs.prefix(self._slot_count)
+            slots = np.flatnonzero(in_bounding_box(lats, lngs, *box))
+            lats, lngs = lats[slots], lngs[slots]
+        else:
+            lats, lngs = self.coordinates(slots)
+            inside = in_bounding_box(lats, lngs, *box)
+            slots, lats, lngs = slots[inside], lats[inside], lngs[inside]
+
+        distances = haversine_km_many(lat, lng, lats, lngs)
+        inside = distances <= radius_km
+        return slots[inside], distances[inside]
+
+    def nearest(
+        self, lat: float, lng: float, k: int, bits: int, start_radius_km: float = 1.0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Os `k` slots do bitmap mais próximos de (lat, lng), em ordem de distância.
+
+        O raio de busca dobra até conter `k` candidatos; só esses são
+        selecionados (argpartition) e ordenados, nunca o conjunto inteiro.
+        """
+        if k <= 0 or not bits:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        if bits.bit_count() <= k:
+            slots = self.slots_in(bits)
+            distances = haversine_km_many(lat, lng, *self.coordinates(slots))
+        else:
+            wanted = bitmap_to_mask(bits, self._slot_count)
+            radius = start_radius_km
+            while True:
+                slots, distances = self.within_radius(lat, lng, radius)
+                matching = wanted[slots]
+                slots, distances = slots[matching], distances[matching]
+                if len(slots) >= k or radius >= MAX_DISTANCE_KM:
+                    break
+                radius = min(radius * 2, MAX_DISTANCE_KM)
+
+            if len(slots) > k:
+                closest = np.argpartition(distances, k - 1)[:k]
+                slots, distances = slots[closest], distances[closest]
+
+        order = np.argsort(distances, kind="stable")
+        return slots[order], distances[order]
+
+    def ids_by_distance(
+        self, slots: np.ndarray, distances: np.ndarray, chunk_size: int = 64
+    ) -> Iterator[Tuple[float, str]]:
+        """Percorre pares (distância, id) em ordem crescente, ordenando por blocos.
+
+        Cada bloco separa os mais próximos restantes com `np.partition`, então
+        quem consome só as primeiras posições não paga a ordenação completa.
+        """
+        while len(slots):
+            if len(slots) > chunk_size:
+                cut = np.partition(distances, chunk_size - 1)[chunk_size - 1]
+                head = distances <= cut
+            else:
+                head = np.ones(len(slots), dtype=bool)
+            yield from sorted(zip(distances[head].tolist(), self.ids_for(slots[head])))
+            slots, distances = slots[~head], distances[~head]
+            chunk_size *= 2
+
+    def ids_for(self, slots: np.ndarray) -> List[str]:
+        return self._ids.take(slots).tolist()
+
+    def _candidate_slots(self, lat, lng, radius_km, box) -> Optional[np.ndarray]:
+        """Slots das células da grade que tocam o círculo, ou None para varredura total."""
+        min_lat, min_lng, max_lat, max_lng = box
+        size = self._grid.cell_size_deg
+        span = ((max_lat - min_lat) / size + 1) * ((max_lng - min_lng) / size + 1)
+        if span > MAX_GRID_CELLS_PER_QUERY:
+            return None
+        cells = self._grid.cells_in_radius(lat, lng, radius_km)
+        return np.fromiter(
+            chain.from_iterable(self._grid.keys_in(cell) for cell in cells),
+            dtype=np.int64,
+        )
+
+    def _allocate_slot(self, point_id: str) -> int:
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            slot = self._slot_count
+            self._slot_count += 1
+            if slot >= len(self._lats):
+                for values in (self._ids, self._lats, self._lngs, self._folded):
+                    values.grow()
+        self._slot_of[point_id] = slot
+        self._ids[slot] = point_id
+        return slot
+
+    def _compact(self, point) -> CompactCollectionPoint:
+        return CompactCollectionPoint.from_point(point, self._pool)
+
+    def _place(self, slot: int, point) -> None:
+        self._lats[slot] = point.lat
+        self._lngs[slot] = point.lng
+        self._folded[slot] = search_fields(point)
+        self._grid.insert(slot, point.lat, point.lng)
+
+    def _set_bits(self, slot: int, fields: IndexedFields) -> None:
+        bit = 1 << slot
+        self._live |= bit
+        if fields.is_active:
+            self._active |= bit
+        if fields.accepts_all_materials:
+            self._accepts_all |= bit
+        _add_to(self._by_city, fields.city, bit)
+        _add_to(self._by_neighborhood, fields.neighborhood, bit)
+        for material in fields.materials:
+            _add_to(self._by_material, material, bit)
+        self._hours.add(slot, fields.hours)
+        self._city_names[fields.city] = fields.city_name
+        self._neighborhood_names[fields.neighborhood] = fields.neighborhood_name
+        if fields.is_active:
+            self._count(fields, 1)
+
+    def _clear_bits(self, slot: int, fields: IndexedFields) -> None:
+        bit = 1 << slot
+        self._live &= ~bit
+        self._active &= ~bit
+        self._accepts_all &= ~bit
+        _remove_from(self._by_city, fields.city, bit)
+        _remove_from(self._by_neighborhood, fields.neighborhood, bit)
+        for material in fields.materials:
+            _remove_from(self._by_material, material, bit)
+        self._hours.remove(slot, fields.hours)
+        if fields.city not in self._by_city:
+            self._city_names.pop(fields.city, None)
+        if fields.neighborhood not in self._by_neighborhood:
+            self._neighborhood_names.pop(fields.neighborhood, None)
+        if fields.is_active:
+            self._count(fields, -1)
+
+    def _count(self, fields: IndexedFields, delta: int) -> None:
+        self._active_count += delta
+        if fields.accepts_all_materials:
+            self._active_accepting_all += delta
+        _adjust(self._active_neighborhoods, fields.neighborhood_name, delta)
+        for material in fields.materials:
+            _adjust(self._active_materials, material, delta)
+
+    def _rebuild_indexes(self) -> None:
+        """Reconstrói bitmaps e contadores de uma vez a partir dos pontos."""
+        live, active, accepts_all = [], [], []
+        by_city, by_neighborhood, by_material = (
+            defaultdict(list),
+            defaultdict(list),
+            defaultdict(list),
+        )
+        indexed = [
+            (self._slot_of[point_id], IndexedFields.from_point(point))
+            for point_id, point in self.points.items()
+        ]
+        for slot, fields in indexed:
+            live.append(slot)
+            if fields.is_active:
+                active.append(slot)
+            if fields.accepts_all_materials:
+                accepts_all.append(slot)
+            by_city[fields.city].append(slot)
+            by_neighborhood[fields.neighborhood].append(slot)
+            for material in fields.materials:
+                by_material[material].append(slot)
+
+        self._live = bitmap_from_slots(live)
+        self._active = bitmap_from_slots(active)
+        self._accepts_all = bitmap_from_slots(accepts_all)
+        self._by_city = {k: bitmap_from_slots(v) for k, v in by_city.items()}
+        self._by_neighborhood = {
+            k: bitmap_from_slots(v) for k, v in by_neighborhood.items()
+        }
+        self._by_material = {k: bitmap_from_slots(v) for k, v in by_material.items()}
+        self._hours = OpenHoursIndex((slot, f.hours) for slot, f in indexed)
+        self._city_names = {f.city: f.city_name for _, f in indexed}
+        self._neighborhood_names = {
+            f.neighborhood: f.neighborhood_name for _, f in indexed
+        }
+
+        active_fields = [f for _, f in indexed if f.is_active]
+        self._active_count = len(active_fields)
+        self._active_accepting_all = sum(
+            1 for f in active_fields if f.accepts_all_materials
+        )
+        self._active_materials = Counter(m for f in active_fields for m in f.materials)
+        self._active_neighborhoods = Counter(f.neighborhood_name for f in active_fields)
+        self._text = TrigramIndex(
+            (slot, _trigrams(self._folded[slot])) for slot in self._slot_of.values()
+        )
+        self._terms = TermIndex(
+            chain.from_iterable(map(point_terms, self.points.values()))
+        )
+        self._clusters = ClusterIndex(
+            filter(None, map(cluster_entry, self.points.values()))
+        )
+
+
+def _trigrams(fields: Tuple[str, ...]) -> set:
+    return set().union(*map(trigrams, fields))
+
+
+def _add_to(postings: Dict[str, int], key: str, bit: int) -> None:
+    postings[key] = postings.get(key, 0) | bit
+
+
+def _remove_from(postings: Dict[str, int], key: str, bit: int) -> None:
+    bits = postings.get(key, 0) & ~bit
+    if bits:
+        postings[key] = bits
+    else:
+        postings.pop(key, None)
+
+
+def _facet_counts(
+    postings: Dict[str, int], bits: int, names: Optional[Dict[str, str]] = None
+) -> Dict[str, int]:
+    counts = {}
+    for key, posting in postings.items():
+        count = (posting & bits).bit_count()
+        if count:
+            counts[names[key] if names else key] = count
+    return counts
+
+
+def _adjust(counter: Counter, key: str, delta: int) -> None:
+    counter[key] += delta
+    if counter[key] <= 0:
+        del counter[key]
@@ -0,0 +1,60 @@
+from typing import Dict, Tuple
+
+from ..models.collection_point import CollectionPoint
+
+# Campos de baixa cardinalidade: o mesmo valor se repete em muitos pontos, então
+# cada valor distinto é guardado uma vez só e compartilhado (ver `StringPool`).
+# Nome, número, telefone etc. são quase sempre únicos e ficam de fora.
+POOLED_FIELDS = ("cep", "city", "neighborhood", "street", "operating_hours")
+
+
+class StringPool:
+    """Dicionário de valores: devolve sempre o mesmo objeto para valores iguais.
+
+    Diferente de `sys.intern`, o pool vive junto do store que o usa e é
+    descartado com ele, então valores que deixaram de existir não ficam presos
+    para sempre.
+    """
+
+    def __init__(self):
+        self._strings: Dict[str, str] = {}
+        self._tuples: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self._strings) + len(self._tuples)
+
+    def string(self, value: str) -> str:
+        return self._strings.setdefault(value, value)
+
+    def strings(self, values) -> Tuple[str, ...]:
+        """Tupla compartilhada: listas de materiais iguais viram o mesmo objeto."""
+        values = tuple(self.string(value) for value in values)
+        return self._tuples.setdefault(values, values)
+
+
+class CompactCollectionPoint:
+    """Registro interno de um ponto de coleta, sem o custo de um modelo pydantic.
+
+    Usa `__slots__` (sem `__dict__` por instância) e compartilha os valores
+    repetidos através de um `StringPool`. Modelos `CollectionPoint` só são
+    montados na borda, por `to_model`.
+    """
+
+    __slots__ = tuple(CollectionPoint.model_fields)
+
+    @classmethod
+    def from_point(cls, point, pool: StringPool) -> "CompactCollectionPoint":
+        """Aceita um `CollectionPoint` ou outro registro compacto."""
+        record = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(record, name, getattr(point, name))
+        for name in POOLED_FIELDS:
+            setattr(record, name, pool.string(getattr(point, name)))
+        record.materials = pool.strings(point.materials)
+        return record
+
+    def to_model(self) -> CollectionPoint:
+        # Os valores vieram de um modelo já validado: dispensa nova validação.
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields["materials"] = list(self.materials)
+        return CollectionPoint.model_construct(**fields)
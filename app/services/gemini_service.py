@@ -21,7 +21,7 @@ chat_sessions = {}
 tools = [
     {
         "name": "get_collection_points",
-        "description": "Busca e filtra pontos de coleta com base em vários critérios combinados, como material, bairro, cidade, proximidade geográfica (latitude/longitude) ou um termo de busca geral.",
+        "description": "Busca e filtra pontos de coleta com base em vários critérios combinados, como material, bairro, cidade, proximidade geográfica (latitude/longitude ou CEP) ou um termo de busca geral.",
         "parameters": {
             "type": "OBJECT",
             "properties": {
@@ -39,7 +39,7 @@ tools = [
                 },
                 "search": {
                     "type": "STRING",
-                    "description": "Termo de busca geral para nome, rua ou descrição do ponto.",
+                    "description": "Termo de busca geral para nome, bairro, rua ou descrição do ponto (ignora acentos; resultados mais relevantes primeiro).",
                 },
                 "lat": {
                     "type": "NUMBER",
@@ -49,13 +49,76 @@ tools = [
                     "type": "NUMBER",
                     "description": "Longitude do usuário para busca por proximidade.",
                 },
+                "cep": {
+                    "type": "STRING",
+                    "description": "CEP do usuário, usado como centro da busca por proximidade quando não há latitude/longitude.",
+                },
                 "radius_km": {
                     "type": "NUMBER",
                     "description": "Raio em quilômetros para a busca por proximidade (padrão: 5.0).",
                 },
+                "open_now": {
+                    "type": "BOOLEAN",
+                    "description": "Se verdadeiro, retorna só os pontos abertos agora, pelo horário de funcionamento. Use quando o usuário perguntar o que está aberto.",
+                },
+            },
+        },
+    },
+    {
+        "name": "get_nearest_collection_points",
+        "description": "Retorna os pontos de coleta mais próximos do usuário, do mais perto ao mais longe, mesmo que estejam fora do raio padrão de busca. Use quando o usuário pedir os pontos mais próximos ou 'perto de mim'. Informe latitude/longitude ou, na falta delas, o CEP.",
+        "parameters": {
+            "type": "OBJECT",
+            "properties": {
+                "lat": {
+                    "type": "NUMBER",
+                    "description": "Latitude do usuário.",
+                },
+                "lng": {
+                    "type": "NUMBER",
+                    "description": "Longitude do usuário.",
+                },
+                "cep": {
+                    "type": "STRING",
+                    "description": "CEP do usuário, se a latitude/longitude não for conhecida.",
+                },
+                "k": {
+                    "type": "INTEGER",
+                    "description": "Quantidade de pontos a retornar (padrão: 5).",
+                },
+                "material": {
+                    "type": "STRING",
+                    "description": "Filtra por um material específico (ex: 'Vidro', 'Pilhas').",
+                },
             },
         },
     },
+    {
+        "name": "get_collection_points_along_route",
+        "description": "Retorna os pontos de coleta ao longo de um trajeto do usuário (ex: 'no caminho para o trabalho'), na ordem em que aparecem no caminho. Use quando o usuário informar a rota como polilinha codificada.",
+        "parameters": {
+            "type": "OBJECT",
+            "properties": {
+                "polyline": {
+                    "type": "STRING",
+                    "description": "Rota do usuário no formato Encoded Polyline do Google.",
+                },
+                "buffer_km": {
+                    "type": "NUMBER",
+                    "description": "Distância máxima do ponto até a rota, em quilômetros (padrão: 0.5, máximo: 5).",
+                },
+                "material": {
+                    "type": "STRING",
+                    "description": "Filtra por um material específico (ex: 'Vidro', 'Pilhas').",
+                },
+                "limit": {
+                    "type": "INTEGER",
+                    "description": "Quantidade máxima de pontos a retornar (padrão: 10).",
+                },
+            },
+            "required": ["polyline"],
+        },
+    },
     {
         "name": "get_collection_points_statistics",
         "description": "Obtém estatísticas sobre os pontos de coleta, como contagem total, distribuição por bairro e por material.",
@@ -63,7 +126,7 @@ tools = [
     },
     {
         "name": "get_available_materials",
-        "description": "Lista todos os materiais que podem ser reciclados nos pontos de coleta.",
+        "description": "Lista os materiais que podem ser reciclados nos pontos de coleta ativos e quantos pontos aceitam cada um.",
         "parameters": {"type": "OBJECT", "properties": {}},
     },
 ]
@@ -106,13 +169,33 @@ def execute_function(function_call: dict) -> dict:
             )
             data_to_return = [p.model_dump() for p in results]
             return {"data": data_to_return, "count": len(data_to_return)}
+        elif function_name == "get_nearest_collection_points":
+            results = collection_points_service.get_nearest_collection_points(
+                lat=params.get("lat"),
+                lng=params.get("lng"),
+                k=int(params.get("k", 5)),
+                material=params.get("material"),
+                cep=params.get("cep"),
+            )
+            data_to_return = [p.model_dump() for p in results]
+            return {"data": data_to_return, "count": len(data_to_return)}
+        elif function_name == "get_collection_points_along_route":
+            results = collection_points_service.get_collection_points_along_route(
+                params["polyline"],
+                buffer_km=float(params.get("buffer_km", 0.5)),
+                material=params.get("material"),
+                limit=int(params.get("limit", 10)),
+            )
+            data_to_return = [p.model_dump() for p in results]
+            return {"data": data_to_return, "count": len(data_to_return)}
         elif function_name == "get_collection_points_statistics":
             stats = collection_points_service.get_collection_points_statistics()
             return {"data": stats}
         elif function_name == "get_available_materials":
-            from app.data.mock_collection_points import AVAILABLE_MATERIALS
-
-            return {"data": AVAILABLE_MATERIALS}
+            materials = collection_points_service.get_facets(CollectionPointFilters())[
+                "materials"
+            ]
+            return {"data": sorted(materials), "counts": materials}
         else:
             return {"error": f"Função desconhecida: {function_name}"}
     except Exception as e:
@@ -137,6 +220,12 @@ def call_gemini_with_memory(
         if user_location and user_location.get("lat") and user_location.get("lng"):
             loc = user_location
             full_prompt += f" (Minha localização atual para referência é latitude {loc['lat']} e longitude {loc['lng']})."
+        elif user_location and user_location.get("cep"):
+            full_prompt += f" (Meu CEP para referência é {user_location['cep']})."
+        if user_location and user_location.get("route"):
+            full_prompt += (
+                f" (Minha rota, como polilinha codificada, é {user_location['route']})."
+            )
 
         print(
             f"[GeminiService] Enviando prompt para a sessão {session_id}: '{full_prompt}'"
@@ -154,7 +243,11 @@ def call_gemini_with_memory(
             if is_saudacao(user_prompt):
                 return "Olá! Como posso ajudar você com reciclagem, ecologia ou sustentabilidade hoje?"
             function_response_data = execute_function(function_call)
-            if function_call.name == "get_collection_points":
+            if function_call.name in (
+                "get_collection_points",
+                "get_nearest_collection_points",
+                "get_collection_points_along_route",
+            ):
                 return format_collection_points_response(function_response_data)
             elif function_call.name == "get_collection_points_statistics":
                 return format_statistics_response(function_response_data)
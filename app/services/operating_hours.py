@@ -0,0 +1,267 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import re
+import unicodedata
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+from ..core.config import settings
+from .bitmap import bitmap_from_slots
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+# Intervalos aceitos por ponto; um horário que passe disso não é indexado.
+MAX_WEEKLY_INTERVALS = 64
+
+OPERATING_HOURS_TZ = ZoneInfo(settings.OPERATING_HOURS_TIMEZONE)
+
+# Intervalo [início, fim) em minutos desde segunda-feira 0h.
+Interval = Tuple[int, int]
+
+_DAYS = ("segunda", "terca", "quarta", "quinta", "sexta", "sabado", "domingo")
+_ALL_DAYS = ("todos os dias", "todo dia", "diariamente")
+_WEEKEND = ("fim de semana", "fins de semana", "finais de semana")
+_WEEKDAYS = ("dias uteis",)
+_IGNORED_WORDS = {"e", "feira", "de", "os", "aos", "das"}
+_RANGE_WORDS = {"a", "ate", "-"}
+_CLOSED = re.compile(r"^\s*fechad[oa]s?\s*$")
+_FULL_DAY = re.compile(r"^\s*24\s*(?:h|hs|horas)\s*$")
+_TIME = r"(\d{1,2})(?:\s*[h:]\s*(\d{2})?)?\s*h?"
+_TIME_RANGE = re.compile(_TIME + r"\s*(?:as|a|ate|-|–)\s*" + _TIME)
+# Vírgula ou ponto e vírgula seguido de letra começa outra cláusula de dias;
+# seguido de número, é outra faixa de horário dos mesmos dias.
+_CLAUSES = re.compile(r"[,;.]\s*(?=[a-z])")
+_CLAUSE = re.compile(r"^(?P<days>[^\d]*?)\s*:?\s*(?P<times>\d.*|fechad[oa]s?)?\s*$")
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.casefold().replace("–", "-"))
+    return text.encode("ascii", "ignore").decode().strip().rstrip(".")
+
+
+@lru_cache(maxsize=4096)
+def parse_operating_hours(text: str) -> Optional[Tuple[Interval, ...]]:
+    """Intervalos semanais de funcionamento, ordenados e sem sobreposição.
+
+    Entende textos como "Segunda a Sexta: 8h às 18h, Sábado: 8h às 12h",
+    "Todos os dias: 24h" ou "Seg, Qua e Sex: 8h às 12h e 14h às 18h". None
+    se o texto não for reconhecido: o ponto não aparece como aberto.
+    """
+    days_pending: List[int] = []
+    intervals: List[Interval] = []
+    for clause in _CLAUSES.split(_normalize(text)):
+        match = _CLAUSE.match(clause)
+        if match is None:
+            return None
+        days = _parse_days(match["days"]) if match["days"] else []
+        if days is None:
+            return None
+        days = days_pending + days
+        times = match["times"]
+        if times is None:
+            # "Segunda, Quarta e Sexta: ..." chega aqui em pedaços.
+            days_pending = days
+            continue
+        days_pending = []
+        if not days or _CLOSED.match(times):
+            if not days:
+                return None
+            continue
+        ranges = _parse_times(times)
+        if ranges is None:
+            return None
+        for day in days:
+            for start, end in ranges:
+                intervals.extend(_week_intervals(day * MINUTES_PER_DAY, start, end))
+    if days_pending:
+        return None
+    merged = _merge(intervals)
+    if len(merged) > MAX_WEEKLY_INTERVALS:
+        return None
+    return tuple(merged)
+
+
+def _parse_days(text: str) -> Optional[List[int]]:
+    text = " ".join(text.replace("-feira", "").replace("-", " - ").split())
+    if text in _ALL_DAYS:
+        return list(range(7))
+    if text in _WEEKEND:
+        return [5, 6]
+    if text in _WEEKDAYS:
+        return list(range(5))
+    days: List[int] = []
+    in_range = False
+    for word in re.findall(r"[a-z]+|-", text):
+        if word in _IGNORED_WORDS:
+            continue
+        if word in _RANGE_WORDS:
+            if not days:
+                return None
+            in_range = True
+            continue
+        # "seg", "sab" e "sábado" valem o mesmo que o nome inteiro.
+        day = next(
+            (
+                i
+                for i, name in enumerate(_DAYS)
+                if len(word) >= 3 and name.startswith(word)
+            ),
+            None,
+        )
+        if day is None:
+            return None
+        if in_range:
+            first = days[-1]
+            days.extend((first + k) % 7 for k in range(1, (day - first) % 7 + 1))
+            in_range = False
+        else:
+            days.append(day)
+    if in_range:
+        return None
+    return list(dict.fromkeys(days))
+
+
+def _parse_times(text: str) -> Optional[List[Tuple[int, int]]]:
+    """Faixas (início, fim) em minutos do dia; o fim pode passar de 24h."""
+    if _FULL_DAY.match(text):
+        return [(0, MINUTES_PER_DAY)]
+    ranges = []
+    for match in _TIME_RANGE.finditer(text):
+        start = _minutes(match[1], match[2])
+        end = _minutes(match[3], match[4])
+        if start is None or end is None:
+            return None
+        if end <= start:
+            # Passa da meia-noite (ou, com início igual ao fim, o dia todo).
+            end += MINUTES_PER_DAY
+        ranges.append((start, end))
+    leftover = _TIME_RANGE.sub(" ", text)
+    if not ranges or re.sub(r"\b(e|h)\b|[,;\s]", "", leftover):
+        return None
+    return ranges
+
+
+def _minutes(hours: str, minutes: Optional[str]) -> Optional[int]:
+    total = int(hours) * 60 + int(minutes or 0)
+    if int(hours) > 24 or int(minutes or 0) > 59 or total > MINUTES_PER_DAY:
+        return None
+    return total
+
+
+def _week_intervals(day_start: int, start: int, end: int) -> List[Interval]:
+    """O intervalo dentro da semana, dividido se passar de domingo para segunda."""
+    start, end = day_start + start, day_start + end
+    if end <= MINUTES_PER_WEEK:
+        return [(start, end)]
+    return [(start, MINUTES_PER_WEEK), (0, end - MINUTES_PER_WEEK)]
+
+
+def _merge(intervals: List[Interval]) -> List[Interval]:
+    merged: List[List[int]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def minute_of_week(moment: datetime) -> int:
+    """Minutos desde segunda-feira 0h; horários com fuso são convertidos
+    para `OPERATING_HOURS_TZ`, os sem fuso já são tomados como locais."""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(OPERATING_HOURS_TZ)
+    return moment.weekday() * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
+
+
+def now() -> datetime:
+    return datetime.now(OPERATING_HOURS_TZ)
+
+
+class OpenHoursIndex:
+    """Slots abertos em cada minuto da semana, como índice de intervalos.
+
+    As bordas de todos os intervalos indexados dividem a semana em faixas
+    em que o conjunto de pontos abertos não muda; cada faixa guarda o bitmap
+    dos slots abertos nela (ver `bitmap.py`). Saber quem está aberto num
+    minuto é uma busca binária nas bordas. `_refs` conta quantos intervalos
+    usam cada borda, para juntar as faixas quando ela deixa de ser usada.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[int, Tuple[Interval, ...]]] = ()):
+        starts: Dict[int, List[int]] = defaultdict(list)
+        ends: Dict[int, List[int]] = defaultdict(list)
+        self._refs: Dict[int, int] = defaultdict(int)
+        for slot, intervals in entries:
+            for start, end in intervals:
+                starts[start].append(slot)
+                ends[end].append(slot)
+                self._refs[start] += 1
+                self._refs[end] += 1
+        # Varredura pelas bordas: os intervalos de um mesmo slot nunca se
+        # tocam, então quem termina numa borda não recomeça nela.
+        self._bounds: List[int] = sorted(
+            {0} | {bound for bound in self._refs if bound < MINUTES_PER_WEEK}
+        )
+        self._bits: List[int] = []
+        current = 0
+        for bound in self._bounds:
+            current &= ~bitmap_from_slots(ends.get(bound, ()))
+            current |= bitmap_from_slots(starts.get(bound, ()))
+            self._bits.append(current)
+
+    def copy(self) -> "OpenHoursIndex":
+        clone = object.__new__(OpenHoursIndex)
+        clone._bounds = list(self._bounds)
+        clone._bits = list(self._bits)
+        clone._refs = defaultdict(int, self._refs)
+        return clone
+
+    def __len__(self) -> int:
+        return len(self._bounds)
+
+    def add(self, slot: int, intervals: Iterable[Interval]) -> None:
+        bit = 1 << slot
+        for start, end in intervals:
+            first, last = self._split(start), self._split(end)
+            for i in range(first, last):
+                self._bits[i] |= bit
+
+    def remove(self, slot: int, intervals: Iterable[Interval]) -> None:
+        bit = 1 << slot
+        for start, end in intervals:
+            first = bisect_left(self._bounds, start)
+            last = bisect_left(self._bounds, end)
+            for i in range(first, last):
+                self._bits[i] &= ~bit
+            self._release(end)
+            self._release(start)
+
+    def open_at(self, minute: int) -> int:
+        """Bitmap dos slots abertos no minuto da semana."""
+        return self._bits[bisect_right(self._bounds, minute) - 1]
+
+    def _split(self, bound: int) -> int:
+        """Garante uma faixa começando em `bound` e devolve a posição dela."""
+        self._refs[bound] += 1
+        i = bisect_left(self._bounds, bound)
+        if bound < MINUTES_PER_WEEK and (
+            i == len(self._bounds) or self._bounds[i] != bound
+        ):
+            self._bounds.insert(i, bound)
+            self._bits.insert(i, self._bits[i - 1])
+        return i
+
+    def _release(self, bound: int) -> None:
+        self._refs[bound] -= 1
+        if self._refs[bound] > 0:
+            return
+        del self._refs[bound]
+        i = bisect_left(self._bounds, bound)
+        if 0 < bound < MINUTES_PER_WEEK:
+            # Sem intervalos começando ou terminando aqui, a faixa é igual à
+            # anterior.
+            del self._bounds[i]
+            del self._bits[i]
@@ -0,0 +1,101 @@
+from typing import Any, Dict, Hashable, Optional, Tuple
+from collections import OrderedDict
+from threading import Lock
+
+_MISSING = object()
+
+VersionOrder = Tuple[str, int]
+Entries = OrderedDict[Hashable, Any]
+
+
+def version_order(version: str) -> VersionOrder:
+    """Versões de repositório são "<origem>-<contador>": da mesma origem, a
+    de contador maior é a mais nova."""
+    origin, _, counter = version.rpartition("-")
+    return origin, int(counter)
+
+
+class VersionedLRUCache:
+    """Cache LRU cujo conteúdo vale para uma única versão dos dados.
+
+    Quem consulta informa a versão atual. Uma versão mais nova que a do cache
+    descarta todas as entradas e passa a ser a do cache; uma mais antiga
+    (um leitor que começou antes da última escrita) não lê nem grava nada,
+    então leitores atrasados nunca apagam o trabalho dos mais novos.
+
+    Leituras e gravações não usam lock: cada operação no `OrderedDict` é
+    atômica sob o GIL, e uma entrada descartada por outra thread no meio do
+    caminho só vira um miss. O lock serve apenas para trocar de versão, o
+    que acontece uma vez por escrita nos dados. Sob concorrência os
+    contadores são aproximados.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        # (ordem da versão, entradas), trocado inteiro a cada nova versão.
+        self._generation: Tuple[Optional[VersionOrder], Entries] = (None, OrderedDict())
+        self._advance_lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, version: str) -> Optional[Any]:
+        entries = self._entries_for(version)
+        value = _MISSING if entries is None else entries.get(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return None
+        try:
+            entries.move_to_end(key)
+        except KeyError:
+            pass
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any, version: str) -> None:
+        if self.max_size <= 0:
+            return
+        entries = self._entries_for(version)
+        if entries is None:
+            return
+        entries[key] = value
+        try:
+            entries.move_to_end(key)
+        except KeyError:
+            pass
+        while len(entries) > self.max_size:
+            try:
+                entries.popitem(last=False)
+            except KeyError:
+                break
+            self.evictions += 1
+
+    def info(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "size": len(self._generation[1]),
+            "max_size": self.max_size,
+        }
+
+    def _entries_for(self, version: str) -> Optional[Entries]:
+        """Entradas da versão, avançando o cache para ela se for mais nova;
+        None se ela é mais antiga que a do cache."""
+        order = version_order(version)
+        current, entries = self._generation
+        if order == current:
+            return entries
+        with self._advance_lock:
+            current, entries = self._generation
+            if order == current:
+                return entries
+            if current is not None and order[0] == current[0] and order < current:
+                return None
+            if entries:
+                self.invalidations += 1
+            fresh: Entries = OrderedDict()
+            self._generation = (order, fresh)
+            return fresh
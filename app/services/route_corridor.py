@@ -0,0 +1,156 @@
+from typing import Callable, List, NamedTuple, Sequence, Tuple
+from math import ceil, cos, radians
+
+import numpy as np
+
+from ..core.geo import EARTH_RADIUS_KM, bounding_box, haversine_km
+from .cluster_index import Box
+
+# Vértices e extensão total aceitos numa rota, e maior distância da rota
+# aceita numa busca. A extensão limita o número de trechos consultados.
+MAX_ROUTE_POINTS = 2000
+MAX_ROUTE_KM = 1000.0
+MAX_BUFFER_KM = 5.0
+# Trechos mais longos que isto são divididos antes da poda: a caixa de um
+# trecho diagonal longo cobriria muito mais área que o corredor em volta dele.
+MAX_PIECE_KM = 1.0
+
+KM_PER_DEGREE = radians(1.0) * EARTH_RADIUS_KM
+
+# Recebe a caixa de um trecho (já com a margem) e devolve (chaves, lats, lngs)
+# dos candidatos dentro dela, vindos de um índice espacial.
+Candidates = Callable[[Box], Tuple[np.ndarray, np.ndarray, np.ndarray]]
+
+
+def decode_polyline(encoded: str, precision: int = 5) -> List[Tuple[float, float]]:
+    """(lat, lng) de uma polilinha no formato Encoded Polyline do Google."""
+    factor = 10**precision
+    coords: List[Tuple[float, float]] = []
+    index, lat, lng = 0, 0, 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                if index >= len(encoded):
+                    raise ValueError("Invalid polyline")
+                byte = ord(encoded[index]) - 63
+                index += 1
+                if not 0 <= byte < 64:
+                    raise ValueError("Invalid polyline")
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        if abs(lat) > 90 * factor or abs(lng) > 180 * factor:
+            raise ValueError("Invalid polyline")
+        coords.append((lat / factor, lng / factor))
+    return coords
+
+
+class RoutePiece(NamedTuple):
+    """Trecho reto da rota e a posição (km desde o início) em que começa."""
+
+    lat0: float
+    lng0: float
+    lat1: float
+    lng1: float
+    start_km: float
+    length_km: float
+
+    def box(self, buffer_km: float) -> Box:
+        first = bounding_box(self.lat0, self.lng0, buffer_km)
+        last = bounding_box(self.lat1, self.lng1, buffer_km)
+        return (
+            min(first[0], last[0]),
+            min(first[1], last[1]),
+            max(first[2], last[2]),
+            max(first[3], last[3]),
+        )
+
+    def locate(
+        self, lats: np.ndarray, lngs: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Distância (km) de cada ponto ao trecho e a posição na rota do ponto
+        do trecho mais próximo dele, numa projeção plana local."""
+        kx = KM_PER_DEGREE * cos(radians((self.lat0 + self.lat1) / 2))
+        bx, by = (self.lng1 - self.lng0) * kx, (self.lat1 - self.lat0) * KM_PER_DEGREE
+        px, py = (lngs - self.lng0) * kx, (lats - self.lat0) * KM_PER_DEGREE
+        span = bx * bx + by * by
+        if span:
+            t = np.clip((px * bx + py * by) / span, 0.0, 1.0)
+        else:
+            t = np.zeros(len(lats))
+        distances = np.hypot(px - t * bx, py - t * by)
+        return distances, self.start_km + t * self.length_km
+
+
+class Route:
+    """Rota como uma sequência de trechos de até `MAX_PIECE_KM`."""
+
+    def __init__(self, points: Sequence[Tuple[float, float]]):
+        if not points:
+            raise ValueError("Route has no points")
+        if len(points) > MAX_ROUTE_POINTS:
+            raise ValueError(f"Route has more than {MAX_ROUTE_POINTS} points")
+        if len(points) == 1:
+            points = [points[0], points[0]]
+        self.pieces: List[RoutePiece] = []
+        position = 0.0
+        for (lat0, lng0), (lat1, lng1) in zip(points, points[1:]):
+            length = haversine_km(lat0, lng0, lat1, lng1)
+            if position + length > MAX_ROUTE_KM:
+                raise ValueError(f"Route is longer than {MAX_ROUTE_KM:g} km")
+            count = max(1, ceil(length / MAX_PIECE_KM))
+            for k in range(count):
+                a, b = k / count, (k + 1) / count
+                self.pieces.append(
+                    RoutePiece(
+                        lat0 + (lat1 - lat0) * a,
+                        lng0 + (lng1 - lng0) * a,
+                        lat0 + (lat1 - lat0) * b,
+                        lng0 + (lng1 - lng0) * b,
+                        position + length * a,
+                        length / count,
+                    )
+                )
+            position += length
+        self.length_km = position
+
+    @classmethod
+    def from_polyline(cls, encoded: str) -> "Route":
+        return cls(decode_polyline(encoded))
+
+    def corridor(
+        self, buffer_km: float, candidates: Candidates
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Chaves a até `buffer_km` da rota, com a distância até ela e a
+        posição na rota do ponto mais próximo, uma vez por chave.
+
+        Cada trecho só testa os candidatos da sua caixa com a margem; a
+        distância exata ao trecho é calculada só para eles.
+        """
+        keys, distances, positions = [], [], []
+        for piece in self.pieces:
+            found, lats, lngs = candidates(piece.box(buffer_km))
+            if not len(found):
+                continue
+            piece_distances, piece_positions = piece.locate(lats, lngs)
+            inside = piece_distances <= buffer_km
+            keys.append(found[inside])
+            distances.append(piece_distances[inside])
+            positions.append(piece_positions[inside])
+        if not keys:
+            empty = np.empty(0)
+            return np.empty(0, dtype=np.int64), empty, empty
+        keys = np.concatenate(keys)
+        distances = np.concatenate(distances)
+        positions = np.concatenate(positions)
+        # Uma chave vista por vários trechos fica com o mais próximo.
+        order = np.lexsort((positions, distances, keys))
+        _, first = np.unique(keys[order], return_index=True)
+        chosen = order[first]
+        return keys[chosen], distances[chosen], positions[chosen]
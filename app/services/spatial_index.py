@@ -0,0 +1,114 @@
+from typing import Hashable, Iterator, Optional, Set, Tuple
+from math import floor
+
+from ..core.geo import bounding_box, haversine_km
+from .chunked import ChunkedDict
+
+Cell = Tuple[int, int]
+Key = Hashable
+
+
+class GridIndex:
+    """Grade uniforme de lat/lng: cada célula guarda as chaves dos pontos nela.
+
+    `_cells` (célula -> chaves) e `_cell_of` (chave -> célula) são
+    `ChunkedDict`s (ver `chunked.py`), então `copy` não percorre as chaves.
+    """
+
+    def __init__(self, cell_size_deg: float = 0.05):
+        self.cell_size_deg = cell_size_deg
+        self._cells = ChunkedDict()
+        self._cell_of = ChunkedDict()
+        # Células cujo conjunto pertence só a esta grade; as demais podem estar
+        # compartilhadas com cópias e são duplicadas antes de qualquer escrita.
+        # None: nenhuma cópia foi feita, todas são próprias.
+        self._owned: Optional[Set[Cell]] = None
+
+    def __len__(self) -> int:
+        return len(self._cell_of)
+
+    def copy(self) -> "GridIndex":
+        """Cópia que compartilha os conjuntos das células até alguém alterá-los."""
+        clone = GridIndex(self.cell_size_deg)
+        clone._cells = self._cells.copy()
+        clone._cell_of = self._cell_of.copy()
+        clone._owned = set()
+        self._owned = set()
+        return clone
+
+    def cell_for(self, lat: float, lng: float) -> Cell:
+        return (
+            floor(lat / self.cell_size_deg),
+            floor(lng / self.cell_size_deg),
+        )
+
+    def insert(self, key: Key, lat: float, lng: float) -> None:
+        cell = self.cell_for(lat, lng)
+        current = self._cell_of.get(key)
+        if current == cell:
+            return
+        if current is not None:
+            self.remove(key)
+        self._writable(cell).add(key)
+        self._cell_of[key] = cell
+
+    def remove(self, key: Key) -> None:
+        cell = self._cell_of.pop(key, None)
+        if cell is None:
+            return
+        keys = self._writable(cell)
+        keys.discard(key)
+        if not keys:
+            del self._cells[cell]
+
+    def _writable(self, cell: Cell) -> Set[Key]:
+        if self._owned is None:
+            return self._cells.setdefault(cell, set())
+        if cell not in self._owned:
+            self._cells[cell] = set(self._cells.get(cell, ()))
+            self._owned.add(cell)
+        return self._cells[cell]
+
+    def keys_in(self, cell: Cell) -> Set[Key]:
+        return self._cells.get(cell, set())
+
+    def cells_in_radius(
+        self, lat: float, lng: float, radius_km: float
+    ) -> Iterator[Cell]:
+        """Células ocupadas que intersectam o círculo de busca."""
+        min_lat, min_lng, max_lat, max_lng = bounding_box(lat, lng, radius_km)
+        if min_lng < -180.0 or max_lng > 180.0:
+            # O círculo cruza o antimeridiano: sem poda por longitude.
+            yield from list(self._cells)
+            return
+
+        i0, j0 = self.cell_for(min_lat, min_lng)
+        i1, j1 = self.cell_for(max_lat, max_lng)
+        span = (i1 - i0 + 1) * (j1 - j0 + 1)
+
+        if span > len(self._cells):
+            candidates = [
+                (i, j) for (i, j) in self._cells if i0 <= i <= i1 and j0 <= j <= j1
+            ]
+        else:
+            candidates = [
+                (i, j)
+                for i in range(i0, i1 + 1)
+                for j in range(j0, j1 + 1)
+                if (i, j) in self._cells
+            ]
+
+        for cell in candidates:
+            if self._min_distance_km(cell, lat, lng) <= radius_km:
+                yield cell
+
+    def query_radius(self, lat: float, lng: float, radius_km: float) -> Iterator[Key]:
+        """Chaves candidatas; a distância exata fica a cargo de quem chama."""
+        for cell in self.cells_in_radius(lat, lng, radius_km):
+            yield from self._cells[cell]
+
+    def _min_distance_km(self, cell: Cell, lat: float, lng: float) -> float:
+        size = self.cell_size_deg
+        cell_lat = min(max(lat, cell[0] * size), (cell[0] + 1) * size)
+        cell_lng = min(max(lng, cell[1] * size), (cell[1] + 1) * size)
+        return haversine_km(lat, lng, cell_lat, cell_lng)
@@ -0,0 +1,198 @@
+from typing import Dict, Iterable, List, NamedTuple, Set, Tuple
+from itertools import islice, takewhile
+
+from .chunked import ChunkedDict, ChunkedSortedList
+from .text_index import fold
+
+# Campos cujos valores viram sugestões de autocomplete, com o tipo devolvido.
+TERM_FIELDS = (
+    ("name", "name"),
+    ("street", "street"),
+    ("neighborhood", "neighborhood"),
+)
+MATERIAL_KIND = "material"
+
+# Prefixos com até esta quantidade de entradas são ranqueados varrendo as
+# entradas em ordem de chave; os mais comuns (prefixos curtos, como uma letra)
+# percorrem as entradas da inicial já na ordem do ranking, até juntar `limit`.
+MAX_SCANNED_TERMS = 256
+
+# Maior que qualquer caractere de um texto normalizado por `fold`.
+PREFIX_END = "\x7f"
+
+Term = Tuple[str, str]
+
+
+class Suggestion(NamedTuple):
+    """Sugestão de autocomplete: o texto, de que campo ele vem e quantos
+    pontos ativos o têm."""
+
+    text: str
+    kind: str
+    count: int
+
+
+def point_terms(point) -> Set[Term]:
+    """(tipo, texto) sugeridos por um ponto; pontos inativos não sugerem nada."""
+    if not point.is_active:
+        return set()
+    terms = {(kind, getattr(point, field)) for field, kind in TERM_FIELDS}
+    terms.update((MATERIAL_KIND, material) for material in point.materials)
+    return {(kind, text) for kind, text in terms if text}
+
+
+def term_keys(text: str) -> List[str]:
+    """Chaves de busca de um texto: o texto normalizado a partir de cada palavra.
+
+    "Lagoa da Conceição" é achado por "lag", "da c" e "conc"; a posição da
+    palavra na lista é usada para preferir quem começa com o prefixo.
+    """
+    words = fold(text).split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+def rank(matches: Iterable[Tuple[str, str, int, int]], limit: int) -> List[Suggestion]:
+    """As `limit` melhores de (texto, tipo, posição, contagem).
+
+    Vem primeiro quem começa com o prefixo, depois os mais frequentes.
+    """
+    best: Dict[Term, Tuple[int, int]] = {}
+    for text, kind, position, count in matches:
+        term = (kind, text)
+        if term not in best or position < best[term][0]:
+            best[term] = (position, count)
+    ordered = sorted(
+        best.items(),
+        key=lambda item: (item[1][0] > 0, -item[1][1], item[0][1], item[0][0]),
+    )
+    return [
+        Suggestion(text, kind, count) for (kind, text), (_, count) in ordered[:limit]
+    ]
+
+
+class TermIndex:
+    """Índice de prefixos para autocomplete, num array ordenado de chaves.
+
+    Cada termo distinto (tipo, texto) contribui uma entrada (chave, tipo,
+    texto, posição) por palavra, em `_entries` ordenada; uma busca por
+    prefixo é uma busca binária seguida de uma varredura curta. `_ranked`
+    tem as mesmas entradas agrupadas pela inicial da chave e, dentro dela, na
+    ordem do ranking (ver `rank`), para os prefixos com entradas demais para
+    varrer. `_counts` conta os pontos ativos com cada termo: as entradas
+    existem enquanto a contagem for positiva. Os três são contêineres por
+    pedaços (ver `chunked.py`), compartilhados entre cópias até serem
+    alterados.
+    """
+
+    def __init__(self, terms: Iterable[Term] = ()):
+        counts: Dict[Term, int] = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        self._counts = ChunkedDict(counts.items())
+        self._entries = ChunkedSortedList(
+            entry for term in counts for entry in term_entries(term)
+        )
+        self._ranked = ChunkedSortedList(
+            entry
+            for term, count in counts.items()
+            for entry in ranked_entries(term, count)
+        )
+
+    def copy(self) -> "TermIndex":
+        clone = object.__new__(TermIndex)
+        clone._counts = self._counts.copy()
+        clone._entries = self._entries.copy()
+        clone._ranked = self._ranked.copy()
+        return clone
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def add(self, terms: Iterable[Term]) -> None:
+        for term in terms:
+            count = self._counts.get(term, 0)
+            self._counts[term] = count + 1
+            if count:
+                self._rerank(term, count, count + 1)
+                continue
+            for entry in term_entries(term):
+                self._entries.add(entry)
+            for entry in ranked_entries(term, 1):
+                self._ranked.add(entry)
+
+    def remove(self, terms: Iterable[Term]) -> None:
+        for term in terms:
+            count = self._counts.get(term, 0)
+            if count > 1:
+                self._counts[term] = count - 1
+                self._rerank(term, count, count - 1)
+                continue
+            if not count:
+                continue
+            del self._counts[term]
+            for entry in term_entries(term):
+                self._entries.remove(entry)
+            for entry in ranked_entries(term, 1):
+                self._ranked.remove(entry)
+
+    def _rerank(self, term: Term, old: int, new: int) -> None:
+        for entry in ranked_entries(term, old):
+            self._ranked.remove(entry)
+        for entry in ranked_entries(term, new):
+            self._ranked.add(entry)
+
+    def suggest(self, prefix: str, limit: int) -> List[Suggestion]:
+        prefix = fold(prefix)
+        if not prefix:
+            return []
+        end = (prefix + PREFIX_END,)
+        scanned = list(
+            takewhile(
+                lambda entry: entry < end,
+                islice(self._entries.iter_from((prefix,)), MAX_SCANNED_TERMS + 1),
+            )
+        )
+        if len(scanned) > MAX_SCANNED_TERMS:
+            return self._suggest_ranked(prefix, limit)
+        counts = self._counts
+        return rank(
+            (
+                (text, kind, position, counts[(kind, text)])
+                for _, kind, text, position in scanned
+            ),
+            limit,
+        )
+
+    def _suggest_ranked(self, prefix: str, limit: int) -> List[Suggestion]:
+        """Mesmo resultado de `rank` sobre todas as entradas do prefixo.
+
+        As entradas da inicial vêm na ordem do ranking: a primeira de cada
+        termo que casa com o prefixo é a sua melhor, e a busca para ao juntar
+        `limit` termos.
+        """
+        found: Dict[Term, Suggestion] = {}
+        initial = prefix[0]
+        for key_initial, _, count, text, kind, key in self._ranked.iter_from(
+            (initial,)
+        ):
+            if key_initial != initial or len(found) >= limit:
+                break
+            if key.startswith(prefix) and (kind, text) not in found:
+                found[(kind, text)] = Suggestion(text, kind, -count)
+        return list(found.values())
+
+
+def term_entries(term: Term) -> List[Tuple[str, str, str, int]]:
+    kind, text = term
+    return [(key, kind, text, i) for i, key in enumerate(term_keys(text))]
+
+
+def ranked_entries(
+    term: Term, count: int
+) -> List[Tuple[str, bool, int, str, str, str]]:
+    """Entradas de `_ranked`: (inicial, fora do começo, -contagem, texto, tipo, chave)."""
+    kind, text = term
+    return [
+        (key[0], i > 0, -count, text, kind, key)
+        for i, key in enumerate(term_keys(text))
+    ]
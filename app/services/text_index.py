@@ -0,0 +1,192 @@
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+import re
+import unicodedata
+from collections import defaultdict
+from functools import lru_cache, reduce
+from operator import and_
+
+import numpy as np
+
+from .bitmap import bitmap_from_slots, bitmap_to_mask, slots_from_bitmap
+from .chunked import ChunkedDict
+
+# Campos pesquisados pelo filtro `search` e o peso de cada um na relevância.
+SEARCH_FIELDS = ("name", "neighborhood", "street", "description")
+FIELD_WEIGHTS = (4.0, 2.0, 2.0, 1.0)
+
+# Listas de slots de um trigrama com mais itens que isto são guardadas como
+# bitmap: num bitmap de N slots, trocar um slot custa N/8 bytes, contra 8
+# bytes por item numa lista ordenada.
+DENSE_POSTING = 4096
+
+# Separa os campos em `search_key`; nunca aparece num texto normalizado.
+SEARCH_KEY_SEPARATOR = "\x1f"
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+# Bairros, ruas e descrições se repetem muito entre pontos: os caches evitam
+# normalizar e quebrar em trigramas o mesmo texto de novo.
+@lru_cache(maxsize=8192)
+def fold(text: str) -> str:
+    """Minúsculas, sem acentos e com só letras e dígitos separados por espaço.
+
+    "Lagoa da Conceição" e "lagoa  da conceicao" dão o mesmo texto.
+    """
+    text = text.casefold()
+    if not text.isascii():
+        # Sem os acentos decompostos; o que mais não for ASCII também não
+        # sobreviveria à expressão abaixo.
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    return _NON_WORD.sub(" ", text).strip()
+
+
+@lru_cache(maxsize=1024)
+def query_tokens(query: str) -> Tuple[str, ...]:
+    """Palavras distintas da busca, normalizadas por `fold`."""
+    return tuple(dict.fromkeys(fold(query).split()))
+
+
+@lru_cache(maxsize=8192)
+def trigrams(text: str) -> FrozenSet[str]:
+    """Trigramas de cada palavra de um texto já normalizado."""
+    return frozenset(
+        word[i : i + 3] for word in text.split() for i in range(len(word) - 2)
+    )
+
+
+def search_fields(point) -> Tuple[str, ...]:
+    """Os campos pesquisáveis do ponto, normalizados, na ordem de `SEARCH_FIELDS`."""
+    return tuple(fold(getattr(point, field)) for field in SEARCH_FIELDS)
+
+
+def search_key(point) -> str:
+    return SEARCH_KEY_SEPARATOR.join(search_fields(point))
+
+
+def relevance(fields: Sequence[str], tokens: Sequence[str]) -> float:
+    """Relevância do ponto para a busca; 0 se alguma palavra não aparece.
+
+    Cada palavra da busca vale o peso do melhor campo em que aparece, em
+    dobro se for uma palavra inteira do campo e 1,5x se for o início de uma.
+    """
+    score = 0.0
+    for token in tokens:
+        best = 0.0
+        for text, weight in zip(fields, FIELD_WEIGHTS):
+            if token not in text:
+                continue
+            words = text.split()
+            if token in words:
+                weight *= 2.0
+            elif any(word.startswith(token) for word in words):
+                weight *= 1.5
+            best = max(best, weight)
+        if not best:
+            return 0.0
+        score += best
+    return score
+
+
+def search_key_relevance(key: str, query: str) -> float:
+    """`relevance` a partir de um `search_key` (usada como função no SQLite)."""
+    return relevance(key.split(SEARCH_KEY_SEPARATOR), query_tokens(query))
+
+
+class TrigramIndex:
+    """Índice invertido trigrama -> slots, sobre os campos de `SEARCH_FIELDS`.
+
+    Cada lista de slots nunca é alterada no lugar: mudanças trocam a lista
+    do trigrama, e o dicionário é um `ChunkedDict` (ver `chunked.py`), então
+    `copy` não duplica nenhum dos dois. Listas curtas são arrays numpy
+    ordenados; as que passam de `DENSE_POSTING` slots viram bitmaps (ver
+    `bitmap.py`), em que incluir ou tirar um slot não desloca os demais.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[int, Set[str]]] = ()):
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for slot, grams in entries:
+            for gram in grams:
+                postings[gram].append(slot)
+        self._postings = ChunkedDict(
+            (
+                gram,
+                (
+                    bitmap_from_slots(slots)
+                    if len(slots) > DENSE_POSTING
+                    else np.sort(np.array(slots, dtype=np.int64))
+                ),
+            )
+            for gram, slots in postings.items()
+        )
+
+    def copy(self) -> "TrigramIndex":
+        clone = object.__new__(TrigramIndex)
+        clone._postings = self._postings.copy()
+        return clone
+
+    def __len__(self) -> int:
+        return len(self._postings)
+
+    def add(self, slot: int, grams: Iterable[str]) -> None:
+        for gram in grams:
+            slots = self._postings.get(gram)
+            if slots is None:
+                self._postings[gram] = np.array([slot], dtype=np.int64)
+            elif isinstance(slots, int):
+                self._postings[gram] = slots | (1 << slot)
+            else:
+                at = np.searchsorted(slots, slot)
+                if at < len(slots) and slots[at] == slot:
+                    continue
+                if len(slots) >= DENSE_POSTING:
+                    self._postings[gram] = bitmap_from_slots(slots) | (1 << slot)
+                else:
+                    self._postings[gram] = np.insert(slots, at, slot)
+
+    def remove(self, slot: int, grams: Iterable[str]) -> None:
+        for gram in grams:
+            slots = self._postings.get(gram)
+            if slots is None:
+                continue
+            if isinstance(slots, int):
+                remaining = slots & ~(1 << slot)
+                empty = not remaining
+            else:
+                at = np.searchsorted(slots, slot)
+                if at == len(slots) or slots[at] != slot:
+                    continue
+                remaining = np.delete(slots, at)
+                empty = not len(remaining)
+            if empty:
+                del self._postings[gram]
+            else:
+                self._postings[gram] = remaining
+
+    def candidates(self, tokens: Sequence[str]) -> Optional[np.ndarray]:
+        """Slots que contêm todos os trigramas das palavras da busca, ordenados.
+
+        None quando nenhuma palavra tem 3 letras ou mais: aí o índice não
+        restringe nada e quem chama precisa verificar todos os slots.
+        """
+        grams = set().union(*(trigrams(token) for token in tokens))
+        if not grams:
+            return None
+        arrays, bitmaps = [], []
+        for gram in grams:
+            slots = self._postings.get(gram)
+            if slots is None:
+                return np.empty(0, dtype=np.int64)
+            (bitmaps if isinstance(slots, int) else arrays).append(slots)
+        bits = reduce(and_, bitmaps) if bitmaps else None
+        if not arrays:
+            return slots_from_bitmap(bits)
+        arrays.sort(key=len)
+        result = arrays[0]
+        for slots in arrays[1:]:
+            result = np.intersect1d(result, slots, assume_unique=True)
+            if not len(result):
+                return result
+        if bits is not None:
+            result = result[bitmap_to_mask(bits, int(result[-1]) + 1)[result]]
+        return result
@@ -0,0 +1,93 @@
+"""
+Benchmark de memória - bytes por ponto de coleta em cada representação
+
+Compara a lista de modelos pydantic `CollectionPoint` (como os pontos eram
+guardados antes) com os registros `CompactCollectionPoint` + `StringPool`
+usados hoje pelo `CollectionPointsStore`.
+
+Uso (a partir da raiz do projeto):
+    python -m scripts.benchmark_memory --sizes 100000 1000000
+"""
+
+import argparse
+import gc
+import json
+import random
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+
+from app.data.mock_collection_points import MOCK_COLLECTION_POINTS
+from app.models.collection_point import CollectionPoint
+from app.services.compact_point import CompactCollectionPoint, StringPool
+
+
+def generate_points(count, seed=42):
+    """Gera `count` pontos como linhas JSON, imitando dados vindos de fora.
+
+    Cada ponto é decodificado de sua própria linha, então nenhuma string é
+    compartilhada por acaso entre pontos (como acontece numa importação real).
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc).isoformat()
+    for i in range(count):
+        base = MOCK_COLLECTION_POINTS[i % len(MOCK_COLLECTION_POINTS)]
+        point = {
+            **base,
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "name": f"{base['name']} {i}",
+            "number": str(rng.randint(1, 9999)),
+            "lat": base["lat"] + rng.uniform(-0.05, 0.05),
+            "lng": base["lng"] + rng.uniform(-0.05, 0.05),
+            "created_at": now,
+            "updated_at": now,
+        }
+        yield json.dumps(point)
+
+
+def measure(build, count):
+    """Bytes alocados (e ainda vivos) pela estrutura montada por `build`."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        structure = build(generate_points(count))
+        gc.collect()
+        used, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del structure
+    return used
+
+
+def build_models(lines):
+    return [CollectionPoint.model_validate_json(line) for line in lines]
+
+
+def build_compact(lines):
+    pool = StringPool()
+    records = [
+        CompactCollectionPoint.from_point(
+            CollectionPoint.model_validate_json(line), pool
+        )
+        for line in lines
+    ]
+    return records, pool
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'pontos':>10} {'pydantic B/pt':>14} {'compacto B/pt':>14} {'redução':>8}")
+    for count in args.sizes:
+        models = measure(build_models, count) / count
+        compact = measure(build_compact, count) / count
+        print(
+            f"{count:>10} {models:>14.0f} {compact:>14.0f} "
+            f"{1 - compact / models:>8.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
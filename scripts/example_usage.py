@@ -2,8 +2,8 @@
 Example usage of the collection points structure
 """
 
+from app.models.collection_point import CollectionPointFilters
 from app.services.collection_points_service import collection_points_service
-from app.data.mock_collection_points import AVAILABLE_MATERIALS, AVAILABLE_NEIGHBORHOODS
 
 
 def example_usage():
@@ -62,8 +62,9 @@ def example_usage():
     
     # 7. Available materials and neighborhoods
     print("7. Available options:")
-    print(f"   Materials: {AVAILABLE_MATERIALS}")
-    print(f"   Neighborhoods: {AVAILABLE_NEIGHBORHOODS}")
+    facets = collection_points_service.get_facets(CollectionPointFilters())
+    print(f"   Materials: {sorted(facets['materials'])}")
+    print(f"   Neighborhoods: {sorted(facets['neighborhoods'])}")
 
 
 if __name__ == "__main__":
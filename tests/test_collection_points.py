@@ -0,0 +1,1947 @@
+import sys
+import os
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+from app.main import app
+from app.api.v1.endpoints.collection_points import (
+    router as collection_points_router,
+    stream_collection_point_changes,
+)
+from app.core.config import settings
+from app.core.geo import haversine_km
+from app.models.collection_point import (
+    CollectionPointCreate,
+    CollectionPointsChangeFilters,
+    CollectionPointFilters,
+    CollectionPointUpdate,
+)
+from app.services.collection_points_service import collection_points_service
+from app.services.spatial_index import GridIndex
+from app.services import chunked, collection_points_store, text_index
+from app.services.chunked import ChunkedArray, ChunkedDict, ChunkedSortedList
+from app.services.collection_points_store import CollectionPointsStore
+from app.services.query_cache import VersionedLRUCache
+from app.models.collection_point import CollectionPoint
+from app.repositories import (
+    ChangeLog,
+    InMemoryCollectionPointsRepository,
+    SharedCollectionPointsRepository,
+    SQLiteCollectionPointsRepository,
+)
+from app.services.collection_points_service import CollectionPointsService
+from app.services.change_feed import RESYNC_EVENT, ChangeFeed
+from app.services.bulk_import import ImportTooLarge, read_import
+from app.services.cep_geocoder import CepGeocoder, cep_geocoder
+from app.services.operating_hours import (
+    MINUTES_PER_DAY,
+    OpenHoursIndex,
+    minute_of_week,
+    parse_operating_hours,
+)
+from app.services.route_corridor import Route, decode_polyline
+from app.services.term_index import MAX_SCANNED_TERMS
+from app.services.text_index import TrigramIndex, fold, query_tokens, trigrams
+
+client = TestClient(app)
+
+NEW_POINT = {
+    "name": "Ponto Teste Proximidade",
+    "cep": "88010-000",
+    "city": "Florianópolis",
+    "neighborhood": "Ingleses",
+    "street": "Rua das Gaivotas",
+    "number": "10",
+    "lat": -27.4350,
+    "lng": -48.3980,
+    "materials": ["Vidro"],
+}
+
+
+def test_grid_index_matches_brute_force():
+    grid = GridIndex(cell_size_deg=0.02)
+    points = {
+        str(i): (-27.70 + (i % 20) * 0.013, -48.60 + (i // 20) * 0.011)
+        for i in range(400)
+    }
+    for key, (lat, lng) in points.items():
+        grid.insert(key, lat, lng)
+
+    center, radius = (-27.60, -48.50), 3.0
+    expected = {
+        key
+        for key, (lat, lng) in points.items()
+        if haversine_km(center[0], center[1], lat, lng) <= radius
+    }
+    candidates = set(grid.query_radius(center[0], center[1], radius))
+    assert expected <= candidates
+    assert len(candidates) < len(points)
+
+
+def test_store_within_radius_matches_brute_force():
+    points = [
+        CollectionPoint(
+            id=str(i),
+            **{
+                **NEW_POINT,
+                "lat": -28.5 + (i % 40) * 0.05,
+                "lng": -49.5 + (i // 40) * 0.05,
+            },
+        )
+        for i in range(1200)
+    ]
+    store = CollectionPointsStore(points, cell_size_deg=0.05)
+    for point in points[::3]:
+        store.remove(point.id)
+    store.add(CollectionPoint(id="novo", **{**NEW_POINT, "lat": -27.6, "lng": -48.55}))
+
+    for radius in (2.0, 10.0, 80.0):
+        slots, distances = store.within_radius(-27.6, -48.55, radius)
+        found = dict(zip(store.ids_for(slots), distances.tolist()))
+        expected = {
+            p.id: haversine_km(-27.6, -48.55, p.lat, p.lng)
+            for p in store.points.values()
+            if haversine_km(-27.6, -48.55, p.lat, p.lng) <= radius
+        }
+        assert found.keys() == expected.keys()
+        assert all(abs(found[k] - expected[k]) < 1e-9 for k in found)
+
+
+def test_compact_records_round_trip_and_share_values():
+    points = [
+        CollectionPoint.model_validate_json(
+            CollectionPoint(
+                id=str(i), **NEW_POINT, is_active=i % 2 == 0
+            ).model_dump_json()
+        )
+        for i in range(3)
+    ]
+    store = CollectionPointsStore(points)
+    records = [store.get(p.id) for p in points]
+    assert [record.to_model() for record in records] == points
+    assert not hasattr(records[0], "__dict__")
+    assert records[0].city is records[1].city is records[2].city
+    assert records[0].materials is records[1].materials
+
+
+def test_attribute_bitmaps_follow_updates():
+    materials = ["Vidro", "Papel", "Metal", "Pilhas"]
+    points = [
+        CollectionPoint(
+            id=str(i),
+            **{
+                **NEW_POINT,
+                "city": ["Florianópolis", "São José"][i % 2],
+                "neighborhood": ["Centro", "Trindade", "Campinas"][i % 3],
+                "materials": materials[: 1 + i % 4],
+                "accepts_all_materials": i % 5 == 0,
+            },
+            is_active=i % 7 != 0,
+        )
+        for i in range(200)
+    ]
+    store = CollectionPointsStore(points)
+    store.remove("3")
+    changed = (
+        store.get("4")
+        .to_model()
+        .model_copy(
+            update={"city": "Palhoça", "materials": ["Pilhas"], "is_active": False}
+        )
+    )
+    store.update(changed)
+
+    for filters in (
+        CollectionPointFilters(city="florianópolis", material="Metal"),
+        CollectionPointFilters(neighborhood="CENTRO", accepts_all_materials=False),
+        CollectionPointFilters(material="Pilhas", is_active=None),
+        CollectionPointFilters(city="Palhoça", is_active=False),
+        CollectionPointFilters(material="Inexistente"),
+    ):
+        expected = {
+            p.id
+            for p in store.points.values()
+            if (filters.is_active is None or p.is_active == filters.is_active)
+            and (not filters.city or p.city.lower() == filters.city.lower())
+            and (
+                not filters.neighborhood
+                or p.neighborhood.lower() == filters.neighborhood.lower()
+            )
+            and (not filters.material or filters.material in p.materials)
+            and (
+                filters.accepts_all_materials is None
+                or p.accepts_all_materials == filters.accepts_all_materials
+            )
+        }
+        found = set(store.ids_for(store.slots_in(store.filter_bitmap(filters))))
+        assert found == expected
+
+
+def _synthetic_points(count):
+    return [
+        CollectionPoint(
+            id=f"s{i:04d}",
+            **{
+                **NEW_POINT,
+                "neighborhood": ("Centro", "Trindade")[i % 2],
+                "lat": -27.70 + (i % 20) * 0.01,
+                "lng": -48.60 + (i // 20) * 0.01,
+            },
+        )
+        for i in range(count)
+    ]
+
+
+def test_writes_never_touch_published_snapshots():
+    repository = InMemoryCollectionPointsRepository(_synthetic_points(300))
+    snapshot = repository.store
+    everything = snapshot.filter_bitmap(CollectionPointFilters(is_active=None))
+    ids_before = list(snapshot.ids_in_order(everything))
+    slots, _ = snapshot.within_radius(-27.6, -48.55, 3.0)
+    nearby_before = sorted(snapshot.ids_for(slots))
+    statistics_before = snapshot.statistics()
+
+    moved = repository.get("s0005").model_copy(update={"lat": -27.3, "lng": -48.3})
+    repository.update(moved)
+    repository.add(
+        CollectionPoint(id="novo", **{**NEW_POINT, "lat": -27.6, "lng": -48.55})
+    )
+    repository.remove("s0010")
+    repository.apply_batch(
+        upserts=[moved.model_copy(update={"is_active": False})], removed_ids=["s0011"]
+    )
+
+    assert list(snapshot.ids_in_order(everything)) == ids_before
+    slots, _ = snapshot.within_radius(-27.6, -48.55, 3.0)
+    assert sorted(snapshot.ids_for(slots)) == nearby_before
+    assert snapshot.statistics() == statistics_before == snapshot.scan_statistics()
+    assert repository.store is not snapshot
+    assert repository.store.statistics() == repository.store.scan_statistics()
+    assert "novo" in repository.store and "s0010" not in repository.store
+
+
+def test_chunked_containers_copy_on_write(monkeypatch):
+    monkeypatch.setattr(chunked, "LIST_LOAD", 4)
+    mapping = ChunkedDict((str(i), i) for i in range(1000))
+    array = ChunkedArray(np.nan, np.float64)
+    for _ in range(3):
+        array.grow()
+    array[5], array[2500] = 1.0, 2.0
+    ordered = ChunkedSortedList(range(0, 100, 2))
+    reference = list(range(0, 100, 2))
+
+    copies = (mapping.copy(), array.copy(), ordered.copy())
+    mapping_copy, array_copy, ordered_copy = copies
+    mapping_copy["0"] = -1
+    del mapping_copy["1"]
+    assert mapping_copy.pop("missing", None) is None
+    array_copy[5] = 3.0
+    for value in (1, 51, 99, 101, -1, 7, 7, 8, 9, 11, 13):
+        ordered_copy.add(value)
+        reference.append(value)
+    for value in (0, 50, 7, 98):
+        ordered_copy.remove(value)
+        reference.remove(value)
+    reference.sort()
+
+    assert (mapping["0"], len(mapping), "1" in mapping) == (0, 1000, True)
+    assert (mapping_copy["0"], len(mapping_copy), "1" in mapping_copy) == (
+        -1,
+        999,
+        False,
+    )
+    assert sorted(mapping_copy.values()) == [-1] + list(range(2, 1000))
+    shared = sum(a is b for a, b in zip(mapping._shards, mapping_copy._shards))
+    assert shared >= chunked.DICT_SHARDS - 2
+
+    assert array[5] == 1.0 and array_copy[5] == 3.0
+    assert array._chunks[1] is array_copy._chunks[1]
+    slots = np.array([2500, 5, 7, 1030])
+    assert array_copy.take(slots)[:2].tolist() == [2.0, 3.0]
+    assert np.isnan(array_copy.take(slots)[2:]).all()
+    assert array_copy.prefix(6).tolist()[5] == 3.0
+
+    assert list(ordered) == list(range(0, 100, 2))
+    assert list(ordered_copy) == reference and len(ordered_copy) == len(reference)
+    assert list(ordered_copy.iter_from(50)) == [v for v in reference if v >= 50]
+    assert list(ordered_copy.iter_from(9, inclusive=False)) == [
+        v for v in reference if v > 9
+    ]
+    assert list(ordered_copy.iter_from(1000)) == []
+
+
+def test_trigram_index_dense_postings_match_brute_force(monkeypatch):
+    monkeypatch.setattr(text_index, "DENSE_POSTING", 3)
+    texts = {
+        slot: fold(text)
+        for slot, text in enumerate(
+            ["Rua das Flores", "Rua da Lagoa", "Lagoa Azul", "Rua Floresta"] * 3
+        )
+    }
+    index = TrigramIndex((slot, trigrams(text)) for slot, text in texts.items())
+    index.remove(4, trigrams(texts.pop(4)))
+    index.remove(1, trigrams(texts.pop(1)))
+    texts[20] = "rua lagoa"
+    index.add(20, trigrams(texts[20]))
+    assert any(isinstance(p, int) for p in index._postings.values())
+
+    for query in ("rua", "lagoa", "rua flor", "azul", "rua lagoa", "xyz"):
+        tokens = query_tokens(query)
+        expected = [
+            slot
+            for slot, text in sorted(texts.items())
+            if all(trigrams(token) <= trigrams(text) for token in tokens)
+        ]
+        assert index.candidates(tokens).tolist() == expected, query
+
+
+def _compact_points(count):
+    # Sem validação do pydantic: monta stores grandes em fração do tempo.
+    template = _synthetic_points(1)[0].model_dump()
+    return [
+        CollectionPoint.model_construct(
+            **{
+                **template,
+                "id": f"s{i:05d}",
+                "neighborhood": ("Centro", "Trindade")[i % 2],
+                "lat": -27.70 + (i % 20) * 0.01,
+                "lng": -48.60 + (i // 20) * 0.01,
+            }
+        )
+        for i in range(count)
+    ]
+
+
+def _median_write_seconds(repository, rounds=21, start=0):
+    template = _synthetic_points(1)[0].model_dump()
+    timings = []
+    for i in range(start, start + rounds):
+        point = CollectionPoint(**{**template, "id": f"novo{i}", "name": f"Novo {i}"})
+        started = time.perf_counter()
+        repository.add(point)
+        repository.update(point.model_copy(update={"lat": -27.5}))
+        repository.remove(f"s{i:05d}")
+        timings.append(time.perf_counter() - started)
+    return sorted(timings)[rounds // 2]
+
+
+def test_single_writes_stay_fast_on_large_stores():
+    small = InMemoryCollectionPointsRepository(_compact_points(1_000))
+    large = InMemoryCollectionPointsRepository(_compact_points(20_000))
+    before = large.store
+    _median_write_seconds(small, rounds=3, start=100)
+    small_median = _median_write_seconds(small)
+    large_median = _median_write_seconds(large)
+    # Cópia por pedaços: com 20x mais pontos a escrita não fica 20x mais
+    # lenta (uma cópia inteira do store ficaria).
+    assert large_median <= 4 * small_median
+    shared = sum(
+        a is b for a, b in zip(before.points._shards, large.store.points._shards)
+    )
+    assert shared > chunked.DICT_SHARDS // 2
+    assert len(large.store) == 20_000
+    assert small.get("s00000") is None and large.get("s00000") is None
+    assert large.store.statistics() == large.store.scan_statistics()
+
+
+def test_concurrent_readers_never_see_half_applied_batches():
+    service = CollectionPointsService(
+        InMemoryCollectionPointsRepository(_synthetic_points(400))
+    )
+    group = [f"s{i:04d}" for i in range(0, 40, 2)]
+    stop = threading.Event()
+    seen = set()
+
+    def read():
+        while not stop.is_set():
+            filters = CollectionPointFilters(neighborhood="Lagoa")
+            seen.add(len(list(service._repository.iter_matching(filters))))
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    for reader in readers:
+        reader.start()
+    try:
+        for round_ in range(100):
+            service.bulk_update_collection_points(
+                CollectionPointUpdate(neighborhood=("Lagoa", "Centro")[round_ % 2]),
+                ids=group,
+            )
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+    assert seen <= {0, len(group)}
+
+
+def test_proximity_search_follows_crud():
+    response = client.post("/api/v1/collection_points/", json=NEW_POINT)
+    assert response.status_code == 200
+    point_id = response.json()["data"]["id"]
+
+    params = {"lat": -27.4351, "lng": -48.3981, "radius_km": 1}
+    ids = [
+        p["id"]
+        for p in client.get("/api/v1/collection_points/", params=params).json()["data"]
+    ]
+    assert ids == [point_id]
+
+    client.put(
+        f"/api/v1/collection_points/{point_id}", json={"lat": -27.70, "lng": -48.50}
+    )
+    ids = [
+        p["id"]
+        for p in client.get("/api/v1/collection_points/", params=params).json()["data"]
+    ]
+    assert point_id not in ids
+    moved = {"lat": -27.70, "lng": -48.50, "radius_km": 0.5}
+    ids = [
+        p["id"]
+        for p in client.get("/api/v1/collection_points/", params=moved).json()["data"]
+    ]
+    assert point_id in ids
+
+    client.delete(f"/api/v1/collection_points/{point_id}")
+    ids = [
+        p["id"]
+        for p in client.get("/api/v1/collection_points/", params=moved).json()["data"]
+    ]
+    assert point_id not in ids
+
+
+def test_proximity_results_sorted_by_distance():
+    results = collection_points_service.get_all_collection_points(
+        filters=CollectionPointFilters(lat=-27.5969, lng=-48.5495, radius_km=10)
+    )
+    distances = [p.distance_km for p in results]
+    assert distances == sorted(distances)
+    assert all(d <= 10 for d in distances)
+
+
+def test_store_nearest_matches_brute_force():
+    points = [
+        CollectionPoint(
+            id=str(i),
+            **{
+                **NEW_POINT,
+                "lat": -29.0 + (i * 7919 % 997) * 0.003,
+                "lng": -50.0 + (i * 104729 % 991) * 0.003,
+            },
+            is_active=i % 4 != 0,
+        )
+        for i in range(600)
+    ]
+    store = CollectionPointsStore(points)
+    bits = store.filter_bitmap(CollectionPointFilters())
+    for lat, lng in ((-27.6, -48.55), (-10.0, -40.0)):
+        slots, distances = store.nearest(lat, lng, 7, bits)
+        expected = sorted(
+            (haversine_km(lat, lng, p.lat, p.lng), p.id) for p in points if p.is_active
+        )[:7]
+        assert store.ids_for(slots) == [point_id for _, point_id in expected]
+        assert distances.tolist() == pytest.approx([d for d, _ in expected])
+
+
+def test_nearest_endpoint_outside_default_radius():
+    response = client.get(
+        "/api/v1/collection_points/nearest",
+        params={"lat": -23.55, "lng": -46.63, "k": 3, "material": "Vidro"},
+    )
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert len(data) == 3
+    assert all("Vidro" in p["materials"] for p in data)
+    distances = [p["distance_km"] for p in data]
+    assert distances == sorted(distances)
+    assert distances[0] > 5
+
+
+def _collect_pages(params):
+    ids, cursor = [], None
+    while True:
+        query = {**params, "limit": 2}
+        if cursor:
+            query["cursor"] = cursor
+        body = client.get("/api/v1/collection_points/", params=query).json()
+        assert len(body["data"]) <= 2
+        ids += [p["id"] for p in body["data"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return ids, body["total"]
+
+
+def test_pagination_by_id_is_stable():
+    everything = client.get("/api/v1/collection_points/").json()["data"]
+    ids, total = _collect_pages({})
+    assert ids == sorted(p["id"] for p in everything)
+    assert total == len(everything)
+
+
+def test_pagination_by_distance():
+    params = {"lat": -27.5969, "lng": -48.5495, "radius_km": 20}
+    expected = [
+        p.id
+        for p in collection_points_service.get_all_collection_points(
+            CollectionPointFilters(**params)
+        )
+    ]
+    ids, total = _collect_pages(params)
+    assert ids == expected
+    assert total == len(expected)
+
+
+def test_page_total_comes_from_the_same_scan(monkeypatch):
+    repository = InMemoryCollectionPointsRepository(_synthetic_points(200))
+    store = repository.store
+    calls = Counter()
+    for name in ("within_radius", "search"):
+        original = getattr(store, name)
+        monkeypatch.setattr(
+            store,
+            name,
+            lambda *args, _call=original, _name=name: calls.update([_name])
+            or _call(*args),
+        )
+    service = CollectionPointsService(repository)
+    filters = CollectionPointFilters(
+        lat=-27.59, lng=-48.55, radius_km=3.0, search="trindade", limit=5
+    )
+    page = service.get_collection_points_page(filters)
+    assert calls == {"within_radius": 1, "search": 1}
+    everything = service.get_all_collection_points(
+        filters.model_copy(update={"limit": None})
+    )
+    assert len(page.items) == 5 and page.total == len(everything) > 5
+
+
+def test_sqlite_repository_matches_memory(tmp_path):
+    points = [
+        CollectionPoint(
+            id=f"p{i:04d}",
+            **{
+                **NEW_POINT,
+                "name": f"Ponto {i}",
+                "neighborhood": ("Centro", "Ingleses", "Trindade")[i % 3],
+                "lat": -27.75 + (i * 7919 % 997) * 0.0005,
+                "lng": -48.65 + (i * 104729 % 991) * 0.0005,
+                "materials": [("Vidro", "Papel", "Metal")[i % 3], "Plástico"],
+                "accepts_all_materials": i % 5 == 0,
+            },
+        )
+        for i in range(600)
+    ]
+    memory = CollectionPointsService(InMemoryCollectionPointsRepository(points))
+    sqlite = CollectionPointsService(
+        SQLiteCollectionPointsRepository(str(tmp_path / "points.db"), pool_size=2)
+    )
+    sqlite._repository.apply_batch(upserts=points)
+
+    queries = [
+        {},
+        {"material": "Vidro", "limit": 50},
+        {"neighborhood": "ingleses", "accepts_all_materials": True},
+        {"search": "ponto 1"},
+        {"search": "centro pont", "limit": 25},
+        {"search": "trindade", "lat": -27.62, "lng": -48.52, "radius_km": 6},
+        {"lat": -27.62, "lng": -48.52, "radius_km": 4},
+        {"lat": -27.62, "lng": -48.52, "radius_km": 8, "material": "Metal", "limit": 7},
+    ]
+    for params in queries:
+        filters = CollectionPointFilters(**params)
+        expected = [
+            (p.id, getattr(p, "distance_km", None))
+            for batch in memory.iter_collection_points(filters, chunk_size=37)
+            for p in batch
+        ]
+        found = [
+            (p.id, getattr(p, "distance_km", None))
+            for batch in sqlite.iter_collection_points(filters, chunk_size=37)
+            for p in batch
+        ]
+        assert found == expected
+        assert (
+            sqlite.get_collection_points_page(filters).total
+            == memory.get_collection_points_page(filters).total
+        )
+        if params.get("limit"):
+            # O total continua sendo o de todos os resultados nas páginas seguintes.
+            second = filters.model_copy(
+                update={
+                    "cursor": memory.get_collection_points_page(filters).next_cursor
+                }
+            )
+            assert (
+                sqlite.get_collection_points_page(second).total
+                == memory.get_collection_points_page(second).total
+                == len(expected)
+            )
+
+    assert [
+        p.id for p in sqlite.get_nearest_collection_points(-27.9, -48.9, 5, "Papel")
+    ] == [p.id for p in memory.get_nearest_collection_points(-27.9, -48.9, 5, "Papel")]
+
+    for service in (memory, sqlite):
+        service.bulk_update_collection_points(
+            CollectionPointUpdate(is_active=False),
+            filters=CollectionPointFilters(neighborhood="Centro"),
+        )
+        service.delete_collection_point("p0001")
+    assert sqlite.get_collection_points_statistics() == (
+        memory.get_collection_points_statistics()
+    )
+    # Arquivos sem os contadores das estatísticas os reconstroem ao abrir.
+    with sqlite._repository._pool.connection() as conn:
+        conn.execute("DELETE FROM collection_point_stats")
+        conn.execute("UPDATE meta SET value = '0' WHERE key = 'stats_indexed'")
+    reopened = SQLiteCollectionPointsRepository(str(tmp_path / "points.db"))
+    assert reopened.statistics() == memory.get_collection_points_statistics()
+    reopened.close()
+    assert sqlite.get_collection_point_by_id("p0001") is None
+    assert sqlite.get_collection_point_by_id(
+        "p0002"
+    ) == memory.get_collection_point_by_id("p0002")
+
+
+# Repositório vazio de cada backend; os testes o preenchem com apply_batch.
+@pytest.fixture(params=["memory", "sqlite"])
+def repository(request, tmp_path):
+    if request.param == "memory":
+        repository = InMemoryCollectionPointsRepository()
+    else:
+        repository = SQLiteCollectionPointsRepository(str(tmp_path / "points.db"))
+    try:
+        yield repository
+    finally:
+        if request.param == "sqlite":
+            repository.close()
+
+
+def test_text_search_folds_accents_and_ranks(repository):
+    def point(point_id, **fields):
+        return CollectionPoint(id=point_id, **{**NEW_POINT, **fields})
+
+    points = [
+        point("a", name="Ecoponto Conceição"),
+        point("b", description="Perto da Lagoa da Conceição"),
+        point("c", neighborhood="Conceição"),
+        point("d", street="Rua Conceiçãozinha"),
+    ]
+    repository.apply_batch(upserts=points)
+    service = CollectionPointsService(repository)
+
+    def search(query, **params):
+        filters = CollectionPointFilters(search=query, **params)
+        return [p.id for p in service.get_all_collection_points(filters)]
+
+    assert search("conceicao") == ["a", "c", "d", "b"]
+    assert search("CONCEIÇÃO") == search("conceicao")
+    assert search("lagoa conceicao") == ["b"]
+    assert search("ecopon concei") == ["a"]
+    assert search("xyz") == []
+
+    page = service.get_collection_points_page(
+        CollectionPointFilters(search="conceicao", limit=2)
+    )
+    rest = service.get_collection_points_page(
+        CollectionPointFilters(search="conceicao", cursor=page.next_cursor)
+    )
+    assert [p.id for p in page.items + rest.items] == ["a", "c", "d", "b"]
+    assert page.total == 4
+
+    service.update_collection_point(
+        "b", CollectionPointUpdate(name="Conceição Recicla")
+    )
+    service.update_collection_point("a", CollectionPointUpdate(name="Ecoponto Norte"))
+    assert search("conceicao") == ["b", "c", "d"]
+    assert search("norte") == ["a"]
+    service.delete_collection_point("b")
+    assert search("conceicao") == ["c", "d"]
+
+
+def test_text_search_reads_fields_folded_on_write(monkeypatch):
+    store = CollectionPointsStore(_synthetic_points(50))
+    store.update(
+        CollectionPoint(
+            **{**_synthetic_points(1)[0].model_dump(), "name": "Ecoponto Conceição"}
+        )
+    )
+    monkeypatch.setattr(
+        collection_points_store,
+        "search_fields",
+        lambda point: pytest.fail("folded on read"),
+    )
+    slots, scores = store.search(
+        store.filter_bitmap(CollectionPointFilters()), "conceicao"
+    )
+    assert store.ids_for(slots) == [_synthetic_points(1)[0].id]
+    assert scores.tolist() == [8.0]
+
+
+def test_autocomplete_follows_mutations(repository):
+    points = [
+        CollectionPoint(id="a", **{**NEW_POINT, "name": "Ecoponto Lagoa"}),
+        CollectionPoint(
+            id="b", **{**NEW_POINT, "name": "Lagoa Recicla", "street": "Rua Lauro"}
+        ),
+        CollectionPoint(id="c", **{**NEW_POINT, "neighborhood": "Lagoa da Conceição"}),
+    ]
+    repository.apply_batch(upserts=points)
+    service = CollectionPointsService(repository)
+
+    def suggest(prefix, limit=10):
+        return [
+            (s.text, s.kind, s.count) for s in service.get_suggestions(prefix, limit)
+        ]
+
+    assert suggest("la") == [
+        ("Lagoa Recicla", "name", 1),
+        ("Lagoa da Conceição", "neighborhood", 1),
+        ("Ecoponto Lagoa", "name", 1),
+        ("Rua Lauro", "street", 1),
+    ]
+    assert suggest("conceicao") == [("Lagoa da Conceição", "neighborhood", 1)]
+    assert suggest("ing") == [("Ingleses", "neighborhood", 2)]
+    assert suggest("vid") == [("Vidro", "material", 3)]
+    assert suggest("la", limit=1) == [("Lagoa Recicla", "name", 1)]
+    assert suggest("  ") == []
+
+    service.update_collection_point("b", CollectionPointUpdate(name="Ponto Norte"))
+    service.update_collection_point("c", CollectionPointUpdate(is_active=False))
+    service.delete_collection_point("a")
+    assert suggest("la") == [("Rua Lauro", "street", 1)]
+    assert suggest("nor") == [("Ponto Norte", "name", 1)]
+    assert suggest("vid") == [("Vidro", "material", 1)]
+    if isinstance(repository, InMemoryCollectionPointsRepository):
+        rebuilt = CollectionPointsStore(
+            [
+                service.get_collection_point_by_id("b"),
+                points[2].model_copy(update={"is_active": False}),
+            ]
+        )
+        assert list(rebuilt._terms._entries) == list(repository.store._terms._entries)
+        assert list(rebuilt._terms._ranked) == list(repository.store._terms._ranked)
+
+
+def test_autocomplete_ranks_every_match(repository, tmp_path):
+    # Mais entradas com "l" do que MAX_SCANNED_TERMS: o termo mais frequente
+    # vem por último em ordem alfabética e precisa aparecer mesmo assim.
+    points = [
+        CollectionPoint(id=f"n{i:03d}", **{**NEW_POINT, "name": f"Lagoa {i:03d}"})
+        for i in range(MAX_SCANNED_TERMS + 50)
+    ] + [
+        CollectionPoint(id=f"z{i}", **{**NEW_POINT, "neighborhood": "Luz"})
+        for i in range(3)
+    ]
+    repository.apply_batch(upserts=points)
+    service = CollectionPointsService(repository)
+
+    def suggest(prefix, limit=3):
+        return [
+            (s.text, s.kind, s.count) for s in service.get_suggestions(prefix, limit)
+        ]
+
+    assert suggest("l") == [
+        ("Luz", "neighborhood", 3),
+        ("Lagoa 000", "name", 1),
+        ("Lagoa 001", "name", 1),
+    ]
+    assert suggest("lu") == [("Luz", "neighborhood", 3)]
+    assert suggest("lagoa 3", limit=2) == [
+        ("Lagoa 300", "name", 1),
+        ("Lagoa 301", "name", 1),
+    ]
+    service.delete_collection_point("z0")
+    service.update_collection_point("n000", CollectionPointUpdate(name="Ponto"))
+    assert suggest("l") == [
+        ("Luz", "neighborhood", 2),
+        ("Lagoa 001", "name", 1),
+        ("Lagoa 002", "name", 1),
+    ]
+    if isinstance(repository, SQLiteCollectionPointsRepository):
+        # Arquivos sem a tabela do ranking a reconstroem ao abrir.
+        with repository._pool.connection() as conn:
+            conn.execute("DELETE FROM collection_point_term_ranks")
+            conn.execute("UPDATE meta SET value = '0' WHERE key = 'term_ranks_indexed'")
+        reopened = SQLiteCollectionPointsRepository(str(tmp_path / "points.db"))
+        assert [s.text for s in reopened.suggest("l", 3)] == [
+            "Luz",
+            "Lagoa 001",
+            "Lagoa 002",
+        ]
+        reopened.close()
+
+
+def test_autocomplete_endpoint():
+    response = client.get(
+        "/api/v1/collection_points/autocomplete", params={"q": "trin"}
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["data"][0] == {
+        "text": "Trindade",
+        "type": "neighborhood",
+        "count": body["data"][0]["count"],
+    }
+    assert client.get("/api/v1/collection_points/autocomplete").status_code == 422
+
+
+def test_facets_match_brute_force_counts(repository):
+    points = [
+        CollectionPoint(
+            id=f"p{i:03d}",
+            **{
+                **NEW_POINT,
+                "city": ("Florianópolis", "São José")[i % 2],
+                "neighborhood": ("Centro", "Ingleses", "Trindade")[i % 3],
+                "lat": -27.60 + (i % 10) * 0.01,
+                "lng": -48.55 + (i // 10) * 0.01,
+                "materials": [("Vidro", "Papel", "Metal")[i % 3], "Plástico"],
+                "is_active": i % 7 != 0,
+            },
+        )
+        for i in range(120)
+    ]
+    repository.apply_batch(upserts=points)
+    service = CollectionPointsService(repository)
+
+    def brute_force(filters):
+        matching = [
+            p for chunk in service.iter_collection_points(filters) for p in chunk
+        ]
+        return {
+            "materials": dict(Counter(m for p in matching for m in p.materials)),
+            "neighborhoods": dict(Counter(p.neighborhood for p in matching)),
+            "cities": dict(Counter(p.city for p in matching)),
+        }
+
+    queries = [
+        {},
+        {"is_active": None},
+        {"city": "são josé"},
+        {"material": "Vidro", "neighborhood": "centro"},
+        {"lat": -27.57, "lng": -48.50, "radius_km": 3.0},
+        {"search": "trindade", "lat": -27.57, "lng": -48.50, "radius_km": 3.0},
+        {"search": "centro"},
+        {"material": "Inexistente"},
+    ]
+    for query in queries:
+        filters = CollectionPointFilters(**query)
+        assert service.get_facets(filters) == brute_force(filters), query
+
+    service.update_collection_point(
+        "p001", CollectionPointUpdate(neighborhood="Campeche", materials=["Óleo"])
+    )
+    service.delete_collection_point("p002")
+    for query in queries:
+        filters = CollectionPointFilters(**query)
+        assert service.get_facets(filters) == brute_force(filters), query
+    assert service.get_facets(CollectionPointFilters())["materials"]["Óleo"] == 1
+
+
+def test_facets_endpoint_and_live_material_list():
+    url = "/api/v1/collection_points/facets"
+    body = client.get(url, params={"neighborhood": "Trindade"}).json()
+    assert body["success"] is True
+    assert body["data"]["neighborhoods"] == {
+        "Trindade": collection_points_service.get_collection_points_page(
+            CollectionPointFilters(neighborhood="Trindade")
+        ).total
+    }
+    assert client.get(url, params={"cep": "00000-000"}).status_code == 400
+
+    materials = client.get("/api/v1/collection_points/materials/").json()
+    created = client.post(
+        "/api/v1/collection_points/", json={**NEW_POINT, "materials": ["Isopor"]}
+    ).json()["data"]
+    updated = client.get("/api/v1/collection_points/materials/").json()
+    assert "Isopor" not in materials["data"]
+    assert updated["counts"]["Isopor"] == 1
+    assert updated["data"] == sorted(updated["counts"])
+    client.delete(f"/api/v1/collection_points/{created['id']}")
+    final = client.get("/api/v1/collection_points/materials/").json()
+    assert final["counts"] == materials["counts"]
+
+
+def test_clusters_follow_mutations(repository):
+    points = [
+        CollectionPoint(
+            id=f"p{i:03d}",
+            **{
+                **NEW_POINT,
+                "lat": -27.70 + (i % 12) * 0.02,
+                "lng": -48.60 + (i // 12) * 0.02,
+                "materials": [("Vidro", "Papel", "Metal")[i % 3]],
+                "is_active": i % 9 != 0,
+            },
+        )
+        for i in range(144)
+    ]
+    repository.apply_batch(upserts=points)
+    service = CollectionPointsService(repository)
+    box = (-27.65, -48.55, -27.55, -48.45)
+
+    def check():
+        active = [
+            p
+            for p in map(
+                service.get_collection_point_by_id, sorted(p.id for p in points)
+            )
+            if p is not None and p.is_active
+        ]
+        for zoom in (0, 8, 12, 16):
+            clusters, visible = service.get_map_view(box, zoom)
+            assert visible == []
+            size = 360.0 / (4 << zoom)
+            cells = {}
+            for p in active:
+                cell = (int(p.lat // size), int(p.lng // size))
+                cells.setdefault(cell, []).append(p)
+            touching = {
+                cell: members
+                for cell, members in cells.items()
+                if int(box[0] // size) <= cell[0] <= int(box[2] // size)
+                and int(box[1] // size) <= cell[1] <= int(box[3] // size)
+            }
+            assert sorted(c.count for c in clusters) == sorted(
+                len(m) for m in touching.values()
+            )
+            assert sum(sum(c.materials.values()) for c in clusters) == sum(
+                len(m) for m in touching.values()
+            )
+            for cluster in clusters:
+                members = next(
+                    m
+                    for m in touching.values()
+                    if len(m) == cluster.count
+                    and abs(sum(p.lat for p in m) / len(m) - cluster.lat) < 1e-9
+                )
+                assert cluster.materials == dict(
+                    Counter(mat for p in members for mat in p.materials)
+                )
+        _, visible = service.get_map_view(box, 17)
+        assert [p.id for p in visible] == [
+            p.id
+            for p in active
+            if box[0] <= p.lat <= box[2] and box[1] <= p.lng <= box[3]
+        ]
+
+    check()
+    service.update_collection_point(
+        "p013", CollectionPointUpdate(lat=-27.60, lng=-48.50)
+    )
+    service.update_collection_point("p014", CollectionPointUpdate(is_active=False))
+    service.update_collection_point("p018", CollectionPointUpdate(is_active=True))
+    service.update_collection_point("p026", CollectionPointUpdate(materials=["Óleo"]))
+    service.delete_collection_point("p027")
+    check()
+    if isinstance(repository, InMemoryCollectionPointsRepository):
+        rebuilt = CollectionPointsStore(
+            service.get_collection_point_by_id(p.id)
+            for p in points
+            if service.get_collection_point_by_id(p.id)
+        )
+        for zoom in range(17):
+            assert [(c.count, c.materials) for c in rebuilt.clusters(zoom, box)] == [
+                (c.count, c.materials) for c in repository.store.clusters(zoom, box)
+            ]
+
+
+def test_clusters_endpoint():
+    url = "/api/v1/collection_points/clusters"
+    box = {"min_lat": -28.0, "min_lng": -49.0, "max_lat": -27.0, "max_lng": -48.0}
+    body = client.get(url, params={**box, "zoom": 8}).json()
+    total = collection_points_service.get_collection_points_page(
+        CollectionPointFilters()
+    ).total
+    assert body["points"] == []
+    assert sum(c["count"] for c in body["clusters"]) == total
+    close = client.get(url, params={**box, "zoom": 18}).json()
+    assert close["clusters"] == [] and len(close["points"]) == total
+    assert client.get(url, params={**box, "zoom": 8, "min_lat": -26}).status_code == 422
+    assert client.get(url, params={"zoom": 8}).status_code == 422
+
+
+def _encode_polyline(coords):
+    encoded, previous = [], (0, 0)
+    for lat, lng in coords:
+        current = (round(lat * 1e5), round(lng * 1e5))
+        for value in (current[0] - previous[0], current[1] - previous[1]):
+            value = ~(value << 1) if value < 0 else value << 1
+            while value >= 0x20:
+                encoded.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            encoded.append(chr(value + 63))
+        previous = current
+    return "".join(encoded)
+
+
+def test_decode_polyline():
+    assert decode_polyline("_p~iF~ps|U_ulLnnqC_mqNvxq`@") == [
+        (38.5, -120.2),
+        (40.7, -120.95),
+        (43.252, -126.453),
+    ]
+    route = [(-27.5969, -48.5495), (-27.6, -48.52)]
+    assert decode_polyline(_encode_polyline(route)) == route
+    for invalid in ("_p~iF~ps|U_", "\x00\x00"):
+        with pytest.raises(ValueError):
+            decode_polyline(invalid)
+
+
+def test_corridor_matches_unpruned_scan(repository):
+    points = [
+        CollectionPoint(
+            id=f"p{i:03d}",
+            **{
+                **NEW_POINT,
+                "lat": -27.70 + (i * 7919 % 211) * 0.001,
+                "lng": -48.62 + (i * 104729 % 223) * 0.001,
+                "materials": [("Vidro", "Papel")[i % 2]],
+                "is_active": i % 11 != 0,
+            },
+        )
+        for i in range(400)
+    ]
+    repository.apply_batch(upserts=points)
+    service = CollectionPointsService(repository)
+    path = [(-27.69, -48.61), (-27.62, -48.55), (-27.63, -48.43), (-27.50, -48.41)]
+    polyline = _encode_polyline(path)
+    route = Route(path)
+
+    for buffer_km, material in ((0.3, None), (1.0, "Vidro")):
+        expected = []
+        for p in points:
+            if not p.is_active or (material and material not in p.materials):
+                continue
+            located = [
+                piece.locate(np.array([p.lat]), np.array([p.lng]))
+                for piece in route.pieces
+            ]
+            distance, position = min((d[0], pos[0]) for d, pos in located)
+            if distance <= buffer_km:
+                expected.append((position, p.id))
+        found = service.get_collection_points_along_route(
+            polyline, buffer_km=buffer_km, material=material
+        )
+        assert [p.id for p in found] == [point_id for _, point_id in sorted(expected)]
+        assert all(p.distance_km <= buffer_km + 0.005 for p in found)
+        assert [p.route_km for p in found] == sorted(p.route_km for p in found)
+    assert len(service.get_collection_points_along_route(polyline, limit=3)) == 3
+    if isinstance(repository, InMemoryCollectionPointsRepository):
+        # A máscara do filtro é calculada uma vez por consulta, não por trecho.
+        store = repository.store
+        bits = store.filter_bitmap(CollectionPointFilters(is_active=True))
+        mask = store.mask_of(bits)
+        for piece in route.pieces:
+            box = piece.box(0.3)
+            assert np.array_equal(
+                store.slots_in_box(box, bits, mask), store.slots_in_box(box, bits)
+            )
+    with pytest.raises(ValueError):
+        service.get_collection_points_along_route(polyline, buffer_km=50)
+
+
+def test_corridor_endpoint():
+    url = "/api/v1/collection_points/corridor"
+    polyline = _encode_polyline([(-27.5969, -48.5495), (-27.6010, -48.5200)])
+    body = client.get(url, params={"polyline": polyline, "buffer_km": 2}).json()
+    assert body["success"] is True and body["total"] > 0
+    assert [p["route_km"] for p in body["data"]] == sorted(
+        p["route_km"] for p in body["data"]
+    )
+    assert client.get(url, params={"polyline": "_p~iF~"}).status_code == 400
+    # Rotas longas demais são recusadas antes de qualquer consulta.
+    too_long = _encode_polyline([(-27.5969, -48.5495), (-5.0, -35.0)])
+    response = client.get(url, params={"polyline": too_long})
+    assert response.status_code == 400
+    assert "km" in response.json()["detail"]
+    assert (
+        client.get(url, params={"polyline": polyline, "buffer_km": 0}).status_code
+        == 422
+    )
+
+
+HOURS = [
+    "Segunda a Sexta: 8h às 18h, Sábado: 8h às 12h",
+    "Todos os dias: 8h às 20h",
+    "Seg, Qua e Sex: 8h às 12h e 14h às 18h",
+    "Sexta a Domingo: 22h às 2h",
+    "Todos os dias: 24 horas",
+    "Ligue antes",
+]
+
+
+def _open_at(hours, minute):
+    return any(
+        start <= minute < end for start, end in parse_operating_hours(hours) or ()
+    )
+
+
+def test_parse_operating_hours():
+    day = MINUTES_PER_DAY
+    assert parse_operating_hours("Segunda a Sexta: 8h às 18h, Sábado: 8h às 12h") == (
+        tuple((d * day + 480, d * day + 1080) for d in range(5))
+        + ((5 * day + 480, 5 * day + 720),)
+    )
+    assert parse_operating_hours("segunda-feira a sexta-feira: 08:00 - 17:30") == tuple(
+        (d * day + 480, d * day + 1050) for d in range(5)
+    )
+    assert parse_operating_hours("Seg, Qua e Sex: 8h30 às 12h e 14h às 18h")[:2] == (
+        (510, 720),
+        (840, 1080),
+    )
+    # Domingo 22h às 2h continua na segunda-feira, no início da semana.
+    assert parse_operating_hours("Domingo: 22h às 2h") == (
+        (0, 120),
+        (6 * day + 1320, 7 * day),
+    )
+    assert parse_operating_hours("Todos os dias: 24h") == ((0, 7 * day),)
+    assert parse_operating_hours("Sábado: fechado; Domingo: 9h às 13h") == (
+        (6 * day + 540, 6 * day + 780),
+    )
+    for unknown in ("Ligue antes", "Segunda: 25h às 26h", "8h às 18h", "Sexta a"):
+        assert parse_operating_hours(unknown) is None
+
+    saturday = datetime(2026, 10, 17, 10, 0)
+    assert minute_of_week(saturday) == 5 * day + 600
+    utc = saturday.replace(hour=13, tzinfo=timezone.utc)
+    assert minute_of_week(utc) == 5 * day + 600
+
+
+def test_open_hours_index_matches_intervals():
+    entries = {
+        slot: parse_operating_hours(hours) or () for slot, hours in enumerate(HOURS)
+    }
+    index = OpenHoursIndex(entries.items())
+    index.remove(0, entries[0])
+    index.add(0, entries[2])
+    index.remove(3, entries[3])
+    entries[0] = entries[2]
+    del entries[3]
+    rebuilt = OpenHoursIndex(entries.items())
+    assert len(index) == len(rebuilt)
+    for minute in range(0, 7 * MINUTES_PER_DAY, 30):
+        expected = sum(
+            1 << slot
+            for slot, intervals in entries.items()
+            if any(start <= minute < end for start, end in intervals)
+        )
+        assert index.open_at(minute) == rebuilt.open_at(minute) == expected
+
+
+def test_open_at_filter_follows_mutations(repository):
+    points = [
+        CollectionPoint(
+            id=f"p{i:03d}",
+            **{
+                **NEW_POINT,
+                "lat": -27.60 + (i % 10) * 0.005,
+                "lng": -48.55 + (i // 10) * 0.005,
+                "operating_hours": HOURS[i % len(HOURS)],
+                "materials": [("Vidro", "Papel")[i % 2]],
+            },
+        )
+        for i in range(60)
+    ]
+    repository.apply_batch(upserts=points)
+    service = CollectionPointsService(repository)
+    monday = datetime(2026, 10, 12)
+    moments = [
+        monday + timedelta(days=day, hours=hour)
+        for day in range(7)
+        for hour in (0.5, 8, 12.5, 18, 23)
+    ]
+
+    def check():
+        current = [
+            p
+            for p in map(
+                service.get_collection_point_by_id, sorted(p.id for p in points)
+            )
+            if p is not None
+        ]
+        for moment in moments:
+            minute = minute_of_week(moment)
+            for material in (None, "Vidro"):
+                filters = CollectionPointFilters(open_at=moment, material=material)
+                found = service.get_all_collection_points(filters)
+                assert [p.id for p in found] == [
+                    p.id
+                    for p in current
+                    if _open_at(p.operating_hours, minute)
+                    and (material is None or material in p.materials)
+                ]
+                facets = service.get_facets(filters)
+                assert sum(facets["cities"].values()) == len(found)
+
+    check()
+    service.update_collection_point(
+        "p000", CollectionPointUpdate(operating_hours="Domingo: 22h às 2h")
+    )
+    service.update_collection_point(
+        "p001", CollectionPointUpdate(operating_hours="Ligue antes")
+    )
+    service.update_collection_point(
+        "p005", CollectionPointUpdate(operating_hours="Todos os dias: 6h às 22h")
+    )
+    service.delete_collection_point("p004")
+    created = service.create_collection_point(
+        CollectionPointCreate(**{**NEW_POINT, "operating_hours": "Sábado: 8h às 12h"})
+    )
+    points.append(created)
+    check()
+    if isinstance(repository, InMemoryCollectionPointsRepository):
+        rebuilt = CollectionPointsStore(
+            service.get_collection_point_by_id(p.id)
+            for p in points
+            if service.get_collection_point_by_id(p.id)
+        )
+        assert len(rebuilt._hours) == len(repository.store._hours)
+
+
+def test_open_at_endpoint():
+    url = "/api/v1/collection_points/"
+    saturday = "2026-10-17T10:00:00"
+    body = client.get(url, params={"open_at": saturday}).json()
+    assert body["success"] is True and body["data"]
+    for point in body["data"]:
+        assert _open_at(
+            point["operating_hours"], minute_of_week(datetime(2026, 10, 17, 10))
+        )
+    night = client.get(url, params={"open_at": "2026-10-17T03:00:00"}).json()
+    assert len(night["data"]) < len(body["data"])
+    now = client.get(url, params={"open_now": "true"})
+    assert now.status_code == 200 and "etag" in now.headers
+    closed = client.get(url, params={"open_now": "false"})
+    assert closed.status_code == 400 and "open_now" in closed.json()["detail"]
+    assert client.get(f"{url}export", params={"open_now": "false"}).status_code == 400
+    assert client.get(url, params={"open_at": "sábado"}).status_code == 422
+
+
+def test_shared_workers_converge_through_change_log(tmp_path):
+    def worker():
+        return CollectionPointsService(
+            SharedCollectionPointsRepository(
+                InMemoryCollectionPointsRepository(_synthetic_points(50)),
+                ChangeLog(str(tmp_path / "changes.db")),
+                poll_interval=0.005,
+            )
+        )
+
+    first, second = worker(), worker()
+    try:
+        created = first.create_collection_point(CollectionPointCreate(**NEW_POINT))
+        first.update_collection_point("s0001", CollectionPointUpdate(name="Renomeado"))
+        second.delete_collection_point("s0002")
+        second.bulk_update_collection_points(
+            CollectionPointUpdate(is_active=False), ids=["s0003", "s0004"]
+        )
+
+        deadline = time.monotonic() + 2
+        while first.data_version != second.data_version:
+            assert time.monotonic() < deadline
+            time.sleep(0.005)
+
+        for service in (first, second):
+            assert service.get_collection_point_by_id(created.id) == created
+            assert service.get_collection_point_by_id("s0001").name == "Renomeado"
+            assert service.get_collection_point_by_id("s0002") is None
+            assert not service.get_collection_point_by_id("s0004").is_active
+        assert (
+            first.get_collection_points_statistics()
+            == second.get_collection_points_statistics()
+        )
+    finally:
+        first._repository.close()
+        second._repository.close()
+
+
+def test_change_log_prunes_tombstones_behind_a_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.repositories.shared.CHANGE_LOG_COMPACT_EVERY", 1)
+    path = str(tmp_path / "changes.db")
+
+    def worker(poll_interval=0.005):
+        return CollectionPointsService(
+            SharedCollectionPointsRepository(
+                InMemoryCollectionPointsRepository(_synthetic_points(50)),
+                ChangeLog(path),
+                poll_interval=poll_interval,
+                tombstone_limit=2,
+            )
+        )
+
+    first = worker()
+    # Não acompanha o log: fica atrás do horizonte compactado.
+    late = worker(poll_interval=60)
+    try:
+        renamed = first.update_collection_point(
+            "s0010", CollectionPointUpdate(name="Renomeado")
+        )
+        version = first.get_changes_since(0).version
+        for i in range(5):
+            first.delete_collection_point(f"s{i:04d}")
+            created = first.create_collection_point(CollectionPointCreate(**NEW_POINT))
+            first.delete_collection_point(created.id)
+        kept = first.create_collection_point(CollectionPointCreate(**NEW_POINT))
+
+        with sqlite3.connect(path) as conn:
+            tombstones, entries = conn.execute(
+                "SELECT SUM(data IS NULL), COUNT(*) FROM changes"
+            ).fetchone()
+        assert tombstones <= 2 and entries <= 4
+        assert first.get_changes_since(version).snapshot
+
+        fresh = worker()
+        late._repository.catch_up()
+        try:
+            for service in (fresh, late):
+                assert service.data_version == first.data_version
+                assert service.get_collection_point_by_id("s0000") is None
+                assert service.get_collection_point_by_id("s0010") == renamed
+                assert service.get_collection_point_by_id(kept.id) == kept
+                assert (
+                    service.get_collection_points_statistics()
+                    == first.get_collection_points_statistics()
+                )
+        finally:
+            fresh._repository.close()
+    finally:
+        first._repository.close()
+        late._repository.close()
+
+
+def _sse_events(messages):
+    events = []
+    for message in messages:
+        fields = dict(
+            line.split(": ", 1) for line in message.strip().splitlines() if ": " in line
+        )
+        events.append((fields["event"], json.loads(fields["data"]).get("id")))
+    return events
+
+
+def test_change_feed_filters_and_bounds_queues():
+    async def scenario():
+        feed = ChangeFeed()
+        in_box = CollectionPointsChangeFilters(
+            min_lat=-27.8, min_lng=-48.7, max_lat=-27.5, max_lng=-48.4
+        )
+        subscription = feed.subscribe(in_box, max_queue=3)
+        inside = CollectionPoint(id="a", **{**NEW_POINT, "lat": -27.6, "lng": -48.5})
+        outside = CollectionPoint(id="b", **{**NEW_POINT, "lat": -26.9, "lng": -48.6})
+        feed.publish("a", inside, None)
+        feed.publish("b", outside, None)
+        feed.publish("a", inside.model_copy(update={"lat": -26.0}), inside)
+        assert _sse_events(await subscription.next_messages(timeout=1)) == [
+            ("create", "a"),
+            ("update", "a"),
+        ]
+        assert await subscription.next_messages(timeout=0.01) == []
+
+        for _ in range(5):
+            feed.publish("a", inside, inside)
+        messages = await subscription.next_messages(timeout=1)
+        assert messages[0] == RESYNC_EVENT
+        assert len(messages) <= 3
+        feed.unsubscribe(subscription)
+        assert len(feed) == 0
+
+    asyncio.run(scenario())
+
+
+def test_service_publishes_changes_from_worker_threads():
+    async def scenario():
+        service = CollectionPointsService(
+            InMemoryCollectionPointsRepository(_synthetic_points(20))
+        )
+        subscription = service.changes.subscribe(
+            CollectionPointsChangeFilters(city="florianópolis"), max_queue=100
+        )
+
+        def write():
+            created = service.create_collection_point(
+                CollectionPointCreate(**NEW_POINT)
+            )
+            service.update_collection_point(
+                created.id, CollectionPointUpdate(number="2")
+            )
+            service.delete_collection_point(created.id)
+            return created.id
+
+        point_id = await asyncio.get_running_loop().run_in_executor(None, write)
+        events = []
+        while len(events) < 3:
+            events += _sse_events(await subscription.next_messages(timeout=1))
+        assert events == [
+            ("create", point_id),
+            ("update", point_id),
+            ("delete", point_id),
+        ]
+
+    asyncio.run(scenario())
+
+
+def test_events_stream_subscribes_only_while_iterated():
+    async def scenario():
+        feed = collection_points_service.changes
+        before = len(feed)
+        request = Request({"type": "http", "method": "GET", "headers": []})
+        filters = CollectionPointsChangeFilters()
+        await stream_collection_point_changes(request, filters)
+        assert len(feed) == before
+        stream = (await stream_collection_point_changes(request, filters)).body_iterator
+        assert await stream.__anext__() == ": connected\n\n"
+        assert len(feed) == before + 1
+        await stream.aclose()
+        assert len(feed) == before
+
+    asyncio.run(scenario())
+
+
+def test_blocking_routes_run_in_the_threadpool():
+    async_routes = {
+        route.name
+        for route in collection_points_router.routes
+        if asyncio.iscoroutinefunction(route.endpoint)
+    }
+    assert async_routes == {
+        "stream_collection_point_changes",
+        "import_collection_points",
+    }
+
+
+def test_events_endpoint_rejects_partial_bounding_box():
+    response = client.get("/api/v1/collection_points/events", params={"min_lat": -27})
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite", "shared"])
+def test_delta_sync_reproduces_server_state(backend, tmp_path):
+    points = _synthetic_points(30)
+    if backend == "memory":
+        repository = InMemoryCollectionPointsRepository(points, tombstone_limit=2)
+    elif backend == "sqlite":
+        repository = SQLiteCollectionPointsRepository(
+            str(tmp_path / "points.db"), tombstone_limit=2
+        )
+        repository.apply_batch(upserts=points)
+    else:
+        repository = SharedCollectionPointsRepository(
+            InMemoryCollectionPointsRepository(points),
+            ChangeLog(str(tmp_path / "changes.db")),
+        )
+    service = CollectionPointsService(repository)
+
+    def server_state():
+        snapshot = service.get_changes_since(0)
+        assert snapshot.snapshot and not snapshot.deleted_ids
+        return {point.id: point for point in snapshot.upserts}
+
+    service.update_collection_point("s0000", CollectionPointUpdate(is_active=False))
+    local = server_state()
+    assert len(local) == 30 and not local["s0000"].is_active
+    version = service.get_changes_since(0).version
+
+    created = service.create_collection_point(CollectionPointCreate(**NEW_POINT))
+    service.update_collection_point("s0001", CollectionPointUpdate(name="Novo nome"))
+    service.update_collection_point("s0001", CollectionPointUpdate(number="99"))
+    service.delete_collection_point("s0002")
+
+    delta = service.get_changes_since(version)
+    assert not delta.snapshot
+    assert sorted(point.id for point in delta.upserts) == sorted([created.id, "s0001"])
+    assert delta.deleted_ids == ["s0002"]
+    for point in delta.upserts:
+        local[point.id] = point
+    for point_id in delta.deleted_ids:
+        local.pop(point_id, None)
+    assert local == server_state()
+
+    empty = service.get_changes_since(delta.version)
+    assert (empty.upserts, empty.deleted_ids, empty.snapshot) == ([], [], False)
+    assert service.get_changes_since(delta.version + 100).snapshot
+
+    service.bulk_delete_collection_points(ids=["s0003", "s0004"])
+    # memory e sqlite guardam só 2 tombstones: s0002 foi esquecido, então
+    # quem sincroniza de antes dele recebe um snapshot.
+    assert service.get_changes_since(version).snapshot == (backend != "shared")
+    assert sorted(service.get_changes_since(delta.version).deleted_ids) == [
+        "s0003",
+        "s0004",
+    ]
+    if backend != "memory":
+        repository.close()
+
+
+def test_changes_endpoint():
+    snapshot = client.get("/api/v1/collection_points/changes").json()
+    assert snapshot["snapshot"] and snapshot["upserts"]
+    created = client.post("/api/v1/collection_points/", json=NEW_POINT).json()["data"]
+    delta = client.get(
+        "/api/v1/collection_points/changes", params={"since": snapshot["version"]}
+    ).json()
+    assert not delta["snapshot"]
+    assert [point["id"] for point in delta["upserts"]] == [created["id"]]
+    client.delete(f"/api/v1/collection_points/{created['id']}")
+
+
+def test_pagination_rejects_bad_cursor():
+    response = client.get(
+        "/api/v1/collection_points/", params={"limit": 2, "cursor": "nao-e-cursor"}
+    )
+    assert response.status_code == 400
+
+
+def test_batch_queries_match_individual_queries():
+    queries = [
+        {"lat": -27.5954, "lng": -48.548, "radius_km": 5, "limit": 3},
+        {"lat": -27.5954, "lng": -48.548, "radius_km": 5, "material": "Papel"},
+        {"neighborhood": "Centro"},
+        {"limit": 2, "cursor": "nao-e-cursor"},
+    ]
+    response = client.post("/api/v1/collection_points/batch", json={"queries": queries})
+    assert response.status_code == 200
+    body = response.json()
+    assert not body["success"]
+    results = body["results"]
+    for index, params in enumerate(queries[:3]):
+        single = client.get("/api/v1/collection_points/", params=params).json()
+        assert results[str(index)]["data"] == single["data"]
+        assert results[str(index)]["total"] == single["total"]
+        assert results[str(index)]["next_cursor"] == single["next_cursor"]
+    assert not results["3"]["success"]
+    assert results["3"]["data"] == []
+
+    response = client.post("/api/v1/collection_points/batch", json={"queries": []})
+    assert response.status_code == 422
+
+
+def test_repository_snapshot_shares_radius_scan(monkeypatch):
+    repository = InMemoryCollectionPointsRepository(_synthetic_points(200))
+    store = repository.store
+    calls = []
+    within_radius = store.within_radius
+    monkeypatch.setattr(
+        store,
+        "within_radius",
+        lambda *args: calls.append(args) or within_radius(*args),
+    )
+    near = {"lat": -27.59, "lng": -48.55, "radius_km": 3.0}
+    queries = [
+        CollectionPointFilters(**near),
+        CollectionPointFilters(**near, neighborhood="Trindade"),
+        CollectionPointFilters(**near, material="Vidro"),
+    ]
+    expected = [list(repository.iter_matching(filters)) for filters in queries]
+    assert len(calls) == 3
+
+    calls.clear()
+    view = repository.snapshot()
+    repository.add(
+        CollectionPoint(**{**_synthetic_points(1)[0].model_dump(), "id": "novo"})
+    )
+    assert [list(view.iter_matching(filters)) for filters in queries] == expected
+    assert [view.count_matching(filters) for filters in queries] == [
+        len(rows) for rows in expected
+    ]
+    assert len(calls) == 1
+
+
+def test_cep_geocoder_prefix_fallback_and_cache():
+    geocoder = CepGeocoder(
+        [
+            ("88010", -27.59, -48.54),
+            ("88010-100", -27.6, -48.55),
+            ("88062", -27.6, -48.46),
+        ],
+        cache_size=8,
+    )
+    assert len(geocoder) == 3
+    assert geocoder.lookup("88010-100") == (-27.6, -48.55)
+    assert geocoder.lookup("88010100") == (-27.6, -48.55)
+    assert geocoder.lookup("88010-999") == (-27.59, -48.54)
+    assert geocoder.lookup("88011-000") is None
+    assert geocoder.lookup("8801") is None
+    with pytest.raises(ValueError):
+        geocoder.locate("99999-999")
+    geocoder.lookup("88010-999")
+    assert geocoder.cache_info()["hits"] == 1
+    with pytest.raises(ValueError):
+        CepGeocoder([("880", 0.0, 0.0)])
+
+
+def test_cep_replaces_coordinates():
+    lat, lng = cep_geocoder.locate("88062-000")
+    by_cep = client.get(
+        "/api/v1/collection_points/", params={"cep": "88062-000", "radius_km": 2}
+    ).json()
+    by_coords = client.get(
+        "/api/v1/collection_points/",
+        params={"lat": lat, "lng": lng, "radius_km": 2},
+    ).json()
+    assert by_cep["total"] > 0
+    assert by_cep["data"] == by_coords["data"]
+    response = client.get("/api/v1/collection_points/", params={"cep": "99999-999"})
+    assert response.status_code == 400
+
+    nearest = client.get(
+        "/api/v1/collection_points/nearest", params={"cep": "88062-000", "k": 2}
+    ).json()["data"]
+    assert [p["id"] for p in nearest] == [p["id"] for p in by_coords["data"][:2]]
+    assert client.get("/api/v1/collection_points/nearest").status_code == 400
+
+    point = {
+        key: value for key, value in NEW_POINT.items() if key not in ("lat", "lng")
+    }
+    created = client.post(
+        "/api/v1/collection_points/", json={**point, "cep": "88062-000"}
+    ).json()["data"]
+    assert (created["lat"], created["lng"]) == (lat, lng)
+    client.delete(f"/api/v1/collection_points/{created['id']}")
+    response = client.post(
+        "/api/v1/collection_points/", json={**point, "cep": "99999-999"}
+    )
+    assert response.status_code == 400
+    response = client.post("/api/v1/collection_points/", json={**point, "lat": lat})
+    assert response.status_code == 422
+
+    rows = "\n".join(
+        json.dumps({**point, "name": f"Geo {i}", "cep": cep})
+        for i, cep in enumerate(["88062-000", "99999-999"])
+    )
+    response = client.post(
+        "/api/v1/collection_points/import?format=ndjson", content=rows
+    ).json()
+    assert (response["created"], response["failed"]) == (1, 1)
+    assert response["errors"][0]["row"] == 2
+    client.request(
+        "DELETE",
+        "/api/v1/collection_points/bulk",
+        json={"filters": {"search": "Geo 0", "is_active": None}},
+    )
+
+
+def test_statistics_stay_consistent_with_crud():
+    store = collection_points_service._repository.store
+    created = client.post(
+        "/api/v1/collection_points/",
+        json={
+            **NEW_POINT,
+            "materials": ["Vidro", "Pilhas"],
+            "accepts_all_materials": True,
+        },
+    ).json()["data"]
+    assert store.statistics() == store.scan_statistics()
+
+    client.put(
+        f"/api/v1/collection_points/{created['id']}",
+        json={"neighborhood": "Centro", "materials": ["Papel"]},
+    )
+    assert store.statistics() == store.scan_statistics()
+
+    client.put(f"/api/v1/collection_points/{created['id']}", json={"is_active": False})
+    stats = client.get("/api/v1/collection_points/statistics/").json()["data"]
+    assert stats == store.scan_statistics()
+    assert "Pilhas" not in stats["materials_distribution"]
+
+    client.put(f"/api/v1/collection_points/{created['id']}", json={"is_active": True})
+    client.delete(f"/api/v1/collection_points/{created['id']}")
+    assert store.statistics() == store.scan_statistics()
+
+
+def test_versioned_lru_cache_counters():
+    cache = VersionedLRUCache(max_size=2)
+    assert cache.get("a", version="r-1") is None
+    cache.put("a", 1, version="r-1")
+    cache.put("b", 2, version="r-1")
+    assert cache.get("a", version="r-1") == 1
+    cache.put("c", 3, version="r-1")
+    assert cache.get("b", version="r-1") is None
+    assert cache.get("a", version="r-2") is None
+    assert cache.info() == {
+        "hits": 1,
+        "misses": 3,
+        "evictions": 1,
+        "invalidations": 1,
+        "size": 0,
+        "max_size": 2,
+    }
+
+
+def test_versioned_lru_cache_only_moves_forward():
+    cache = VersionedLRUCache(max_size=4)
+    cache.put("a", "novo", version="r-10")
+    # Um leitor que começou antes da escrita não apaga nem substitui nada.
+    assert cache.get("a", version="r-9") is None
+    cache.put("a", "antigo", version="r-9")
+    assert cache.get("a", version="r-10") == "novo"
+    assert cache.info()["invalidations"] == 0
+    # Contadores comparados como números, não como texto.
+    assert cache.get("a", version="r-11") is None
+    assert cache.get("a", version="r-10") is None
+    cache.put("b", 1, version="r-11")
+    assert cache.get("b", version="r-11") == 1
+    # Outra origem (repositório recriado) sempre recomeça o cache.
+    assert cache.get("b", version="s-1") is None
+    assert cache.info()["invalidations"] == 2
+
+
+def test_query_cache_is_invalidated_by_mutations():
+    params = {"material": "Vidro", "lat": -27.59691, "lng": -48.54949}
+    before = client.get("/api/v1/collection_points/cache/").json()["data"]
+    first = client.get("/api/v1/collection_points/", params=params).json()
+    again = client.get(
+        "/api/v1/collection_points/", params={**params, "lat": -27.59689}
+    ).json()
+    after = client.get("/api/v1/collection_points/cache/").json()["data"]
+    assert again == first
+    assert after["hits"] == before["hits"] + 1
+
+    created = client.post(
+        "/api/v1/collection_points/",
+        json={**NEW_POINT, "lat": -27.5970, "lng": -48.5496},
+    ).json()["data"]
+    refreshed = client.get("/api/v1/collection_points/", params=params).json()
+    assert created["id"] in [p["id"] for p in refreshed["data"]]
+    client.delete(f"/api/v1/collection_points/{created['id']}")
+
+
+def test_cached_searches_stay_within_the_rounding_error():
+    service = CollectionPointsService(
+        InMemoryCollectionPointsRepository(_synthetic_points(200))
+    )
+    decimals = service._cache_coord_decimals
+    # Diagonal de uma célula de arredondamento, em km.
+    bound = haversine_km(0.0, 0.0, 10**-decimals, 10**-decimals)
+    step = 10**-decimals
+    centers = [
+        (-27.60 - 0.45 * step, -48.55 - 0.45 * step),
+        (-27.60 + 0.45 * step, -48.55 + 0.45 * step),
+    ]
+
+    pages = []
+    for lat, lng in centers:
+        filters = CollectionPointFilters(lat=lat, lng=lng, radius_km=2.0)
+        pages.append(service.get_all_collection_points(filters))
+    assert service.get_query_cache_info()["hits"] == 1 and pages[0]
+    (lat, lng), (other_lat, other_lng) = centers
+    # A primeira busca (falta no cache) usa o centro exato; a segunda recebe
+    # a mesma resposta, a no máximo `bound` do que o seu centro daria.
+    for point in pages[0]:
+        assert point.distance_km == round(
+            haversine_km(lat, lng, point.lat, point.lng), 2
+        )
+    assert [p.id for p in pages[1]] == [p.id for p in pages[0]]
+    for point in pages[1]:
+        exact = haversine_km(other_lat, other_lng, point.lat, point.lng)
+        assert abs(point.distance_km - exact) <= bound + 0.005
+    assert bound < 0.16
+
+
+def test_cached_pages_are_not_shared_with_callers():
+    filters = CollectionPointFilters(material="Vidro")
+    first = collection_points_service.get_all_collection_points(filters)
+    expected = [p.id for p in first]
+    first.reverse()
+    first.pop()
+    again = collection_points_service.get_all_collection_points(filters)
+    assert [p.id for p in again] == expected
+    again.clear()
+    page = collection_points_service.get_collection_points_page(filters)
+    assert [p.id for p in page.items] == expected
+
+
+def test_etag_conditional_requests():
+    for path in ("/", "/statistics/", "/materials/", "/neighborhoods/"):
+        url = f"/api/v1/collection_points{path}"
+        first = client.get(url, params={"city": "Florianópolis"})
+        etag = first.headers["etag"]
+        cached = client.get(
+            url, params={"city": "Florianópolis"}, headers={"If-None-Match": etag}
+        )
+        assert cached.status_code == 304
+        assert cached.content == b""
+
+    url = "/api/v1/collection_points/"
+    etag = client.get(url).headers["etag"]
+    assert client.get(url, params={"material": "Vidro"}).headers["etag"] != etag
+
+    created = client.post("/api/v1/collection_points/", json=NEW_POINT).json()["data"]
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    client.delete(f"/api/v1/collection_points/{created['id']}")
+
+
+def test_export_streams_ndjson_in_chunks():
+    response = client.get(
+        "/api/v1/collection_points/export",
+        params={"chunk_size": 2, "is_active": "true"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    expected = [
+        p.id
+        for p in collection_points_service.get_all_collection_points(
+            CollectionPointFilters()
+        )
+    ]
+    assert [p["id"] for p in exported] == expected
+
+    response = client.get(
+        "/api/v1/collection_points/export",
+        params={"material": "Vidro", "chunk_size": 3},
+    )
+    assert all(
+        "Vidro" in json.loads(line)["materials"] for line in response.text.splitlines()
+    )
+
+
+def test_bulk_import_csv_and_ndjson():
+    csv_body = (
+        "name,cep,city,neighborhood,street,number,lat,lng,materials,description\n"
+        'Importado A,88000-001,Palhoça,Pedra Branca,Rua A,1,-27.62,-48.67,Vidro;Papel,"linha 1\nlinha 2"\n'
+        "Importado B,88000-002,Palhoça,Pedra Branca,Rua B,2,nao-e-numero,-48.67,Metal,\n"
+        "Importado C,88000-003,Palhoça,Pedra Branca,Rua C,3,-27.63,-48.68,Metal,\n"
+    )
+    response = client.post(
+        "/api/v1/collection_points/import",
+        content=csv_body.encode(),
+        headers={"Content-Type": "text/csv"},
+    )
+    body = response.json()
+    assert response.status_code == 200
+    assert (body["created"], body["failed"]) == (2, 1)
+    assert body["errors"][0]["row"] == 2
+
+    ndjson_body = (
+        json.dumps({**NEW_POINT, "neighborhood": "Pedra Branca", "city": "Palhoça"})
+        + "\n{quebrado\n\n"
+        + json.dumps({"name": "sem campos"})
+        + "\n"
+    )
+    body = client.post(
+        "/api/v1/collection_points/import?format=ndjson", content=ndjson_body.encode()
+    ).json()
+    assert (body["created"], body["failed"]) == (1, 2)
+    assert [e["row"] for e in body["errors"]] == [2, 4]
+
+    imported = client.get(
+        "/api/v1/collection_points/", params={"neighborhood": "Pedra Branca"}
+    ).json()["data"]
+    assert len(imported) == 3
+    assert any(p["description"] == "linha 1\nlinha 2" for p in imported)
+    store = collection_points_service._repository.store
+    assert store.statistics() == store.scan_statistics()
+    for point in imported:
+        client.delete(f"/api/v1/collection_points/{point['id']}")
+
+    response = client.post(
+        "/api/v1/collection_points/import",
+        content=b"x",
+        headers={"Content-Type": "text/plain"},
+    )
+    assert response.status_code == 415
+
+
+def test_bulk_import_uses_the_given_geocoder():
+    geocoder = CepGeocoder([("12345", -10.0, -40.0)])
+    rows = [
+        {**NEW_POINT, "cep": cep, "lat": None, "lng": None}
+        for cep in ("12345-678", "88062-000")
+    ]
+
+    async def chunks():
+        yield "\n".join(json.dumps(row) for row in rows).encode()
+
+    valid, errors = asyncio.run(read_import(chunks(), "ndjson", geocoder))
+    assert [(p.lat, p.lng) for p in valid] == [(-10.0, -40.0)]
+    assert [e.row for e in errors] == [2]
+
+
+def test_bulk_import_rejects_oversized_uploads(monkeypatch):
+    rows = [json.dumps({**NEW_POINT, "number": str(n)}) for n in range(3)]
+    body = ("\n".join(rows) + "\n").encode()
+
+    async def chunks():
+        yield body
+
+    geocoder = CepGeocoder([])
+    with pytest.raises(ImportTooLarge):
+        asyncio.run(read_import(chunks(), "ndjson", geocoder, max_rows=2))
+    with pytest.raises(ImportTooLarge):
+        asyncio.run(read_import(chunks(), "ndjson", geocoder, max_bytes=len(body) - 1))
+    valid, _ = asyncio.run(
+        read_import(chunks(), "ndjson", geocoder, max_rows=3, max_bytes=len(body))
+    )
+    assert len(valid) == 3
+
+    # Nada é criado quando o corpo passa do limite.
+    monkeypatch.setattr(settings, "COLLECTION_POINTS_IMPORT_MAX_ROWS", 2)
+    before = collection_points_service._repository.change_version
+    response = client.post(
+        "/api/v1/collection_points/import?format=ndjson", content=body
+    )
+    assert response.status_code == 413
+    assert collection_points_service._repository.change_version == before
+
+
+def test_bulk_update_and_delete():
+    created = [
+        client.post(
+            "/api/v1/collection_points/",
+            json={**NEW_POINT, "neighborhood": "Bairro Bulk", "number": str(n)},
+        ).json()["data"]
+        for n in range(3)
+    ]
+    ids = [p["id"] for p in created]
+
+    response = client.patch(
+        "/api/v1/collection_points/bulk",
+        json={
+            "filters": {"neighborhood": "bairro bulk"},
+            "changes": {"operating_hours": "Todos os dias: 6h às 22h"},
+        },
+    )
+    assert response.json()["matched"] == 3
+    points = [collection_points_service.get_collection_point_by_id(i) for i in ids]
+    assert {p.operating_hours for p in points} == {"Todos os dias: 6h às 22h"}
+    assert len({p.updated_at for p in points}) == 1
+
+    response = client.patch(
+        "/api/v1/collection_points/bulk",
+        json={"ids": ids[:2] + ["inexistente"], "changes": {"is_active": False}},
+    )
+    assert response.json()["matched"] == 2
+    store = collection_points_service._repository.store
+    assert store.statistics() == store.scan_statistics()
+    active = client.get(
+        "/api/v1/collection_points/", params={"neighborhood": "Bairro Bulk"}
+    ).json()["data"]
+    assert [p["id"] for p in active] == [ids[2]]
+
+    response = client.request(
+        "DELETE",
+        "/api/v1/collection_points/bulk",
+        json={"filters": {"neighborhood": "Bairro Bulk", "is_active": None}},
+    )
+    assert response.json()["matched"] == 3
+    assert all(
+        collection_points_service.get_collection_point_by_id(i) is None for i in ids
+    )
+
+    response = client.request(
+        "DELETE", "/api/v1/collection_points/bulk", json={"ids": [], "filters": {}}
+    )
+    assert response.status_code == 422